@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+Compare the throughput and ratio of each of the compression backends.
+
+By default a synthetic payload resembling a folder of fast5 files is generated.
+Raw signal in a fast5 file is a noisy random walk of int16 values and is often already
+compressed inside the HDF5 file, so the payload is a mix of raw and pre-compressed signal.
+Point --input_dir at a folder of real fast5 files to benchmark on those instead.
+
+Usage:
+python benchmarks/compression_benchmark.py --size_mb 256 --threads 1 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+import numpy as np
+
+from poreduck.compressors import CompressionSettings, open_compressor, zstandard
+
+
+class CountingWriter:
+    # Discard the output, we only care about how much of it there is
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark the poreduck compressors")
+    parser.add_argument("--input_dir", default=None,
+                        help="Folder of fast5 files to use as the payload")
+    parser.add_argument("--size_mb", type=int, default=128,
+                        help="Size of the synthetic payload in MB")
+    parser.add_argument("--precompressed_fraction", type=float, default=0.5,
+                        help="Fraction of synthetic signal that is already compressed")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4],
+                        help="Thread counts to try")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9],
+                        help="gzip levels to try")
+    return parser.parse_args()
+
+
+def synthetic_payload(size_mb, precompressed_fraction, seed=0):
+    """
+    A random walk of int16 'signal', part of it deflated as HDF5 would have stored it.
+    """
+    rng = np.random.RandomState(seed)
+    chunks = []
+    total = 0
+    target = size_mb * 1024 * 1024
+    while total < target:
+        # One 'read' of around 30 kb of signal
+        signal = (np.cumsum(rng.randint(-8, 9, size=rng.randint(5000, 60000))) + 500).astype(np.int16)
+        chunk = signal.tobytes()
+        if rng.random_sample() < precompressed_fraction:
+            chunk = zlib.compress(chunk, 1)
+        # Some metadata for each read
+        chunk += b"read_id=%d;start_mux=%d;" % (total, rng.randint(1, 5)) * 20
+        chunks.append(chunk)
+        total += len(chunk)
+    return b"".join(chunks)[:target]
+
+
+def directory_payload(input_dir):
+    payload = []
+    for fast5_file in sorted(os.listdir(input_dir)):
+        if fast5_file.endswith(".fast5"):
+            with open(os.path.join(input_dir, fast5_file), 'rb') as fast5_h:
+                payload.append(fast5_h.read())
+    return b"".join(payload)
+
+
+def run_benchmark(payload, settings, write_size=1024 * 1024):
+    output = CountingWriter()
+    start_time = time.time()
+    with open_compressor(output, settings) as compressor_h:
+        for offset in range(0, len(payload), write_size):
+            compressor_h.write(payload[offset:offset + write_size])
+    elapsed = time.time() - start_time
+    return elapsed, output.bytes_written
+
+
+def main():
+    args = get_args()
+    if args.input_dir is not None:
+        payload = directory_payload(args.input_dir)
+    else:
+        payload = synthetic_payload(args.size_mb, args.precompressed_fraction)
+    size_mb = len(payload) / 1024 / 1024
+    print("Payload of %.1f MB" % size_mb)
+
+    configurations = [CompressionSettings("none")]
+    for threads in args.threads:
+        for level in args.levels:
+            configurations.append(CompressionSettings("gzip", level=level, threads=threads))
+        if zstandard is not None:
+            configurations.append(CompressionSettings("zstd", level=3, threads=threads))
+    if zstandard is None:
+        print("zstandard module not installed, skipping zstd", file=sys.stderr)
+
+    print("codec\tlevel\tthreads\tMB/s\tratio")
+    for settings in configurations:
+        elapsed, compressed_size = run_benchmark(payload, settings)
+        print("%s\t%d\t%d\t%.1f\t%.3f" % (settings.codec, settings.level, settings.threads,
+                                          size_mb / elapsed, compressed_size / len(payload)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Compare pulling one read out of an indexed archive with extracting the whole archive.
+
+A folder of synthetic fast5-sized files is archived with an index for each codec,
+then we time a full extraction with tarfile against an indexed extraction of a single member.
+Point --input_dir at a folder of real fast5 files to benchmark on those instead.
+
+Usage:
+python benchmarks/extract_benchmark.py --num_files 4000 --codecs gzip zstd none
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zlib
+import numpy as np
+
+from poreduck.archive import write_archive
+from poreduck.archive_index import extract_members, get_index_path, read_index, select_members
+from poreduck.compressors import CompressionSettings, zstandard
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark indexed extraction from fast5 archives")
+    parser.add_argument("--input_dir", default=None,
+                        help="Folder of fast5 files to archive")
+    parser.add_argument("--num_files", type=int, default=1000,
+                        help="Number of synthetic fast5 files")
+    parser.add_argument("--codecs", type=str, nargs="+", default=["gzip", "zstd", "none"],
+                        help="Codecs to try")
+    parser.add_argument("--level", type=int, default=1,
+                        help="Compression level")
+    return parser.parse_args()
+
+
+def synthetic_folder(folder, num_files, seed=0):
+    # Pre-compressed random walk 'signal' with fast5 style names
+    rng = np.random.RandomState(seed)
+    os.makedirs(folder)
+    for read in range(num_files):
+        signal = (np.cumsum(rng.randint(-8, 9, size=rng.randint(5000, 60000))) + 500).astype(np.int16)
+        fast5_file = "host_20170518_FNFAF18353_MN19582_sequencing_run_sample_11874_read_%d_ch_%d_strand.fast5" \
+                     % (read, read % 512 + 1)
+        with open(os.path.join(folder, fast5_file), 'wb') as fast5_h:
+            fast5_h.write(zlib.compress(signal.tobytes(), 1))
+
+
+def main():
+    args = get_args()
+    work_dir = tempfile.mkdtemp(prefix="poreduck_extract_benchmark.")
+    try:
+        source_dir = args.input_dir
+        if source_dir is None:
+            source_dir = os.path.join(work_dir, "0_sequencing_run_11874")
+            synthetic_folder(source_dir, args.num_files)
+
+        print("codec\tarchive_MB\tfull_extract_s\tone_read_s\tspeed_up")
+        for codec in args.codecs:
+            if codec == "zstd" and zstandard is None:
+                print("zstandard module not installed, skipping zstd", file=sys.stderr)
+                continue
+            compression = CompressionSettings(codec, level=args.level if codec != "none" else None, index=True)
+            archive_path = os.path.join(work_dir, "archive.tar" + compression.suffix)
+            write_archive(source_dir, archive_path, compression=compression)
+
+            # Full extraction
+            full_dir = os.path.join(work_dir, "full_" + codec)
+            start_time = time.time()
+            if codec == "zstd":
+                with open(archive_path, 'rb') as archive_h, \
+                        zstandard.ZstdDecompressor().stream_reader(archive_h) as stream_h, \
+                        tarfile.open(fileobj=stream_h, mode='r|') as tar_h:
+                    tar_h.extractall(full_dir)
+            else:
+                with tarfile.open(archive_path, mode='r:*') as tar_h:
+                    tar_h.extractall(full_dir)
+            full_seconds = time.time() - start_time
+
+            # One read from the middle of the archive
+            index = read_index(get_index_path(archive_path))
+            member = index["members"][len(index["members"]) // 2]
+            start_time = time.time()
+            extract_members(archive_path, select_members(index, names=[os.path.basename(member["name"])]),
+                            os.path.join(work_dir, "one_" + codec), index=index)
+            one_seconds = time.time() - start_time
+
+            print("%s\t%.1f\t%.3f\t%.4f\t%.0fx" % (codec, os.path.getsize(archive_path) / 1024 / 1024,
+                                                   full_seconds, one_seconds, full_seconds / one_seconds))
+            os.remove(archive_path)
+            os.remove(get_index_path(archive_path))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
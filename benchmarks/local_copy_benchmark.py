@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Compare copying archives to a local disk with rsync against the kernel copy of local_copy.
+
+A set of archive-sized files of random (incompressible, like a tar.gz) data is copied to the destination
+by each method in turn, timed up to the point the data is safely on the destination disk.
+rsync is one process per archive, as the external hard drive transfer used to run it,
+followed by a sync to flush it, local_copy is copy_files with and without reading each archive back.
+
+The destination should be a separate filesystem to the source, to stop copy_file_range sharing blocks.
+With --loopback_mb (as root) an ext4 filesystem of that size is made in a file and loop mounted as the destination,
+or point --dest_dir at one made earlier:
+truncate -s 8G /tmp/dest.img && mkfs.ext4 -q -F /tmp/dest.img && mount -o loop /tmp/dest.img /mnt/dest
+
+Usage:
+python benchmarks/local_copy_benchmark.py --num_files 8 --size_mb 256 --loopback_mb 4096
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from poreduck.checksums import DEFAULT_ALGORITHM
+from poreduck.local_copy import copy_files, COPY_CHUNK_SIZE
+
+METHODS = ["rsync", "local_copy", "local_copy_verify"]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark copying archives to a local disk")
+    parser.add_argument("--num_files", type=int, default=8,
+                        help="Number of archives to copy")
+    parser.add_argument("--size_mb", type=int, default=128,
+                        help="Size of each archive in MB")
+    parser.add_argument("--chunk_mb", type=int, default=COPY_CHUNK_SIZE // 1024 // 1024,
+                        help="Chunk size for local_copy in MB")
+    parser.add_argument("--methods", type=str, nargs="+", choices=METHODS, default=METHODS,
+                        help="Methods to try")
+    parser.add_argument("--dest_dir", type=str, default=None,
+                        help="Directory on the destination disk, defaults to a temporary directory")
+    parser.add_argument("--loopback_mb", type=int, default=None,
+                        help="Make and mount an ext4 loopback filesystem of this size as the destination (needs root)")
+    return parser.parse_args()
+
+
+def make_archives(source_dir, num_files, size_mb):
+    source_paths = []
+    for archive in range(num_files):
+        source_path = os.path.join(source_dir, "%04d_11874.tar.gz" % archive)
+        with open(source_path, 'wb') as source_h:
+            for mb in range(size_mb):
+                source_h.write(os.urandom(1024 * 1024))
+        source_paths.append(source_path)
+    return source_paths
+
+
+def mount_loopback(work_dir, size_mb):
+    # ext4 filesystem in a file, mounted on work_dir/loopback
+    image_path = os.path.join(work_dir, "loopback.img")
+    mount_dir = os.path.join(work_dir, "loopback")
+    os.makedirs(mount_dir)
+    with open(image_path, 'wb') as image_h:
+        image_h.truncate(size_mb * 1024 * 1024)
+    try:
+        subprocess.run(["mkfs.ext4", "-q", "-F", image_path], check=True)
+        subprocess.run(["mount", "-o", "loop", image_path, mount_dir], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        sys.exit("Could not mount a loopback filesystem (%s), try --dest_dir instead" % e)
+    return mount_dir
+
+
+def copy_with_rsync(source_paths, dest_dir, chunk_size):
+    for source_path in source_paths:
+        subprocess.run(["rsync", "--times", source_path, dest_dir + "/"], check=True)
+    os.sync()
+
+
+def copy_with_local_copy(source_paths, dest_dir, chunk_size, checksum=None):
+    with ThreadPoolExecutor(max_workers=1) as readback_executor:
+        for source_path in source_paths:
+            copy_files([(source_path, os.path.join(dest_dir, os.path.basename(source_path)))],
+                       checksum=checksum, chunk_size=chunk_size, readback_executor=readback_executor)
+
+
+COPIERS = {"rsync": copy_with_rsync,
+           "local_copy": copy_with_local_copy,
+           "local_copy_verify": lambda source_paths, dest_dir, chunk_size:
+               copy_with_local_copy(source_paths, dest_dir, chunk_size, checksum=DEFAULT_ALGORITHM)}
+
+
+def main():
+    args = get_args()
+    work_dir = tempfile.mkdtemp(prefix="poreduck_local_copy_benchmark.")
+    mount_dir = None
+    try:
+        if args.loopback_mb is not None:
+            mount_dir = mount_loopback(work_dir, args.loopback_mb)
+        dest_parent = mount_dir or args.dest_dir or work_dir
+        source_dir = os.path.join(work_dir, "source")
+        os.makedirs(source_dir)
+        source_paths = make_archives(source_dir, args.num_files, args.size_mb)
+        total_mb = args.num_files * args.size_mb * 1024 * 1024 / 1e6
+        os.sync()
+
+        print("method\tarchives\tMB\tseconds\tMB/s")
+        for method in args.methods:
+            if method == "rsync" and shutil.which("rsync") is None:
+                print("rsync not installed, skipping rsync", file=sys.stderr)
+                continue
+            dest_dir = tempfile.mkdtemp(prefix="dest.", dir=dest_parent)
+            try:
+                start_time = time.time()
+                COPIERS[method](source_paths, dest_dir, args.chunk_mb * 1024 * 1024)
+                seconds = time.time() - start_time
+                print("%s\t%d\t%.1f\t%.2f\t%.1f" % (method, args.num_files, total_mb, seconds, total_mb / seconds))
+            finally:
+                shutil.rmtree(dest_dir)
+    finally:
+        if mount_dir is not None:
+            subprocess.run(["umount", mount_dir])
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
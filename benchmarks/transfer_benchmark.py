@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""
+Run the transfer engine end to end against a local directory sink.
+
+A reads directory of synthetic runs is generated, then for each sink configuration a fresh copy of it
+is moved, archived, sent and verified by the transfer engine, as if MinKNOW had just finished.
+The time taken covers everything from the first folder being picked up to the last archive being deleted.
+
+Sinks:
+null:   archives are left next to the reads (transfer_fast5_to_server_no_transfer)
+local:  archives are written next to the reads then copied to the destination (transfer_fast5_to_external_hd)
+stream: archives are written straight into the destination (transfer_fast5_to_external_hd --stream)
+
+Usage:
+python benchmarks/transfer_benchmark.py --num_folders 4 --files_per_folder 500 --transfer_streams 1 4
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import h5py
+import numpy as np
+
+from poreduck.compressors import CompressionSettings
+from poreduck.tar_scheduler import TarScheduler
+from poreduck.transfer_engine import TransferEngine, get_subdir_of_tar_file
+from poreduck.transfer_scheduler import TransferScheduler
+from poreduck.transfer_sinks import LocalSink, NullSink
+
+SINKS = ["null", "local", "stream"]
+SAMPLE_NAME = "benchmark"
+RUN_NAME = "20170518_1200_" + SAMPLE_NAME
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Benchmark the transfer engine against a local directory sink")
+    parser.add_argument("--num_folders", type=int, default=4,
+                        help="Number of MinKNOW sub folders in the synthetic run")
+    parser.add_argument("--files_per_folder", type=int, default=500,
+                        help="Number of fast5 files in each sub folder")
+    parser.add_argument("--sinks", type=str, nargs="+", choices=SINKS, default=SINKS,
+                        help="Sinks to try")
+    parser.add_argument("--tar_jobs", type=int, default=1,
+                        help="Number of folders archived at once")
+    parser.add_argument("--transfer_streams", type=int, nargs="+", default=[1, 4],
+                        help="Numbers of transfer streams to try, for the local sink")
+    parser.add_argument("--codec", type=str, default="gzip",
+                        help="Compression codec")
+    parser.add_argument("--level", type=int, default=1,
+                        help="Compression level")
+    parser.add_argument("--work_dir", type=str, default=None,
+                        help="Where to generate the reads and the destination, "
+                             "point this at the disks you want to benchmark")
+    return parser.parse_args()
+
+
+def synthetic_run(reads_dir, num_folders, files_per_folder, seed=0):
+    # A sequencing run with a random walk 'signal' in each read, as MinKNOW would have written it
+    rng = np.random.RandomState(seed)
+    for folder in range(num_folders):
+        folder_path = os.path.join(reads_dir, RUN_NAME, "fast5", str(folder))
+        os.makedirs(folder_path)
+        for read in range(folder * files_per_folder, (folder + 1) * files_per_folder):
+            signal = (np.cumsum(rng.randint(-8, 9, size=rng.randint(5000, 60000))) + 500).astype(np.int16)
+            fast5_file = "host_20170518_FNFAF18353_MN19582_sequencing_run_%s_11874_read_%d_ch_%d_strand.fast5" \
+                         % (SAMPLE_NAME, read, read % 512 + 1)
+            with h5py.File(os.path.join(folder_path, fast5_file), 'w') as f:
+                read_group = f.create_group("Raw/Reads/Read_%d" % read)
+                read_group.attrs["start_mux"] = read % 4 + 1
+                read_group.attrs["duration"] = len(signal)
+                read_group.create_dataset("Signal", data=signal, compression="gzip")
+
+
+def get_tree_size(folder):
+    return sum(os.path.getsize(os.path.join(dirpath, filename))
+               for dirpath, dirnames, filenames in os.walk(folder) for filename in filenames)
+
+
+def get_sink(sink_name, dest_dir):
+    if sink_name == "null":
+        return NullSink()
+    return LocalSink(dest_dir, stream=sink_name == "stream")
+
+
+def run_engine(sink_name, transfer_streams, pristine_dir, work_dir, args):
+    # Engine against a fresh copy of the reads, returns the seconds taken and the number of archives delivered
+    reads_dir = os.path.join(work_dir, "reads")
+    dest_dir = os.path.join(work_dir, "dest")
+    shutil.copytree(pristine_dir, reads_dir)
+    try:
+        engine = TransferEngine(reads_dir, SAMPLE_NAME, get_sink(sink_name, dest_dir),
+                                compression=CompressionSettings(args.codec, level=args.level),
+                                tar_scheduler=TarScheduler(args.tar_jobs),
+                                transfer_scheduler=TransferScheduler(transfer_streams))
+        start_time = time.time()
+        engine.check_directories()
+        engine.set_runs()
+        # MinKNOW has finished, everything goes whatever the size of the folder
+        engine.finish()
+        seconds = time.time() - start_time
+        archive_dir = os.path.join(reads_dir, RUN_NAME, "fast5") if sink_name == "null" \
+            else os.path.join(dest_dir, "fast5")
+        archives = set(get_subdir_of_tar_file(archive) for archive in os.listdir(archive_dir) if ".tar" in archive)
+        return seconds, len(archives)
+    finally:
+        shutil.rmtree(reads_dir)
+        shutil.rmtree(dest_dir, ignore_errors=True)
+
+
+def main():
+    args = get_args()
+    work_dir = tempfile.mkdtemp(prefix="poreduck_transfer_benchmark.", dir=args.work_dir)
+    try:
+        pristine_dir = os.path.join(work_dir, "pristine")
+        synthetic_run(pristine_dir, args.num_folders, args.files_per_folder)
+        total_mb = get_tree_size(pristine_dir) / 1e6
+
+        print("sink\tstreams\treads_MB\tarchives\tseconds\tMB/s")
+        for sink_name in args.sinks:
+            # Only the local sink queues transfers
+            for transfer_streams in args.transfer_streams if sink_name == "local" else [1]:
+                seconds, num_archives = run_engine(sink_name, transfer_streams, pristine_dir, work_dir, args)
+                print("%s\t%d\t%.1f\t%d/%d\t%.2f\t%.1f" % (sink_name, transfer_streams, total_mb, num_archives,
+                                                          args.num_folders, seconds, total_mb / seconds))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
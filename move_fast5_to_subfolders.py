@@ -1,18 +1,19 @@
-#!/usr/bin/env python2
+#!/usr/bin/env python3
 
 """
 This script is used to move fast5 files generate by MinKNOW 1.3 and below
 into subfolders of 4000 as per MinKNOW 1.4+ which makes it easier data to handle.
-It uses a parallelisation technique to move the files more quickly into each of the subfolders.
+Files are renamed in this process, spread over a few threads, rather than with an mv command for each file.
 """
 
 import argparse  # For importing arguments
 import os  # Get file lists, check directories
-import itertools  # Iterate through fast5file and mv commands
-import subprocess  # Run mv commands
 import sys  # For exiting with errors
 import pandas as pd
-from itertools import izip
+from poreduck.bulk_move import bulk_move
+from poreduck.archive import write_archive
+from poreduck.compressors import CompressionSettings
+from poreduck.tar_scheduler import TarScheduler
 
 # Global variables
 READS_DIR = ""
@@ -33,8 +34,8 @@ def get_args():
                         help="The directory with all the fast5 files in them")
     parser.add_argument("--archive", default=False, dest='archive', action='store_true',
                         help="Zip up folder once complete.")
-    parser.add_argument("--num_threads", default=5,
-                        help="Number of mv commands we will allow to be running at any given time.")
+    parser.add_argument("--num_threads", type=int, default=5,
+                        help="Number of threads moving files, and number of folders archived, at any given time.")
 
     args = parser.parse_args()
     return args
@@ -52,82 +53,47 @@ def set_directories(args):
 
 
 def move_fast5_files(args):
-    """ Move fast5 files to subfolders.
-    fast5_files are sorted by their modification time
-    We use the subprocess command to parallelise the set of mv commands
+    """ Move fast5 files to subfolders of 4000 files each.
     """
     # Create pandas dataframe with x columns.
-    fast5_df = pd.DataFrame(columns=['fast5_file', 'subfolder', 'mv_command'])
+    fast5_df = pd.DataFrame(columns=['fast5_file', 'subfolder'])
 
-    fast5_df['fast5_file'] = [fast5_file for fast5_file in os.listdir(READS_DIR) if fast5_file.endswith(".fast5")]
-    fast5_df['subfolder'] = [standardise_int_length(int(i / 4000)) for i in xrange(len(fast5_df))]
-    fast5_df['mv_command'] = ["mv %s %s/" % (fast5_file, subfolder)
-                              for fast5_file, subfolder in izip(fast5_df.fast5_file, fast5_df.subfolder)]
+    fast5_df['fast5_file'] = sorted(fast5_file for fast5_file in os.listdir(READS_DIR)
+                                    if fast5_file.endswith(".fast5"))
+    fast5_df['subfolder'] = [standardise_int_length(int(i / 4000)) for i in range(len(fast5_df))]
 
     subdirectories = fast5_df.subfolder.unique().tolist()
     print(subdirectories)
     for subdirectory in subdirectories:
-        # Create directory
-        if os.path.isdir(subdirectory):
-            # If directory already exists, make sure nothing is inside
-            if len(os.listdir(subdirectory)) > 0:
-                sys.exit("Directory '%s' exists with files inside" % subdirectory)
-        else:
-            os.mkdir(subdirectory)
-
-    processes = (subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                 for cmd in fast5_df.mv_command.tolist())
-
-    # We use the islice command to split our list of mv commands into five smaller lists.
-    running_processes = list(itertools.islice(processes, args.num_threads))
-    while running_processes:
-        for i, process in enumerate(running_processes):
-            if process.poll() is not None:  # Means that the process is complete!
-                stdout, stderr = process.communicate()  # Get the output of the completed process
-                if not stderr == "":  # Print stderr if it exists.
-                    print stderr
-                running_processes[i] = next(processes, None)
-                # Run the next number in the list.
-                if running_processes[i] is None:  # No more commands waiting to be processed.
-                    del running_processes[i]  # Not a valid process.
-                    break
+        # If directory already exists, make sure nothing is inside
+        if os.path.isdir(subdirectory) and len(os.listdir(subdirectory)) > 0:
+            sys.exit("Directory '%s' exists with files inside" % subdirectory)
+
+    # Directories are created by the bulk move
+    bulk_move([(os.path.join(READS_DIR, fast5_file), os.path.join(READS_DIR, subfolder, fast5_file))
+               for fast5_file, subfolder in zip(fast5_df.fast5_file, fast5_df.subfolder)],
+              threads=args.num_threads)
 
     return subdirectories
 
 
 def archive_folders(args, directory_list):
     """
-    Use the tar command with pigz to compress each of the subfolders
+    Tar and gzip each of the subfolders, removing each folder once its archive is in place
     """
     # Archive each of the subfolders
     # If we haven't selected archive then we return immediately.
     if not args.archive:
         return
 
-    # Otherwise a simple tar command should do
-    tar_commands = []
+    compression = CompressionSettings("gzip", level=9, threads=8)
+    tar_scheduler = TarScheduler(max_jobs=args.num_threads)
     for directory in directory_list:
-        tar_commands.append("tar -cf - %s --remove-files | pigz -9 -p 8 > %s.tar.gz" %
-                            (directory, directory))
-
-    # Multi-thread our tar command
-    processes = (subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                 for cmd in tar_commands)
-
-    # We use the islice command to split our commands into five smaller lists.
-    running_processes = list(itertools.islice(processes, args.num_threads))
-
-    while running_processes:
-        for i, process in enumerate(running_processes):
-            if process.poll() is not None:  # Means that the process is complete!
-                stdout, stderr = process.communicate()  # Get the output of the completed process
-                if not stderr == "":
-                    print stderr
-                running_processes[i] = next(processes, None)
-                # Run the next number in the list.
-                if running_processes[i] is None:  # No more commands waiting to be processed.
-                    del running_processes[i]  # Not a valid process.
-                    break
+        tar_scheduler.submit(directory, os.path.join(READS_DIR, directory), write_archive,
+                             os.path.join(READS_DIR, directory), os.path.join(READS_DIR, directory + ".tar.gz"),
+                             compression=compression, remove_source=True)
+    for directory, md5_digest in tar_scheduler.results_in_order():
+        print("%s  %s.tar.gz" % (md5_digest, directory))
 
 
 def standardise_int_length(my_integer):
@@ -135,3 +101,5 @@ def standardise_int_length(my_integer):
     return "%04d" % int(my_integer)
 
 
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 """
-This albacore script searches for tar zipped folders in a directory.
+This albacore script searches for tarred folders (plain, gzipped or zstd) in a directory.
 From here, it extracts the fast5 files and runs them through the albacore basecaller.
 
 We can scale up the threads with qsub such that each of these tarred files can be run in
@@ -34,6 +34,7 @@ import argparse
 import tempfile
 import fileinput
 import re
+from poreduck.watcher import open_watcher  # Waking up when new files arrive
 
 # Before we begin, are we using python 3.6 or greater?
 try:
@@ -53,6 +54,9 @@ CONFIGS = {"FC106_RAD001": "r94_250bps_linear.cfg",  # Rapid sequencing
            "FC106_LSK108": "r94_450bps_linear.cfg",  # For 1D ligation sequencing.
            "FC106_RAD002": "r94_450bps_linear.cfg"}  # Second Rapid sequencing kit.
 
+# Archives may be plain, gzipped or zstd compressed depending on the archive mode used to create them.
+FAST5_TAR_REGEX = re.compile(r"\.fast5\.tar(\.gz|\.zst)?$")
+
 FLOWCELLS = ["FLO-MIN107", "FLO-MIN106", "FLO-PRO001"]
 
 KITS = ["SQK-LWP001", "SQK-NSK007", "VSK-VBK001", "SQK-RAS201", "SQK-RBK001", "SQK-LWB001",
@@ -65,10 +69,10 @@ class Subfolder:
     Equivalent of the subfolder class from the starter.
     This one finds the tar gzipped fast5 files in the fast5 folder
     """
-    def __init__(self, name, main_dir, configs):
+    def __init__(self, name, main_dir, configs, tar_filename=None):
         self.name = name
         # Get the relative name of the tar file
-        self.tar_filename = name + ".fast5.tar.gz"
+        self.tar_filename = tar_filename if tar_filename is not None else name + ".fast5.tar.gz"
         # Set personal directories up
         self.albacore_summary_file = self.name + ".sequencing_summary.txt"
         self.albacore_log_file = self.name + ".pipeline.log"
@@ -234,11 +238,11 @@ class Run:
 
     def get_subfolders(self):
         # Get list of subfolders to basecall
-        return [Subfolder(re.sub(".fast5.tar.gz$", "", subfolder), self.path, self.series)
+        return [Subfolder(FAST5_TAR_REGEX.sub("", subfolder), self.path, self.series, tar_filename=subfolder)
                 for subfolder in os.path.listdir(self.fast5_dir)
-                if subfolder.endswith(".fast5.tar.gz")
+                if FAST5_TAR_REGEX.search(subfolder)
                 and not os.path.isfile(os.path.join(self.merged_dir,
-                                                    re.sub(".fast5.tar.gz", "", subfolder)))]
+                                                    FAST5_TAR_REGEX.sub("", subfolder)))]
 
     def initialise_dataframe(self):
         # Check tsv files exist in the merged directory
@@ -248,13 +252,13 @@ class Run:
         defined_subfolders = [defined_subfolder.name for defined_subfolder in self.subfolders]
         # Otherwise a dataframe of previously basecalled subfolders
         return pd.concat([pd.read_csv(os.path.join(self.merged_dir,
-                                      re.sub(".fast5.tar.gz", "merged.tsv", subfolder)),
+                                      FAST5_TAR_REGEX.sub(".merged.tsv", subfolder)),
                                       header=True, sep="\t")
                           for subfolder in os.listdir(self.fast5_dir)
                           # Check not in list.. somehow!!
-                          if re.sub(".fast5.tar.gz", "", subfolder) not in defined_subfolders
+                          if FAST5_TAR_REGEX.sub("", subfolder) not in defined_subfolders
                           # And expected data file exists
-                          and os.path.isfile(os.path.join(self.merged_dir, re.sub(".fast5.tar.gz", "merged.tsv")))
+                          and os.path.isfile(os.path.join(self.merged_dir, FAST5_TAR_REGEX.sub(".merged.tsv", subfolder)))
                          ])
 
 
@@ -294,6 +298,9 @@ def main():
     run_pipeline(subfolders, configurations["max_processes"],
                  dir_dict, configurations)
 
+    # New fast5 folders, and the output of the basecalling jobs
+    watcher = open_watcher([dir_dict["fast5"], dir_dict["fastq"], dir_dict["metadata.merged"]])
+
     # Now wait for albacore to finish
     while is_still_basecalling(subfolders):
 
@@ -304,8 +311,8 @@ def main():
         # Generate dataframe throughout each iteration of the pipeline
         status_df = generate_dataframe(subfolders, status_csv)
 
-        # Have a 15 second break between iterations
-        take_a_break()
+        # Have a break between iterations, until something is written
+        take_a_break(watcher)
 
     # Merge fastq files at the end of the run.
     generate_dataframe(subfolders, status_csv)
@@ -551,22 +558,25 @@ def get_subfolders(subfolders=[], dir_dict={}):
                     for metadata in os.listdir(dir_dict["metadata.merged"])]
 
     # Get a list of tarballs
-    new_subfolders = sorted([Subfolder(tarred_folder.replace(".fast5.tar.gz", ""), dir_dict["main"])
+    new_subfolders = sorted([Subfolder(FAST5_TAR_REGEX.sub("", tarred_folder), dir_dict["main"],
+                                       tar_filename=tarred_folder)
                              for tarred_folder in os.listdir(dir_dict["fast5"])
-                             if tarred_folder.endswith(".fast5.tar.gz")
+                             if FAST5_TAR_REGEX.search(tarred_folder)
                              and not tarred_folder in existing_tars
-                             and not tarred_folder.replace(".fast5.tar.gz", "") in metadata_tar
+                             and not FAST5_TAR_REGEX.sub("", tarred_folder) in metadata_tar
                              and not os.path.isfile(os.path.join(dir_dict["fast5"], tarred_folder+".corrupted"))], 
                              key=lambda x: x.name)
     subfolders.extend(new_subfolders)
     return subfolders
 
 
-def take_a_break():
+def take_a_break(watcher):
     """
-    Just a 15 second sleep ;)
+    Up to a minute's sleep ;)
+    Wakes once a fast5 folder, fastq file or merged metadata file is written,
+    but no more than every 15 seconds while basecalling keeps writing.
     """
-    time.sleep(15)
+    watcher.wait(timeout=60, settle=10, min_interval=15)
 
 
 def generate_dataframe(subfolders, status_csv):
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Write a tar archive of a folder in a single pass.
+
+Files are streamed into the tar, through the compressor and through a hash object on their way to disk,
+so the checksum is ready as soon as the archive is written and the archive is never read back.
+The archive is written to a temporary name and renamed into place once it has been synced,
+so a half written archive is never mistaken for a finished one.
+
+With compression.index set, the offset and size of each member in the uncompressed tar stream
+and the compressor's checkpoints are written to <archive>.idx (see archive_index).
+"""
+
+import os
+import shutil
+import tarfile
+from poreduck.compressors import open_compressor, BLOCK_SIZE
+from poreduck.checksums import new_hash, DEFAULT_ALGORITHM
+from poreduck.archive_index import write_index, get_index_path
+
+
+class HashingWriter:
+    """
+    File-like wrapper that hashes and counts every byte written through to the underlying file.
+    """
+    def __init__(self, file_h, hash_h):
+        self.file_h = file_h
+        self.hash_h = hash_h
+        self.bytes_written = 0
+        self.name = getattr(file_h, "name", "")
+
+    def write(self, data):
+        self.hash_h.update(data)
+        self.bytes_written += len(data)
+        return self.file_h.write(data)
+
+    def flush(self):
+        self.file_h.flush()
+
+    def tell(self):
+        return self.bytes_written
+
+
+class IndexingTarFile(tarfile.TarFile):
+    """
+    TarFile that notes where the data of each regular file starts in the tar stream.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.member_offsets = []
+
+    def addfile(self, tarinfo, fileobj=None):
+        super().addfile(tarinfo, fileobj)
+        if tarinfo.isreg():
+            # The data is followed by padding out to the next block
+            blocks = -(-tarinfo.size // tarfile.BLOCKSIZE)
+            self.member_offsets.append((tarinfo.name, self.offset - blocks * tarfile.BLOCKSIZE, tarinfo.size))
+
+
+def sync_directory(directory):
+    # Make sure a rename within the directory has made it to disk
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Not possible on all platforms
+        return
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def stream_archive(source_dir, output_h, arcname=None, files=None, compression=None, checksum=DEFAULT_ALGORITHM):
+    """
+    Tar, compress and hash source_dir into an open file, a local file or a remote one alike.
+    Parameters as for write_archive, compression should already be resolved.
+    Returns the HashingWriter (digest and number of bytes written), the compressor checkpoints
+    and the offsets of the tar members, for the index.
+    """
+    index = compression is not None and compression.index
+    hashing_h = HashingWriter(output_h, new_hash(checksum))
+    with open_compressor(hashing_h, compression, seekable=index) as compressor_h:
+        with IndexingTarFile.open(fileobj=compressor_h, mode='w|') as tar_h:
+            if files is None:
+                tar_h.add(name=source_dir, arcname=arcname, recursive=True)
+            else:
+                for file_name in files:
+                    tar_h.add(name=os.path.join(source_dir, file_name),
+                              arcname=os.path.join(arcname, file_name))
+    # Only a seekable compressor keeps checkpoints
+    checkpoints = compressor_h.checkpoints if index else None
+    return hashing_h, checkpoints, tar_h.member_offsets
+
+
+def write_archive(source_dir, output_path, arcname=None, files=None, compression=None, remove_source=False,
+                  checksum=DEFAULT_ALGORITHM):
+    """
+    Tar and compress source_dir into output_path in one pass.
+    :param arcname: name of the folder inside the archive, defaults to the basename of source_dir
+    :param files: only add these files (relative to source_dir), defaults to the entire folder
+    :param compression: CompressionSettings, defaults to single threaded gzip -9.
+                        In adaptive mode the level is chosen from a sample of source_dir.
+    :param remove_source: delete source_dir once the archive is safely in place
+    :param checksum: hash algorithm for the checksum, see checksums.ALGORITHMS
+    Returns the hex digest of the archive.
+    """
+    source_dir = os.path.normpath(source_dir)
+    if arcname is None:
+        arcname = os.path.basename(source_dir)
+    if compression is not None:
+        compression = compression.resolve(source_dir, files)
+    tmp_path = output_path + ".tmp"
+
+    try:
+        with open(tmp_path, 'wb') as raw_h:
+            hashing_h, checkpoints, member_offsets = stream_archive(source_dir, raw_h, arcname, files,
+                                                                    compression, checksum)
+            raw_h.flush()
+            os.fsync(raw_h.fileno())
+    except BaseException:
+        # Don't leave half an archive behind
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Atomically move the archive into place
+    os.replace(tmp_path, output_path)
+    if compression is not None and compression.index:
+        write_index(get_index_path(output_path), compression.codec, checkpoints, member_offsets)
+    sync_directory(os.path.dirname(os.path.abspath(output_path)))
+
+    if remove_source:
+        shutil.rmtree(source_dir)
+
+    return hashing_h.hash_h.hexdigest()
+
+
+def write_compressed_file(input_path, output_path, compression=None, checksum=DEFAULT_ALGORITHM):
+    """
+    Compress a single file (a fastq file for example) into output_path in one pass,
+    with the same temporary name, checksum and rename as write_archive.
+    Returns the hex digest of the compressed file.
+    """
+    tmp_path = output_path + ".tmp"
+    hash_h = new_hash(checksum)
+
+    with open(input_path, 'rb') as input_h, open(tmp_path, 'wb') as raw_h:
+        hashing_h = HashingWriter(raw_h, hash_h)
+        with open_compressor(hashing_h, compression) as compressor_h:
+            shutil.copyfileobj(input_h, compressor_h, length=BLOCK_SIZE)
+        raw_h.flush()
+        os.fsync(raw_h.fileno())
+
+    os.replace(tmp_path, output_path)
+    sync_directory(os.path.dirname(os.path.abspath(output_path)))
+
+    return hash_h.hexdigest()
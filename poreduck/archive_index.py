@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""
+Random access into fast5 archives.
+
+An archive written with --archive_index has an <archive>.idx file alongside it, a json file with:
+codec:        gzip, zstd or none
+checkpoints:  [uncompressed offset, compressed offset] of each independent gzip member or zstd frame
+members:      name, offset and size of each file in the uncompressed tar stream,
+              with the channel and read number if the name is a fast5 file name.
+
+To pull a file out we seek to the last checkpoint before it,
+decompress from there and skip to the file, rather than decompressing the whole archive.
+
+Usage:
+poreduck extract --archive 0_sequencing_run_11874.fast5.tar.gz --channel 162 --output_dir reads/
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import zlib
+from poreduck.fast5_names import parse_fast5_name
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_SUFFIX = ".idx"
+READ_SIZE = 64 * 1024
+
+
+def get_index_path(archive_path):
+    return archive_path + INDEX_SUFFIX
+
+
+def write_index(index_path, codec, checkpoints, member_offsets):
+    """
+    Write the index of an archive, to a temporary name first then renamed into place.
+    """
+    members = []
+    for name, offset, size in member_offsets:
+        member = {"name": name, "offset": offset, "size": size}
+        name_fields = parse_fast5_name(os.path.basename(name))
+        if name_fields is not None:
+            member["channel"] = name_fields["channel"]
+            member["read"] = name_fields["read"]
+        members.append(member)
+    index = {"codec": codec,
+             "checkpoints": [list(checkpoint) for checkpoint in checkpoints],
+             "members": members}
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w') as index_h:
+        json.dump(index, index_h)
+        index_h.flush()
+        os.fsync(index_h.fileno())
+    os.replace(tmp_path, index_path)
+
+
+def read_index(index_path):
+    with open(index_path) as index_h:
+        return json.load(index_h)
+
+
+def new_decompressor(codec):
+    if codec == "zstd":
+        if zstandard is None:
+            sys.exit("The zstandard module is required to extract from zstd archives")
+        return zstandard.ZstdDecompressor().decompressobj()
+    # Gzip header and trailer
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def decompressed_chunks(archive_h, codec):
+    """
+    Decompress from the current position of archive_h,
+    which must be the start of a gzip member or zstd frame, carrying on through the following ones.
+    """
+    decompressor = new_decompressor(codec)
+    while True:
+        data = archive_h.read(READ_SIZE)
+        if not data:
+            return
+        while data:
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            if decompressor.eof:
+                # Onto the next member / frame
+                data = decompressor.unused_data
+                decompressor = new_decompressor(codec)
+            else:
+                data = b""
+
+
+def read_member(archive_h, index, member):
+    """
+    Bytes of the one member, decompressing from the nearest checkpoint.
+    """
+    if index["codec"] == "none":
+        archive_h.seek(member["offset"])
+        return archive_h.read(member["size"])
+
+    uncompressed_offsets = [checkpoint[0] for checkpoint in index["checkpoints"]]
+    checkpoint = index["checkpoints"][bisect.bisect_right(uncompressed_offsets, member["offset"]) - 1]
+    archive_h.seek(checkpoint[1])
+    skip = member["offset"] - checkpoint[0]
+    data = bytearray()
+    for chunk in decompressed_chunks(archive_h, index["codec"]):
+        if skip >= len(chunk):
+            skip -= len(chunk)
+            continue
+        data.extend(chunk[skip:])
+        skip = 0
+        if len(data) >= member["size"]:
+            break
+    if len(data) < member["size"]:
+        raise ValueError("Archive ended before the end of %s" % member["name"])
+    return bytes(data[:member["size"]])
+
+
+def select_members(index, names=None, channels=None, reads=None):
+    # Members matching all of the given filters
+    members = []
+    for member in index["members"]:
+        if names and os.path.basename(member["name"]) not in names:
+            continue
+        if channels and member.get("channel") not in channels:
+            continue
+        if reads and member.get("read") not in reads:
+            continue
+        members.append(member)
+    return members
+
+
+def extract_members(archive_path, members, output_dir, index=None):
+    """
+    Write each of the members to output_dir. Returns the list of paths written.
+    """
+    if index is None:
+        index = read_index(get_index_path(archive_path))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    output_paths = []
+    with open(archive_path, 'rb') as archive_h:
+        for member in members:
+            output_path = os.path.join(output_dir, os.path.basename(member["name"]))
+            with open(output_path, 'wb') as output_h:
+                output_h.write(read_member(archive_h, index, member))
+            output_paths.append(output_path)
+    return output_paths
+
+
+def add_extract_arguments(parser):
+    parser.add_argument("--archive", type=str, required=True,
+                        help="Archive written with --archive_index, the .idx file must sit alongside it")
+    parser.add_argument("--output_dir", type=str, default=".",
+                        help="Where to place the extracted files")
+    parser.add_argument("--name", type=str, nargs="+", default=None,
+                        help="Extract files with these names")
+    parser.add_argument("--channel", type=int, nargs="+", default=None,
+                        help="Extract the reads from these channels")
+    parser.add_argument("--read", type=int, nargs="+", default=None,
+                        help="Extract the reads with these read numbers")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Extract single fast5 files from an indexed archive")
+    add_extract_arguments(parser)
+    return parser.parse_args()
+
+
+def main(args=None):
+    if args is None:
+        args = get_args()
+    index_path = get_index_path(args.archive)
+    if not os.path.isfile(index_path):
+        sys.exit("No index found at %s, was the archive written with --archive_index?" % index_path)
+    index = read_index(index_path)
+    members = select_members(index, names=args.name, channels=args.channel, reads=args.read)
+    if len(members) == 0:
+        sys.exit("No files in %s match the given filters" % args.archive)
+    for output_path in extract_members(args.archive, members, args.output_dir, index=index):
+        print("Extracted %s" % output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""
+Move many files at once, in this process.
+
+Within a filesystem a move is just a rename, so rather than forking an mv for each of the 4000 files in a folder
+we call os.rename on each of them. Across filesystems rename fails with EXDEV,
+in which case the file is copied to a temporary name alongside its destination, synced, renamed into place
+and only then is the source unlinked, so a file is never lost part way through a move.
+Destination directories are created once, up front, and renames can be spread over a few threads,
+which helps on network filesystems where each rename is a round trip.
+"""
+
+import errno
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def copy_and_unlink(source, destination):
+    # Move across filesystems, the destination is complete on disk before the source is removed.
+    tmp_destination = destination + ".tmp"
+    with open(source, 'rb') as source_h, open(tmp_destination, 'wb') as destination_h:
+        shutil.copyfileobj(source_h, destination_h, length=1024 * 1024)
+        destination_h.flush()
+        os.fsync(destination_h.fileno())
+    shutil.copystat(source, tmp_destination)
+    os.replace(tmp_destination, destination)
+    os.unlink(source)
+
+
+def move_file(source, destination):
+    try:
+        os.rename(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        copy_and_unlink(source, destination)
+
+
+def bulk_move(moves, threads=1):
+    """
+    Move each (source, destination) pair, destinations are full paths.
+    Returns the number of files moved.
+    """
+    moves = list(moves)
+    if len(moves) == 0:
+        return 0
+    start_time = time.time()
+
+    # Create each of the destination directories the once
+    for destination_dir in sorted(set(os.path.dirname(destination) for source, destination in moves)):
+        if destination_dir and not os.path.isdir(destination_dir):
+            os.makedirs(destination_dir)
+
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # Raise the first error, if any
+            list(executor.map(lambda move: move_file(*move), moves))
+    else:
+        for source, destination in moves:
+            move_file(source, destination)
+
+    elapsed = time.time() - start_time
+    print("Moved %d files in %.2f seconds (%.0f files/s)" % (len(moves), elapsed, len(moves) / max(elapsed, 1e-6)))
+    return len(moves)
+
+
+def move_files_to_dir(source_dir, file_names, destination_dir, threads=1):
+    # Move the named files from one directory into another
+    return bulk_move([(os.path.join(source_dir, file_name), os.path.join(destination_dir, file_name))
+                      for file_name in file_names], threads=threads)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""
+Durable, append-only checkpoint of a run's progress.
+
+Each record is a single json line keyed by a name (a subfolder number, or 'run' for run level values).
+Records are appended and fsync'd as soon as a stage completes, nothing is ever rewritten.
+On a restart the latest record for each key wins, so the starter can pick up where it left off
+without re-reading thousands of fast5 files.
+Appends are made under an exclusive lock on the file (as for manifest),
+so several processes, the array tasks of one wrapper config say, can share a checkpoint.
+"""
+
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on windows, appends from separate processes aren't kept apart.
+    fcntl = None
+
+
+class RunCheckpoint:
+    def __init__(self, path):
+        self.path = path
+
+    def ends_mid_line(self):
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, 'rb') as checkpoint_h:
+            checkpoint_h.seek(-1, os.SEEK_END)
+            return checkpoint_h.read(1) != b"\n"
+
+    def record(self, key, **values):
+        # Append one record and make sure it hits the disk before we move on.
+        line = json.dumps(dict(values, key=key), sort_keys=True, default=str)
+        with open(self.path, 'a') as checkpoint_h:
+            if fcntl is not None:
+                fcntl.flock(checkpoint_h.fileno(), fcntl.LOCK_EX)
+            try:
+                # Checked under the lock, so a line another process is part way through isn't mistaken for a crash
+                if self.ends_mid_line():
+                    # Don't run on from a line we crashed part way through writing
+                    line = "\n" + line
+                checkpoint_h.write(line + "\n")
+                checkpoint_h.flush()
+                os.fsync(checkpoint_h.fileno())
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(checkpoint_h.fileno(), fcntl.LOCK_UN)
+
+    def load(self):
+        """
+        Return a dict of key: latest values for that key.
+        A partially written last line (we crashed mid-append) is ignored.
+        """
+        records = {}
+        if not os.path.isfile(self.path):
+            return records
+        with open(self.path, 'r') as checkpoint_h:
+            for line in checkpoint_h:
+                try:
+                    values = json.loads(line)
+                except ValueError:
+                    print("Ignoring incomplete checkpoint line in %s" % self.path)
+                    continue
+                key = values.pop("key")
+                records.setdefault(key, {}).update(values)
+        return records
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""
+Checksums for archives and fastq files, and verifying them afterwards.
+
+md5:     the default, matches md5sum and every checksum file written by older versions of poreduck.
+sha256:  matches sha256sum.
+blake2b: faster than md5 on 64 bit machines, matches b2sum.
+xxh128:  xxh3 128 bit, much faster again but not cryptographic, matches xxh128sum.
+         Requires the optional xxhash module.
+
+Checksum files use the same 'digest  path' lines as the command line tools,
+with a suffix that names the algorithm (checksum.md5, checksum.b2 ...).
+Paths are relative to the directory holding the checksum file.
+
+Usage:
+poreduck verify --checksum_files run/checksum.md5 run/checksum.b2 --jobs 4
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+ALGORITHMS = ["md5", "sha256", "blake2b", "xxh128"]
+DEFAULT_ALGORITHM = "md5"
+CHECKSUM_SUFFIXES = {"md5": ".md5", "sha256": ".sha256", "blake2b": ".b2", "xxh128": ".xxh128"}
+# Length of the hex digest, to recognise checksum files without a known suffix
+DIGEST_LENGTHS = {32: "md5", 64: "sha256", 128: "blake2b"}
+HEX_DIGEST_LENGTHS = {"md5": 32, "sha256": 64, "blake2b": 128, "xxh128": 32}
+READ_SIZE = 8 * 1024 * 1024  # Large sequential reads
+
+# 'digest  path', 'digest *path' (binary mode) or BSD style 'MD5 (path) = digest'
+CHECKSUM_LINE_REGEX = re.compile(r"^(?P<digest>[0-9a-fA-F]+) [ *](?P<path>.+)$")
+BSD_CHECKSUM_LINE_REGEX = re.compile(r"^\w+ \((?P<path>.+)\) = (?P<digest>[0-9a-fA-F]+)$")
+
+
+def new_hash(algorithm=DEFAULT_ALGORITHM):
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Unknown checksum algorithm %s, choose from %s" % (algorithm, ', '.join(ALGORITHMS)))
+    if algorithm == "xxh128":
+        if xxhash is None:
+            raise ValueError("The xxhash module is required for xxh128 checksums")
+        return xxhash.xxh3_128()
+    return hashlib.new(algorithm)
+
+
+def add_checksum_arguments(parser):
+    # Same checksum option for each of the commands that write checksum files
+    parser.add_argument("--checksum", type=str, choices=ALGORITHMS, default=DEFAULT_ALGORITHM,
+                        help="Checksum algorithm, computed as each file is written. "
+                             "xxh128 requires the xxhash module")
+
+
+def get_checksum_file_name(prefix, algorithm=DEFAULT_ALGORITHM):
+    # checksum + .md5 etc.
+    return prefix + CHECKSUM_SUFFIXES[algorithm]
+
+
+def get_checksum_path(checksum_file, algorithm=DEFAULT_ALGORITHM):
+    """
+    checksum_file with the suffix of algorithm, so that verify knows which algorithm it was written with.
+    checksum.md5 becomes checksum.b2 for blake2b. Names without a checksum suffix have one added,
+    other than for md5 where they are left as they are, as they always have been.
+    """
+    for suffix in CHECKSUM_SUFFIXES.values():
+        if checksum_file.endswith(suffix):
+            return checksum_file[:-len(suffix)] + CHECKSUM_SUFFIXES[algorithm]
+    if algorithm == DEFAULT_ALGORITHM:
+        return checksum_file
+    return checksum_file + CHECKSUM_SUFFIXES[algorithm]
+
+
+def hash_file(file_path, algorithm=DEFAULT_ALGORITHM, read_size=READ_SIZE):
+    # Hex digest of a file, read sequentially in large chunks
+    hash_h = new_hash(algorithm)
+    with open(file_path, 'rb') as file_h:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file_h.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        for chunk in iter(lambda: file_h.read(read_size), b""):
+            hash_h.update(chunk)
+    return hash_h.hexdigest()
+
+
+def get_algorithm(checksum_file, digest=None):
+    # From the suffix of the checksum file, unless the digest is the wrong length for it,
+    # otherwise the length of the digest
+    for algorithm, suffix in CHECKSUM_SUFFIXES.items():
+        if checksum_file.endswith(suffix):
+            if digest is None or len(digest) == HEX_DIGEST_LENGTHS[algorithm]:
+                return algorithm
+            break
+    if digest is not None and len(digest) in DIGEST_LENGTHS:
+        return DIGEST_LENGTHS[len(digest)]
+    return DEFAULT_ALGORITHM
+
+
+def parse_checksum_line(line):
+    # (digest, path) or None if the line is blank, a comment or can't be parsed
+    line = line.rstrip("\n")
+    if not line.strip() or line.startswith("#"):
+        return None
+    match = CHECKSUM_LINE_REGEX.match(line) or BSD_CHECKSUM_LINE_REGEX.match(line)
+    if match is None:
+        print("Could not parse checksum line '%s'" % line)
+        return None
+    return match.group("digest").lower(), match.group("path")
+
+
+def read_checksum_file(checksum_file):
+    """
+    List of (digest, path) from a checksum file.
+    Later lines for the same path replace earlier ones.
+    """
+    checksums = {}
+    with open(checksum_file) as checksum_h:
+        for line in checksum_h:
+            checksum = parse_checksum_line(line)
+            if checksum is not None:
+                checksums[checksum[1]] = checksum[0]
+    return [(digest, path) for path, digest in checksums.items()]
+
+
+def verify_checksum_file(checksum_file, jobs=1, base_dir=None, algorithm=None):
+    """
+    Re-hash each of the files listed in the checksum file, several at once.
+    Returns a list of (path, status), status being OK, FAILED or MISSING.
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(checksum_file))
+    checksums = read_checksum_file(checksum_file)
+
+    def verify(digest, path):
+        file_path = os.path.join(base_dir, path)
+        if not os.path.isfile(file_path):
+            return path, "MISSING"
+        file_algorithm = algorithm if algorithm is not None else get_algorithm(checksum_file, digest)
+        if hash_file(file_path, file_algorithm) == digest:
+            return path, "OK"
+        return path, "FAILED"
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return list(executor.map(lambda checksum: verify(*checksum), checksums))
+
+
+def add_verify_arguments(parser):
+    parser.add_argument("--checksum_files", type=str, nargs="+", required=True,
+                        help="Checksum files to verify (.md5, .sha256, .b2, .xxh128)")
+    parser.add_argument("--jobs", type=int, default=4,
+                        help="Number of files to hash at once")
+    parser.add_argument("--base_dir", type=str, default=None,
+                        help="Directory the paths in the checksum files are relative to, "
+                             "defaults to the directory of each checksum file")
+    parser.add_argument("--checksum", type=str, choices=ALGORITHMS, default=None,
+                        help="Algorithm to use, defaults to the suffix of each checksum file")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Verify archives against their checksum files")
+    add_verify_arguments(parser)
+    return parser.parse_args()
+
+
+def main(args=None):
+    if args is None:
+        args = get_args()
+    failures = 0
+    for checksum_file in args.checksum_files:
+        for path, status in verify_checksum_file(checksum_file, jobs=args.jobs,
+                                                 base_dir=args.base_dir, algorithm=args.checksum):
+            print("%s: %s" % (path, status))
+            if status != "OK":
+                failures += 1
+    if failures > 0:
+        sys.exit("%d file(s) did not verify" % failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+
+"""
+Pluggable compressors for writing archives from python.
+
+gzip:  With one thread, the standard library gzip writer.
+       With more threads, the stream is cut into blocks which are deflated in parallel
+       and written out in order as separate gzip members.
+       A multi-member gzip file is standard gzip, gunzip, tar and python all read it as one stream.
+zstd:  Zstandard with its own worker threads, requires the optional zstandard module.
+none:  No compression at all (a plain .tar).
+
+Raw signal is usually already compressed inside each fast5 file, so gzip -9 spends most of its time
+for a few percent saving. The archive mode picks how hard to try:
+standard: the codec at its default (or given) level.
+store:    a plain tar, no compression.
+fast:     the codec at its fastest level.
+adaptive: compress a sample of the folder at each level and pick the level that
+          gets the archive to the server soonest, given the network throughput.
+
+Each compressor wraps an open binary file handle and closing the compressor
+finishes the compressed stream without closing the underlying file handle.
+
+A seekable compressor cuts the stream into independent blocks (gzip members or zstd frames)
+and keeps a list of checkpoints, the (uncompressed, compressed) offset of the start of each block.
+Decompression can start from any checkpoint, so a single file can be pulled out of a large archive.
+"""
+
+import gzip
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ["gzip", "zstd", "none"]
+DEFAULT_CODEC = "gzip"
+DEFAULT_LEVELS = {"gzip": 9, "zstd": 3, "none": 0}
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+BLOCK_SIZE = 1024 * 1024  # 1 MiB blocks for parallel deflate
+ARCHIVE_MODES = ["standard", "store", "fast", "adaptive"]
+FAST_LEVELS = {"gzip": 1, "zstd": 1, "none": 0}
+# Levels tried in adaptive mode, gzip level 0 stores the data but keeps the .gz suffix.
+ADAPTIVE_LEVELS = {"gzip": [0, 1, 6, 9], "zstd": [1, 3, 9, 19], "none": [0]}
+
+
+class CompressionSettings:
+    """
+    Codec, level and thread count for a command.
+    """
+    def __init__(self, codec=DEFAULT_CODEC, level=None, threads=1, mode="standard",
+                 sample_mb=8, network_mb_per_s=100, index=False):
+        if codec not in CODECS:
+            raise ValueError("Unknown compression codec %s, choose from %s" % (codec, ', '.join(CODECS)))
+        if mode not in ARCHIVE_MODES:
+            raise ValueError("Unknown archive mode %s, choose from %s" % (mode, ', '.join(ARCHIVE_MODES)))
+        if mode == "store":
+            codec = "none"
+        if codec == "zstd" and zstandard is None:
+            raise ValueError("The zstandard module is required for zstd compression")
+        self.codec = codec
+        self.mode = mode
+        if level is None:
+            level = FAST_LEVELS[codec] if mode == "fast" else DEFAULT_LEVELS[codec]
+        self.level = level
+        self.threads = max(1, threads)
+        self.sample_mb = sample_mb
+        self.network_mb_per_s = network_mb_per_s
+        # Write an index of the archive members alongside each archive
+        self.index = index
+
+    @property
+    def suffix(self):
+        return SUFFIXES[self.codec]
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(codec=args.compression, level=args.compression_level, threads=args.compression_threads,
+                   mode=args.archive_mode, sample_mb=args.adaptive_sample_mb,
+                   network_mb_per_s=args.network_mb_per_s, index=args.archive_index)
+
+    def resolve(self, source_dir, files=None):
+        """
+        Settings to use for the archive of source_dir.
+        Only adaptive mode looks at the data, every other mode is returned as is.
+        """
+        if self.mode != "adaptive" or self.codec == "none":
+            return self
+        sample = read_sample(source_dir, files, self.sample_mb * 1024 * 1024)
+        level = choose_level(sample, self.codec, self.threads, self.network_mb_per_s)
+        print("Adaptive compression chose %s level %d for %s" % (self.codec, level, source_dir))
+        return CompressionSettings(self.codec, level=level, threads=self.threads, index=self.index)
+
+
+def add_compression_arguments(parser):
+    # Same compression options for each of the commands that write archives
+    parser.add_argument("--compression", type=str, choices=CODECS, default=DEFAULT_CODEC,
+                        help="Compression codec for the archives, zstd requires the zstandard module")
+    parser.add_argument("--compression_level", type=int, default=None,
+                        help="Compression level, defaults to 9 for gzip and 3 for zstd")
+    parser.add_argument("--compression_threads", type=int, default=os.cpu_count() or 1,
+                        help="Number of threads to compress each archive with, defaults to the number of cpus "
+                             "as pigz did")
+    parser.add_argument("--archive_mode", type=str, choices=ARCHIVE_MODES, default="standard",
+                        help="store: plain tar, fast: fastest level of the codec, "
+                             "adaptive: choose the level from a sample of each folder")
+    parser.add_argument("--adaptive_sample_mb", type=int, default=8,
+                        help="MB of each folder to sample in adaptive mode")
+    parser.add_argument("--network_mb_per_s", type=float, default=100,
+                        help="Expected network throughput to the server in MB/s, used in adaptive mode")
+    parser.add_argument("--archive_index", default=False, action='store_true',
+                        help="Write a <archive>.idx file alongside each archive "
+                             "so single fast5 files can be extracted with 'poreduck extract'")
+
+
+def read_sample(source_dir, files=None, sample_size=8 * 1024 * 1024):
+    # The first sample_size bytes of the files in a folder
+    if files is None:
+        files = sorted(os.path.relpath(os.path.join(dirpath, filename), source_dir)
+                       for dirpath, dirnames, filenames in os.walk(source_dir)
+                       for filename in filenames)
+    sample = bytearray()
+    for file_name in files:
+        if len(sample) >= sample_size:
+            break
+        try:
+            with open(os.path.join(source_dir, file_name), 'rb') as file_h:
+                sample.extend(file_h.read(sample_size - len(sample)))
+        except OSError:
+            continue
+    return bytes(sample)
+
+
+def compress_sample(sample, codec, level):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(sample)
+    deflate = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return deflate.compress(sample) + deflate.flush()
+
+
+def choose_level(sample, codec, threads=1, network_mb_per_s=100):
+    """
+    Pick the level that gets the sample to the server soonest.
+    Compressing and sending overlap, so the slower of the two sets the pace.
+    """
+    if len(sample) == 0:
+        return DEFAULT_LEVELS[codec]
+    sample_mb = len(sample) / 1024 / 1024
+    best_level, best_seconds = None, None
+    for level in ADAPTIVE_LEVELS[codec]:
+        start_time = time.time()
+        ratio = len(compress_sample(sample, codec, level)) / len(sample)
+        compress_seconds = (time.time() - start_time) / threads
+        transfer_seconds = sample_mb * ratio / network_mb_per_s
+        seconds = max(compress_seconds, transfer_seconds)
+        if best_seconds is None or seconds < best_seconds:
+            best_level, best_seconds = level, seconds
+    return best_level
+
+
+def gzip_member(data, level=9):
+    """
+    Compress data into a complete gzip member (header, raw deflate stream, crc32 and size).
+    """
+    deflate = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # Magic, deflate, no flags, zero mtime, no extra flags, unknown OS
+    header = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+    trailer = struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+    return header + deflate.compress(data) + deflate.flush() + trailer
+
+
+class ParallelGzipWriter:
+    """
+    Block-parallel deflate, each block is written as a separate gzip member.
+    zlib releases the GIL while compressing so threads give a real speed up.
+    """
+    def __init__(self, file_h, level=9, threads=2, block_size=BLOCK_SIZE):
+        self.file_h = file_h
+        self.level = level
+        self.block_size = block_size
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        # Limit the number of blocks held in memory
+        self.max_pending = threads * 2
+        self.pending = []
+        self.buffer = bytearray()
+        self.closed = False
+        # Start of each member, (uncompressed offset, compressed offset)
+        self.checkpoints = []
+        self.uncompressed_offset = 0
+        self.compressed_offset = 0
+
+    def compress_block(self, block):
+        # A complete gzip member, mtime of zero so output is reproducible
+        return gzip_member(bytes(block), self.level)
+
+    def write_completed(self, wait_for_all=False):
+        # Write finished blocks in the order they were submitted
+        while self.pending and (wait_for_all or len(self.pending) >= self.max_pending or self.pending[0][1].done()):
+            uncompressed_offset, future = self.pending.pop(0)
+            member = future.result()
+            self.checkpoints.append((uncompressed_offset, self.compressed_offset))
+            self.file_h.write(member)
+            self.compressed_offset += len(member)
+
+    def submit_block(self, block):
+        self.pending.append((self.uncompressed_offset, self.executor.submit(self.compress_block, block)))
+        self.uncompressed_offset += len(block)
+
+    def write(self, data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.block_size:
+            block = self.buffer[:self.block_size]
+            del self.buffer[:self.block_size]
+            self.submit_block(block)
+            self.write_completed()
+        return len(data)
+
+    def flush(self):
+        self.file_h.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buffer or not self.pending:
+            # Always write at least one member so an empty stream is still valid gzip
+            self.submit_block(self.buffer)
+            self.buffer = bytearray()
+        self.write_completed(wait_for_all=True)
+        self.executor.shutdown()
+        self.file_h.flush()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ZstdWriter:
+    """
+    Zstandard stream writer using zstd's own worker threads.
+    With a block_size each block is written as a separate frame so the stream is seekable.
+    """
+    def __init__(self, file_h, level=3, threads=1, block_size=None):
+        self.file_h = file_h
+        self.compressor = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+        self.block_size = block_size
+        self.writer = None
+        if block_size is None:
+            self.writer = self.compressor.stream_writer(file_h, closefd=False)
+        self.buffer = bytearray()
+        self.closed = False
+        # Start of each frame, (uncompressed offset, compressed offset)
+        self.checkpoints = []
+        self.uncompressed_offset = 0
+        self.compressed_offset = 0
+
+    def write_frame(self, block):
+        frame = self.compressor.compress(bytes(block))
+        self.checkpoints.append((self.uncompressed_offset, self.compressed_offset))
+        self.file_h.write(frame)
+        self.uncompressed_offset += len(block)
+        self.compressed_offset += len(frame)
+
+    def write(self, data):
+        if self.writer is not None:
+            return self.writer.write(data)
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.block_size:
+            self.write_frame(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def flush(self):
+        self.file_h.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.writer is not None:
+            self.writer.close()
+        elif self.buffer or not self.checkpoints:
+            self.write_frame(self.buffer)
+            self.buffer = bytearray()
+        self.file_h.flush()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PassThroughWriter:
+    """
+    No compression, writes go straight to the file handle.
+    """
+    def __init__(self, file_h):
+        self.file_h = file_h
+        # Offsets are the same in and out
+        self.checkpoints = [(0, 0)]
+
+    def write(self, data):
+        return self.file_h.write(data)
+
+    def flush(self):
+        self.file_h.flush()
+
+    def close(self):
+        self.file_h.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_compressor(file_h, settings=None, seekable=False):
+    """
+    Wrap a binary file handle in the compressor described by settings.
+    A seekable compressor has a checkpoints attribute once closed.
+    """
+    if settings is None:
+        settings = CompressionSettings()
+    if settings.codec == "gzip":
+        if settings.threads > 1 or seekable:
+            return ParallelGzipWriter(file_h, level=settings.level, threads=settings.threads)
+        return gzip.GzipFile(filename="", mode='wb', fileobj=file_h, compresslevel=settings.level)
+    if settings.codec == "zstd":
+        return ZstdWriter(file_h, level=settings.level, threads=settings.threads,
+                          block_size=BLOCK_SIZE if seekable else None)
+    return PassThroughWriter(file_h)
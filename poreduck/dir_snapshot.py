@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+Cached snapshots of a fast5 directory and its numbered subfolders.
+
+The starters poll the fast5 directory of each run every cycle,
+and previously listed each subfolder several times per cycle
+(once to count the fast5 files, once to see if it is empty and once more to read the files).
+A DirectorySnapshot lists the run directory and each subfolder with os.scandir,
+and only re-lists a subfolder when its modification time has changed.
+Each cycle therefore costs one stat per subfolder plus one listing for each subfolder that has changed.
+"""
+
+import os
+import time
+
+# Directories modified this recently are always re-listed,
+# a file created in the same clock tick as our last listing would not change the mtime.
+RACY_WINDOW = 2  # seconds
+
+
+class SubfolderSnapshot:
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.mtime_ns = None
+        self.listed_at = 0
+        self.file_names = []
+        self.fast5_files = []
+
+    def needs_listing(self, mtime_ns):
+        if self.mtime_ns is None or not mtime_ns == self.mtime_ns:
+            return True
+        # Modified too close to the last listing to trust the mtime
+        return self.listed_at - mtime_ns / 1e9 < RACY_WINDOW
+
+    def list(self, mtime_ns):
+        # One scandir to get both counts
+        with os.scandir(self.path) as entries:
+            self.file_names = [entry.name for entry in entries]
+        self.fast5_files = [file_name for file_name in self.file_names
+                            if file_name.endswith(".fast5")]
+        self.mtime_ns = mtime_ns
+        self.listed_at = time.time()
+
+
+class DirectorySnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.subfolders = {}
+
+    def refresh(self):
+        """
+        Update the snapshot, returns the names of the numbered subfolders.
+        """
+        if not os.path.isdir(self.path):
+            return []
+        current = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.isdigit() or not entry.is_dir():
+                    continue
+                subfolder = self.subfolders.get(entry.name)
+                if subfolder is None:
+                    subfolder = SubfolderSnapshot(entry.name, entry.path)
+                try:
+                    mtime_ns = entry.stat().st_mtime_ns
+                    if subfolder.needs_listing(mtime_ns):
+                        subfolder.list(mtime_ns)
+                except FileNotFoundError:
+                    # Renamed out from under us
+                    continue
+                current[entry.name] = subfolder
+        self.subfolders = current
+        return sorted(self.subfolders.keys(), key=lambda x: int(x))
+
+    def forget(self, name):
+        # Subfolder has been renamed or removed, don't keep its listing around
+        self.subfolders.pop(name, None)
+
+    def file_count(self, name):
+        return len(self.subfolders[name].file_names) if name in self.subfolders else 0
+
+    def fast5_count(self, name):
+        return len(self.subfolders[name].fast5_files) if name in self.subfolders else 0
+
+    def fast5_files(self, name):
+        return list(self.subfolders[name].fast5_files) if name in self.subfolders else []
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Remember what we've already read from the fast5 files in a folder.
+
+A folder is polled every minute or so while MinKNOW is still writing to it,
+and until now every poll opened each of the (up to 4000) files in it to read the mux and duration attributes.
+Each file we inspect is now cached against its name, size and modification time,
+so a poll only validates and opens the files that are new, or have changed, since the last one.
+The csv for a folder is built from the cache once the folder is finished with.
+"""
+
+import os
+import time
+import h5py
+import pandas as pd
+from poreduck.fast5_validator import validate_fast5_files, STILL_WRITING, UNREADABLE
+from poreduck.fast5_names import parse_fast5_names
+
+FAST5_COLUMNS = ['filename', 'ctime', 'channel', 'read_no', 'quarantine', 'mux', 'duration']
+
+# Worth trying these files again on the next poll
+RETRY_REASONS = [STILL_WRITING, UNREADABLE]
+
+# One cache per folder
+_FOLDER_CACHES = {}
+
+
+def get_folder_cache(subdir):
+    subdir = os.path.abspath(subdir)
+    if subdir not in _FOLDER_CACHES:
+        _FOLDER_CACHES[subdir] = Fast5FolderCache(subdir)
+    return _FOLDER_CACHES[subdir]
+
+
+def drop_folder_cache(subdir):
+    # Once the files have been moved out of the folder
+    _FOLDER_CACHES.pop(os.path.abspath(subdir), None)
+
+
+def read_fast5_attributes(file_path, read_no):
+    # Mux and duration of the read
+    with h5py.File(file_path, 'r') as f:
+        read_attrs = f[f"Raw/Reads/Read_{read_no}"].attrs
+        return read_attrs["start_mux"], read_attrs["duration"]
+
+
+class Fast5FolderCache:
+    def __init__(self, subdir):
+        self.subdir = subdir
+        self.keys = {}  # filename: (size, mtime)
+        self.rows = {}  # filename: row of the csv
+
+    def scan(self):
+        # filename: (size, mtime) of each fast5 file in the folder right now
+        stats = {}
+        with os.scandir(self.subdir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".fast5"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                stats[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return stats
+
+    def update(self):
+        """
+        Inspect any files that are new or have changed since the last update,
+        forget any that have gone. Returns the number of files inspected.
+        """
+        stats = self.scan()
+        for fast5_file in list(self.rows):
+            if fast5_file not in stats:
+                del self.rows[fast5_file]
+                del self.keys[fast5_file]
+        new_files = sorted(fast5_file for fast5_file, key in stats.items()
+                           if self.keys.get(fast5_file) != key)
+        if len(new_files) == 0:
+            return 0
+
+        # Cheap check of each file before we open any of them up properly.
+        valid_files, quarantined = validate_fast5_files(self.subdir, new_files)
+        # Parse channel and read number from all of the names at once
+        names_df, unparsed = parse_fast5_names(new_files)
+        for fast5_file in unparsed:
+            quarantined[fast5_file] = "unparsed_name"
+        names = {name_row.filename: name_row for name_row in names_df.itertuples()}
+
+        for fast5_file in new_files:
+            name_row = names.get(fast5_file)
+            row = {'filename': fast5_file,
+                   'ctime': time.ctime(stats[fast5_file][1] / 1e9),
+                   'channel': name_row.channel if name_row is not None else None,
+                   'read_no': name_row.read if name_row is not None else None,
+                   'quarantine': quarantined.get(fast5_file, ""),
+                   'mux': None,
+                   'duration': None}
+            # Don't let one bad file stop the rest of the folder
+            if fast5_file not in quarantined:
+                try:
+                    row['mux'], row['duration'] = read_fast5_attributes(os.path.join(self.subdir, fast5_file),
+                                                                        int(name_row.read))
+                except (KeyError, OSError) as error:
+                    # Passed validation but the read isn't where its name says it is, or HDF5 couldn't read it
+                    print("Quarantining %s: %s (%s)" % (fast5_file, UNREADABLE, error))
+                    row['quarantine'] = UNREADABLE
+            self.rows[fast5_file] = row
+            # Files that may yet come good are looked at again next time
+            self.keys[fast5_file] = None if row['quarantine'] in RETRY_REASONS else stats[fast5_file]
+        return len(new_files)
+
+    def to_dataframe(self):
+        return pd.DataFrame([self.rows[fast5_file] for fast5_file in sorted(self.rows)], columns=FAST5_COLUMNS)
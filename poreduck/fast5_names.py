@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""
+Parse the attributes MinKNOW encodes in the name of each fast5 file.
+
+alexis_MacBookPro_20170518_FNFAF18353_MN19582_sequencing_run_PRAWN_P28_11874_read_134_ch_162_strand.fast5
+<host>_<date>_<flowcell>_<device>_<sequencing_run|mux_scan>_<sample_id>_<rnumber>_read_<read>_ch_<channel>_strand.fast5
+
+Rather than splitting each name on underscores in every module,
+one compiled pattern is applied to a whole directory listing at once.
+"""
+
+import re
+import pandas as pd
+
+FAST5_NAME_PATTERN = (r"^(?P<prefix>.*?)_(?P<flowcell>[^_]+)_(?P<device>[^_]+)_"
+                      r"(?P<run_type>sequencing_run|mux_scan)_"
+                      r"(?:(?P<sample_id>.*)_)?(?P<rnumber>[^_]+)_"
+                      r"read_(?P<read>\d+)_ch_(?P<channel>\d+)_strand\.fast5$")
+FAST5_NAME_REGEX = re.compile(FAST5_NAME_PATTERN)
+
+FAST5_NAME_COLUMNS = ["filename", "flowcell", "device", "run_type", "is_mux",
+                      "sample_id", "rnumber", "read", "channel"]
+
+
+def parse_fast5_names(fast5_files):
+    """
+    Parse a list of fast5 file names in one vectorised pass.
+    Returns a dataframe with one row per file that matched the naming scheme,
+    and the list of names that didn't.
+    """
+    names = pd.Series(list(fast5_files), dtype=object)
+    parsed_df = names.str.extract(FAST5_NAME_PATTERN, expand=True)
+    parsed_df["filename"] = names
+    matched = parsed_df["rnumber"].notnull()
+    unparsed = names[~matched].tolist()
+    for fast5_file in unparsed:
+        print("Could not parse fast5 file name %s" % fast5_file)
+
+    parsed_df = parsed_df[matched].reset_index(drop=True)
+    # Type each of the columns
+    parsed_df["read"] = parsed_df["read"].astype(int)
+    parsed_df["channel"] = parsed_df["channel"].astype(int)
+    parsed_df["is_mux"] = parsed_df["run_type"] == "mux_scan"
+    parsed_df["sample_id"] = parsed_df["sample_id"].fillna("")
+    return parsed_df[FAST5_NAME_COLUMNS], unparsed
+
+
+def parse_fast5_name(fast5_file):
+    # Parse just the one name, returns a dict or None if the name doesn't match.
+    match = FAST5_NAME_REGEX.match(fast5_file)
+    if match is None:
+        return None
+    fields = match.groupdict()
+    fields["filename"] = fast5_file
+    fields["read"] = int(fields["read"])
+    fields["channel"] = int(fields["channel"])
+    fields["is_mux"] = fields["run_type"] == "mux_scan"
+    fields["sample_id"] = fields["sample_id"] or ""
+    return {column: fields[column] for column in FAST5_NAME_COLUMNS}
+
+
+def is_consistent(parsed_df, columns=("flowcell", "rnumber", "run_type")):
+    # All files in a batch should come from the one flowcell and run.
+    for column in columns:
+        values = parsed_df[column].unique().tolist()
+        if len(values) > 1:
+            print("Expected one %s in batch but found %s" % (column, ', '.join(values)))
+            return False
+    return True
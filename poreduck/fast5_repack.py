@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""
+Repack a folder of single-read fast5 files into a handful of multi-read fast5 files.
+
+A finished subfolder holds 4000 single-read fast5 files,
+that's 4000 inodes, tar headers and HDF5 superblocks to write, transfer and extract.
+Merging the reads into a few multi-read files (the layout used by MinKNOW 2+) means
+tar, rsync and the extraction on the server only have to handle a few large files.
+
+Multi-read layout:
+/                       file_version attribute
+/read_<read_id>/Raw     attributes of Raw/Reads/Read_<N> and the Signal dataset
+/read_<read_id>/channel_id, context_tags, tracking_id   attributes from UniqueGlobalKey
+"""
+
+import os
+import h5py
+
+MULTI_READ_FILE_VERSION = "2.0"
+MULTI_READ_SUFFIX = ".multi.fast5"
+READS_PER_FILE = 4000
+UNIQUE_GLOBAL_KEY_GROUPS = ["channel_id", "context_tags", "tracking_id"]
+
+
+def copy_attributes(source, destination):
+    # Copy every attribute across as is.
+    for key, value in source.attrs.items():
+        destination.attrs[key] = value
+
+
+def is_multi_read(fast5_h):
+    # Multi read files have no Raw/Reads, just a read_<read_id> group per read.
+    return "Raw" not in fast5_h and any(key.startswith("read_") for key in fast5_h.keys())
+
+
+def get_batch_path(folder, batch_index):
+    folder = os.path.normpath(folder)
+    return os.path.join(folder, "%s_batch_%d%s" % (os.path.basename(folder), batch_index, MULTI_READ_SUFFIX))
+
+
+def next_batch_index(folder, batch_index=0):
+    # The first batch index from batch_index on that has no multi read file yet, so we never write over one.
+    while os.path.exists(get_batch_path(folder, batch_index)):
+        batch_index += 1
+    return batch_index
+
+
+def add_read(single_read_path, multi_h, compression="gzip", compression_level=1):
+    """
+    Add a single read fast5 file to an open multi-read fast5 file.
+    Returns the read id of the read added, None if the file is already a multi read file.
+    The read is only left in multi_h if the whole read was copied across.
+    """
+    with h5py.File(single_read_path, 'r') as single_h:
+        if is_multi_read(single_h):
+            return None
+        # Only one read per single read file
+        read_group_name = list(single_h['Raw/Reads'].keys())[0]
+        read_group = single_h['Raw/Reads'][read_group_name]
+        read_id = read_group.attrs['read_id']
+        if isinstance(read_id, bytes):
+            read_id = read_id.decode()
+        read_h = multi_h.create_group("read_%s" % read_id)
+        try:
+            copy_read(single_h, read_group, read_h, compression, compression_level)
+        except BaseException:
+            # Don't leave half a read behind
+            del multi_h["read_%s" % read_id]
+            raise
+    return read_id
+
+
+def copy_read(single_h, read_group, read_h, compression="gzip", compression_level=1):
+    # Copy the read in an open single read file into its group of the multi read file.
+    # Raw group, attributes of the read and the signal.
+    raw_h = read_h.create_group("Raw")
+    copy_attributes(read_group, raw_h)
+    signal = read_group['Signal']
+    compression_opts = compression_level if compression == "gzip" else None
+    raw_h.create_dataset("Signal", data=signal[()], dtype=signal.dtype,
+                         chunks=True, shuffle=compression is not None,
+                         compression=compression, compression_opts=compression_opts)
+
+    # The UniqueGlobalKey groups sit under each read in the multi read format.
+    for group_name in UNIQUE_GLOBAL_KEY_GROUPS:
+        group_path = "UniqueGlobalKey/%s" % group_name
+        if group_path not in single_h:
+            continue
+        copy_attributes(single_h[group_path], read_h.create_group(group_name))
+
+    # Keep the run id on the read group where the multi read format expects it.
+    if "UniqueGlobalKey/tracking_id" in single_h and \
+            "run_id" in single_h["UniqueGlobalKey/tracking_id"].attrs:
+        read_h.attrs["run_id"] = single_h["UniqueGlobalKey/tracking_id"].attrs["run_id"]
+
+
+def repack_folder(folder, fast5_files=None, reads_per_file=READS_PER_FILE,
+                  compression="gzip", compression_level=1, remove_single_reads=True):
+    """
+    Merge the single read fast5 files in a folder into multi-read fast5 files in the same folder.
+    Files that can't be read are left untouched so that no data is lost.
+    Multi read files, from an earlier repack of this folder say, are left as they are
+    and new batches are numbered on from them, so the folder can be repacked again after a restart.
+    Returns the list of multi-read files created.
+    """
+    folder = os.path.normpath(folder)
+    # Half written multi read files from a repack that didn't finish, their reads are all still here.
+    for tmp_file in os.listdir(folder):
+        if tmp_file.endswith(MULTI_READ_SUFFIX + ".tmp"):
+            os.remove(os.path.join(folder, tmp_file))
+    if fast5_files is None:
+        fast5_files = sorted(os.listdir(folder))
+    fast5_files = [fast5_file for fast5_file in fast5_files
+                   if fast5_file.endswith(".fast5") and not fast5_file.endswith(MULTI_READ_SUFFIX)]
+
+    multi_read_files = []
+    repacked = []
+    batch_index = 0
+    for batch_start in range(0, len(fast5_files), reads_per_file):
+        batch = fast5_files[batch_start:batch_start + reads_per_file]
+        batch_index = next_batch_index(folder, batch_index)
+        multi_read_path = get_batch_path(folder, batch_index)
+        # Write to a temporary name so a half written file is never mistaken for a finished one
+        batch_repacked = []
+        with h5py.File(multi_read_path + ".tmp", 'w') as multi_h:
+            multi_h.attrs["file_version"] = MULTI_READ_FILE_VERSION
+            for fast5_file in batch:
+                try:
+                    read_id = add_read(os.path.join(folder, fast5_file), multi_h,
+                                       compression=compression, compression_level=compression_level)
+                except (OSError, KeyError, IndexError, ValueError) as error:
+                    print("Could not repack %s, leaving as is: %s" % (fast5_file, error))
+                    continue
+                if read_id is None:
+                    print("%s is already a multi read file, leaving as is" % fast5_file)
+                    continue
+                batch_repacked.append(fast5_file)
+        if len(batch_repacked) == 0:
+            # Nothing in this batch could be repacked
+            os.remove(multi_read_path + ".tmp")
+            continue
+        os.rename(multi_read_path + ".tmp", multi_read_path)
+        multi_read_files.append(os.path.basename(multi_read_path))
+        repacked.extend(batch_repacked)
+
+    # Now remove the single reads we've copied across
+    if remove_single_reads:
+        for fast5_file in repacked:
+            os.remove(os.path.join(folder, fast5_file))
+
+    print("Repacked %d of %d fast5 files in %s into %d multi-read files" %
+          (len(repacked), len(fast5_files), folder, len(multi_read_files)))
+    return multi_read_files
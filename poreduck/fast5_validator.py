@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+Cheap validation of fast5 files before we try to parse them.
+
+MinKNOW may still be writing the last few files of a folder when we pick it up,
+and the odd file is truncated or corrupted outright.
+Rather than finding this out halfway through reading attributes,
+each file in a folder is put through three cheap checks:
+1. The HDF5 superblock signature is present.
+2. The file size has not changed over a short settle period.
+3. The 'Raw/Reads' group exists (no attributes are read).
+
+Files failing any of these checks are quarantined.
+The quarantine list is written next to the subfolder metadata so that one bad file
+never stops a batch of 4000 from being processed.
+"""
+
+import os
+import time
+import h5py
+
+# The HDF5 superblock signature may sit at 0, 512, 1024, 2048... bytes into the file.
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+HDF5_SIGNATURE_OFFSETS = [0, 512, 1024, 2048, 4096]
+SETTLE_TIME = 1  # seconds
+
+# Reasons for quarantining a file
+EMPTY = "empty"
+NOT_HDF5 = "not_hdf5"
+STILL_WRITING = "still_writing"
+NO_RAW_READS = "no_raw_reads"
+UNREADABLE = "unreadable"
+
+
+def has_hdf5_signature(file_path):
+    # Check for the superblock signature at each of the allowed offsets
+    with open(file_path, 'rb') as file_h:
+        for offset in HDF5_SIGNATURE_OFFSETS:
+            file_h.seek(offset)
+            if file_h.read(len(HDF5_SIGNATURE)) == HDF5_SIGNATURE:
+                return True
+    return False
+
+
+def has_raw_reads(file_path):
+    # Open the file and check for the Raw/Reads group, no attributes are read.
+    with h5py.File(file_path, 'r') as f:
+        return 'Raw/Reads' in f and len(f['Raw/Reads']) > 0
+
+
+def get_sizes(folder, fast5_files):
+    # Return a dict of filename: size, None if the file has since disappeared.
+    sizes = {}
+    for fast5_file in fast5_files:
+        try:
+            sizes[fast5_file] = os.stat(os.path.join(folder, fast5_file)).st_size
+        except FileNotFoundError:
+            sizes[fast5_file] = None
+    return sizes
+
+
+def validate_fast5_files(folder, fast5_files=None, settle_time=SETTLE_TIME):
+    """
+    Validate all fast5 files in a folder in bulk.
+    Returns the list of valid files and a dict of quarantined files and the reason for each.
+    We only sleep once for the whole folder when checking that sizes have settled.
+    """
+    if fast5_files is None:
+        fast5_files = [fast5_file for fast5_file in os.listdir(folder)
+                       if fast5_file.endswith(".fast5")]
+
+    quarantined = {}
+    first_sizes = get_sizes(folder, fast5_files)
+
+    # Check the signature while we wait for the sizes to settle
+    for fast5_file, size in first_sizes.items():
+        if size is None:
+            quarantined[fast5_file] = UNREADABLE
+        elif size == 0:
+            quarantined[fast5_file] = EMPTY
+        else:
+            try:
+                if not has_hdf5_signature(os.path.join(folder, fast5_file)):
+                    quarantined[fast5_file] = NOT_HDF5
+            except OSError:
+                quarantined[fast5_file] = UNREADABLE
+
+    # Now check that none of the files are still being written to
+    if settle_time > 0:
+        time.sleep(settle_time)
+    second_sizes = get_sizes(folder, [fast5_file for fast5_file in fast5_files
+                                      if fast5_file not in quarantined])
+    for fast5_file, size in second_sizes.items():
+        if not size == first_sizes[fast5_file]:
+            quarantined[fast5_file] = STILL_WRITING
+
+    # Finally make sure the reads group is there
+    valid_files = []
+    for fast5_file in fast5_files:
+        if fast5_file in quarantined:
+            continue
+        try:
+            if not has_raw_reads(os.path.join(folder, fast5_file)):
+                quarantined[fast5_file] = NO_RAW_READS
+                continue
+        except (OSError, KeyError):
+            quarantined[fast5_file] = UNREADABLE
+            continue
+        valid_files.append(fast5_file)
+
+    for fast5_file, reason in sorted(quarantined.items()):
+        print("Quarantining %s: %s" % (fast5_file, reason))
+
+    return valid_files, quarantined
+
+
+def write_quarantine_list(quarantined, quarantine_path):
+    # Write the quarantined files and their reasons as a tab delimited file.
+    if len(quarantined) == 0:
+        return
+    with open(quarantine_path, 'w') as quarantine_h:
+        quarantine_h.write("Name\tReason\n")
+        for fast5_file, reason in sorted(quarantined.items()):
+            quarantine_h.write("%s\t%s\n" % (fast5_file, reason))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Copy archives between local disks without them passing through this process.
+
+Sending archives to an external hard drive used to mean an rsync process per archive and a cp per checksum file,
+each reading every byte into userspace and writing it back out, for what is a copy from one local disk to another.
+Here the kernel does the copy:
+1. copy_file_range, which can share blocks on filesystems that support it or copy on the device itself,
+   falling back to sendfile, then to plain reads and writes if neither works between these two files.
+   Data is copied in large chunks (64 MB by default).
+2. The destination is preallocated (posix_fallocate) to its full size before the copy starts,
+   so it is laid out contiguously and a full disk is found out before any data is copied rather than part way through.
+3. Each file is written to <destination>.tmp. Once a whole batch has been copied (an archive and its index say),
+   the batch is fsync'd, renamed into place and each destination directory fsync'd just the once.
+4. Optionally each file is read back from the destination in a separate thread and hashed,
+   with the copy's pages dropped from the page cache first so that we check what is on the disk,
+   while the rest of the batch is synced.
+"""
+
+import errno
+import os
+import shutil
+import time
+from poreduck.archive import sync_directory
+from poreduck.checksums import hash_file, READ_SIZE
+
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+COPY_METHODS = [method for method in ["copy_file_range", "sendfile"] if hasattr(os, method)] + ["readwrite"]
+# The method isn't supported between these two files, try the next one.
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+
+def preallocate(dest_fd, size):
+    # Reserve the space for the whole file up front, raises if the disk is full.
+    if size == 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(dest_fd, 0, size)
+    except OSError as e:
+        if e.errno not in FALLBACK_ERRNOS:
+            raise
+
+
+def copy_chunk(method, source_fd, dest_fd, offset, count):
+    # Copy count bytes at offset, returns the number of bytes copied.
+    if method == "copy_file_range":
+        return os.copy_file_range(source_fd, dest_fd, count, offset, offset)
+    if method == "sendfile":
+        os.lseek(dest_fd, offset, os.SEEK_SET)
+        return os.sendfile(dest_fd, source_fd, offset, count)
+    return os.pwrite(dest_fd, os.pread(source_fd, min(count, READ_SIZE), offset), offset)
+
+
+def throttle(start_time, bytes_copied, bwlimit):
+    # Sleep until we're back under bwlimit KB/s, as for rsync --bwlimit
+    if bwlimit is None:
+        return
+    ahead = bytes_copied / (bwlimit * 1000) - (time.time() - start_time)
+    if ahead > 0:
+        time.sleep(ahead)
+
+
+def copy_range(source_fd, dest_fd, size, chunk_size=COPY_CHUNK_SIZE, bwlimit=None):
+    """
+    Copy the first size bytes of source_fd to dest_fd with the first of COPY_METHODS that works.
+    Returns the method used.
+    """
+    for method in COPY_METHODS:
+        start_time = time.time()
+        offset = 0
+        try:
+            while offset < size:
+                copied = copy_chunk(method, source_fd, dest_fd, offset, min(chunk_size, size - offset))
+                if copied == 0:
+                    raise IOError("Source is only %d bytes, expected %d" % (offset, size))
+                offset += copied
+                throttle(start_time, offset, bwlimit)
+            return method
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS or method == COPY_METHODS[-1]:
+                raise
+
+
+def copy_to_tmp(source_path, dest_path, chunk_size=COPY_CHUNK_SIZE, bwlimit=None):
+    # Copy source_path to dest_path.tmp, not yet synced. Returns the tmp path.
+    tmp_path = dest_path + ".tmp"
+    with open(source_path, 'rb') as source_h, open(tmp_path, 'wb') as dest_h:
+        size = os.fstat(source_h.fileno()).st_size
+        preallocate(dest_h.fileno(), size)
+        copy_range(source_h.fileno(), dest_h.fileno(), size, chunk_size, bwlimit)
+        # In case the preallocation was larger than what we copied
+        dest_h.truncate(size)
+    # Keep the modification times, as rsync --times did
+    shutil.copystat(source_path, tmp_path)
+    return tmp_path
+
+
+def sync_file(path):
+    # fsync, then drop the file from the page cache so that reading it back means reading the disk.
+    with open(path, 'rb+') as file_h:
+        os.fsync(file_h.fileno())
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file_h.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def copy_files(pairs, checksum=None, chunk_size=COPY_CHUNK_SIZE, bwlimit=None, readback_executor=None):
+    """
+    Copy each (source_path, dest_path) of pairs, as one batch.
+    :param checksum: algorithm to read each destination back with, None to skip the read back.
+    :param chunk_size: bytes copied per call
+    :param bwlimit: KB/s for each file, None for no limit
+    :param readback_executor: ThreadPoolExecutor to read back in, otherwise read back in this thread.
+    Returns a dict of dest_path: digest read back from the disk, None without checksum.
+    Nothing is renamed into place unless the whole batch has been copied and synced.
+    """
+    tmp_paths = []
+    try:
+        for source_path, dest_path in pairs:
+            tmp_paths.append(dest_path + ".tmp")
+            copy_to_tmp(source_path, dest_path, chunk_size, bwlimit)
+
+        digests = {}
+        for (source_path, dest_path), tmp_path in zip(pairs, tmp_paths):
+            sync_file(tmp_path)
+            if checksum is None:
+                digests[dest_path] = None
+            elif readback_executor is not None:
+                # Read back while we sync the next one
+                digests[dest_path] = readback_executor.submit(hash_file, tmp_path, checksum)
+            else:
+                digests[dest_path] = hash_file(tmp_path, checksum)
+        digests = {dest_path: digest.result() if hasattr(digest, "result") else digest
+                   for dest_path, digest in digests.items()}
+    except BaseException:
+        # Don't leave half a batch behind
+        for tmp_path in tmp_paths:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    for (source_path, dest_path), tmp_path in zip(pairs, tmp_paths):
+        os.replace(tmp_path, dest_path)
+    for dest_dir in set(os.path.dirname(os.path.abspath(dest_path)) for source_path, dest_path in pairs):
+        sync_directory(dest_dir)
+
+    return digests
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""
+Append-only checksum manifest shared by each of the pipelines.
+
+A manifest is an ordinary checksum file ('digest  path' lines, readable by md5sum -c).
+Lines are only ever appended, never rewritten, and every append is made under an exclusive lock on the file
+so several threads, or several processes, can add to the same manifest without interleaving.
+An in-memory index of path -> digest answers 'has this file been checksummed already?' without re-reading the file,
+lines appended by other processes are picked up from where we last read up to.
+"""
+
+import os
+import threading
+from poreduck.checksums import parse_checksum_line
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on windows, only threads in the one process are kept in order.
+    fcntl = None
+
+# One manifest object per file in this process
+_MANIFESTS = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def open_manifest(path):
+    """
+    The shared ChecksumManifest for this path.
+    """
+    path = os.path.abspath(path)
+    with _MANIFESTS_LOCK:
+        if path not in _MANIFESTS:
+            _MANIFESTS[path] = ChecksumManifest(path)
+        return _MANIFESTS[path]
+
+
+class ChecksumManifest:
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.offset = 0  # How far into the file we've read
+        self.lock = threading.Lock()
+        with self.lock:
+            self.refresh()
+
+    def refresh(self):
+        # Read any lines appended since we last looked, call with the lock held.
+        if not os.path.isfile(self.path):
+            return
+        if os.path.getsize(self.path) < self.offset:
+            # The file has been replaced, start again
+            self.index = {}
+            self.offset = 0
+        with open(self.path, 'rb') as manifest_h:
+            manifest_h.seek(self.offset)
+            data = manifest_h.read()
+        # Only complete lines, a line being written right now is picked up next time
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode().splitlines():
+            checksum = parse_checksum_line(line)
+            if checksum is not None:
+                self.index[checksum[1]] = checksum[0]
+        self.offset += len(complete)
+
+    def get(self, path):
+        # Digest of path, or None if it hasn't been checksummed
+        with self.lock:
+            if path not in self.index:
+                self.refresh()
+            return self.index.get(path)
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def append(self, digest, path):
+        """
+        Add a line for path unless the manifest already has this digest for it.
+        Returns True if a line was written.
+        """
+        with self.lock:
+            if self.index.get(path) == digest:
+                return False
+            with open(self.path, 'a') as manifest_h:
+                if fcntl is not None:
+                    fcntl.flock(manifest_h.fileno(), fcntl.LOCK_EX)
+                try:
+                    # Another process may have added it while we waited for the lock
+                    self.refresh()
+                    if self.index.get(path) == digest:
+                        return False
+                    manifest_h.write("%s  %s\n" % (digest, path))
+                    manifest_h.flush()
+                    os.fsync(manifest_h.fileno())
+                    self.refresh()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(manifest_h.fileno(), fcntl.LOCK_UN)
+            return True
+
+    def append_line(self, line):
+        # A line in the 'digest  path' format
+        checksum = parse_checksum_line(line)
+        if checksum is None:
+            raise ValueError("Not a checksum line: '%s'" % line)
+        return self.append(*checksum)
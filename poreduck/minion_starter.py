@@ -9,11 +9,6 @@ import h5py
 from datetime import datetime, timedelta
 import pandas as pd
 import os
-import shutil
-import subprocess
-import time
-# Use the python tar module to pipe data into gzip.
-import tarfile
 import sys
 # Import matplotlib and friends
 import matplotlib
@@ -26,6 +21,17 @@ import seaborn as sns
 import numpy as np
 from itertools import chain
 import re
+from poreduck.fast5_validator import validate_fast5_files, write_quarantine_list
+from poreduck.fast5_repack import repack_folder
+from poreduck.dir_snapshot import DirectorySnapshot
+from poreduck.checkpoint import RunCheckpoint
+from poreduck.watcher import open_watcher
+from poreduck.fast5_names import parse_fast5_names, parse_fast5_name, is_consistent
+from poreduck.archive import write_archive
+from poreduck.compressors import CompressionSettings, add_compression_arguments
+from poreduck.tar_scheduler import TarScheduler, add_tar_scheduler_arguments
+from poreduck.manifest import open_manifest
+from poreduck.checksums import add_checksum_arguments, get_checksum_file_name, DEFAULT_ALGORITHM
 
 """
 Class types
@@ -57,26 +63,23 @@ To do:
 
 
 class Fast5file:
-    def __init__(self, filename, input_folder, is_mux=False):
+    def __init__(self, filename, input_folder, is_mux=False, name_fields=None):
         self.filename = filename
         self.file_path = os.path.join(input_folder, self.filename)
-        # To get the rest of the attributes from the filename,
-        # Split the filename into that which is before 'sequencing_run'
-        # And that which is after sequencing run
-        if is_mux:
-            pre_seq_pivot, post_seq_pivot = self.filename.rsplit("mux_scan", 1)
-        else:
-            pre_seq_pivot, post_seq_pivot = self.filename.rsplit("sequencing_run", 1)
-        pre_seq_pivot = pre_seq_pivot.split("_")
-        post_seq_pivot = post_seq_pivot.split("_")
-        # Slurm node, date and f_id are all premux
-        # Not needed as of yet
-        # Channel, read, rnumber and sample_id are all post pivot
-        self.channel = post_seq_pivot[-2]
-        self.read = post_seq_pivot[-4]
-        self.rnumber = post_seq_pivot[-6]
-        self.sample_id = post_seq_pivot[0:-6]
+        # The rest of the attributes come from the filename,
+        # Usually parsed for the whole folder at once by the subfolder.
+        if name_fields is None:
+            name_fields = parse_fast5_name(self.filename)
         self.corrupted = False
+        if name_fields is None:
+            self.corrupted = True
+            print("%s does not match the fast5 naming scheme" % self.filename)
+            return
+        # Channel, read, rnumber and sample_id
+        self.channel = name_fields["channel"]
+        self.read = name_fields["read"]
+        self.rnumber = name_fields["rnumber"]
+        self.sample_id = name_fields["sample_id"]
         # Now get inside the fast5 file
         with h5py.File(self.file_path) as f:
             # Get attributes from /Raw/Reads/
@@ -132,11 +135,13 @@ class Subfolder:
         self.path = os.path.join(self.pardir, number) 
         self.metadata_dir = metadata_dir
         self.metadata_path = ""
+        self.quarantine_path = ""
         # Initialise the stage parameters. 
         self.is_full = False
         self.is_tarred = False
         # Initialise fast5_file list and dataframe
         self.fast5_files = []
+        self.quarantined = {}
         self.pd = None
         # Initialise start and end times
         self.rnumber = ""
@@ -149,7 +154,7 @@ class Subfolder:
         self.tar_path = ""
         self.num_fast5_files = 0
         self.run = run
-        self.md5sum = None
+        self.digest = None
 
     def get_new_folder_name(self): 
         # Create the new folder name
@@ -159,16 +164,25 @@ class Subfolder:
             mux_seq = "sequencing_run"
         self.new_folder_name = '_'.join([self.standard_int, mux_seq, self.rnumber])
         self.new_folder_path = os.path.join(self.pardir, self.new_folder_name)
-        self.tar_file = self.new_folder_name + ".fast5.tar.gz"
+        self.tar_file = self.new_folder_name + ".fast5.tar" + self.run.compression.suffix
         self.tar_path = os.path.join(self.pardir, self.tar_file)
         self.metadata_path = os.path.join(self.metadata_dir, self.new_folder_name+".tsv")
+        self.quarantine_path = os.path.join(self.metadata_dir, self.new_folder_name+".quarantine.tsv")
 
     def get_fast5_files(self):
+        # Quick check of each of the files before opening them up properly
+        valid_files, self.quarantined = validate_fast5_files(self.path, self.run.snapshot.fast5_files(self.number))
+        # Parse all of the names in one go
+        names_df, unparsed = parse_fast5_names(valid_files)
+        if not is_consistent(names_df):
+            print("Warning, fast5 files in %s come from more than one run" % self.path)
+        for fast5_file in unparsed:
+            self.quarantined[fast5_file] = "unparsed_name"
         # Fast5 class
-        self.fast5_files = [Fast5file(fast5_file, self.path, is_mux=self.is_mux)
-                            for fast5_file in os.listdir(path=self.path)
-                            if fast5_file.endswith(".fast5")]
-        self.num_fast5_files = len(self.fast5_files)
+        self.fast5_files = [Fast5file(name_fields["filename"], self.path, is_mux=self.is_mux,
+                                      name_fields=name_fields)
+                            for name_fields in names_df.to_dict(orient='records')]
+        self.num_fast5_files = len(self.fast5_files) + len(self.quarantined)
         if self.num_fast5_files == 0:
             # We get in here when empty folders exist post run.
             self.is_full = False
@@ -190,6 +204,8 @@ class Subfolder:
 
     def write_dataframe(self):
         self.pd.to_csv(self.metadata_path, header=True, index=False, sep="\t")
+        # Record any files we could not read alongside the metadata
+        write_quarantine_list(self.quarantined, self.quarantine_path)
 
     def folder_exists(self):
         if os.path.isdir(self.path):
@@ -199,8 +215,7 @@ class Subfolder:
 
     def is_empty(self):
         # Are there any files in this directory at all?
-        all_files_count = len([any_file
-                               for any_file in os.listdir(path=self.path)])
+        all_files_count = self.run.snapshot.file_count(self.number)
         if all_files_count == 0:
             return True
         else:
@@ -210,10 +225,8 @@ class Subfolder:
         if self.is_full:
             # We shouldn't be calling this twice.
             return
-        # Check the current status of the directory.
-        raw_fast5_count = len([fast5
-                               for fast5 in os.listdir(path=self.path)
-                               if fast5.endswith(".fast5")])
+        # Check the current status of the directory, as of the last snapshot.
+        raw_fast5_count = self.run.snapshot.fast5_count(self.number)
 
         # Determine if this folder needs deleting
         if self.is_empty():
@@ -249,92 +262,125 @@ class Subfolder:
         self.get_new_folder_name()
         self.write_dataframe()
 
+    def to_checkpoint(self):
+        # Everything we need to pick this subfolder back up after a restart
+        return {"is_full": self.is_full,
+                "is_tarred": self.is_tarred,
+                "digest": self.digest,
+                "rnumber": self.rnumber,
+                "start_time": self.start_time,
+                "end_time": self.end_time}
+
+    def restore(self, values):
+        # Restore the state of the subfolder from its checkpoint
+        self.is_full = values["is_full"]
+        self.is_tarred = values["is_tarred"]
+        # Checkpoints written by older versions have an md5sum instead
+        self.digest = values.get("digest", values.get("md5sum"))
+        self.rnumber = values["rnumber"]
+        self.start_time = pd.Timestamp(values["start_time"]) if values["start_time"] is not None else None
+        self.end_time = pd.Timestamp(values["end_time"]) if values["end_time"] is not None else None
+        self.get_new_folder_name()
+        # Use the metadata table rather than re-reading every fast5 file
+        if os.path.isfile(self.metadata_path):
+            self.pd = pd.read_csv(self.metadata_path, header=0, sep="\t",
+                                  parse_dates=["StartTime", "EndTime"])
+
     def tar_folder(self):
         # Always ensure the previous stage has been completed
         if not self.is_full and not self.run.complete:
             return
         # Always ensure the this stage has been
         # First move the folder to the new folder path location
-        os.rename(self.path, self.new_folder_path)
-
-        """Tar folder using pigz"""
-        with tarfile.open(name=self.tar_path+".tmp", mode="w:gz") as tar_h:
-            tar_h.add(name=self.new_folder_path,  # Set arc name as relative path
-                      arcname=os.path.basename(os.path.normpath(self.new_folder_path)),
-                      recursive=True)
-        # Just let the filesystem catch up
-        time.sleep(1)
-        # Now delete the path that exists
-        shutil.rmtree(self.new_folder_path)
-
-        # On the rare occasion, the system may not be able to find this file even if it exists.
-        # Generate a while loop and exit after fifteen seconds if no file is found.
-        index = 0
-        while True:
-            if index > 3:
-                sys.exit("Error, could not found %s.tmp" % self.tar_path)
-            try:
-                os.rename(self.tar_path+".tmp", self.tar_path)
-                break
-            except IOError:
-                print("Warning: %s.tmp not found." % self.tar_path)
-                print("Attempting to find again in fifteen seconds")
-                time.sleep(15)
-                index += 1
+        # Unless we were restarted after it had already been moved.
+        if not os.path.isdir(self.new_folder_path):
+            os.rename(self.path, self.new_folder_path)
+        self.run.snapshot.forget(self.number)
+
+        # Merge the single read files into a few multi read files before tarring
+        if self.run.repack:
+            repack_folder(self.new_folder_path)
+
+        # Tar, gzip and checksum the folder in one pass, then delete the folder.
+        self.digest = write_archive(self.new_folder_path, self.tar_path,
+                                    compression=self.run.compression, remove_source=True,
+                                    checksum=self.run.checksum_algorithm)
         self.is_tarred = True
 
-    def get_tar_md5(self):
-        md5_command = ["md5sum", self.tar_path]
-        md5_proc = subprocess.run(md5_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if not md5_proc.returncode == 0:
-            print("Warning, md5_proc returned error code %s" % md5_proc.returncode)
-        stdout = md5_proc.stdout.decode()
-        self.md5sum = stdout.split(" ", 1)[0].strip()
-
 
 class Run:
-    def __init__(self, path, name, start_date, start_time, is_mux=False):
+    def __init__(self, path, name, start_date, start_time, is_mux=False, repack=False, compression=None,
+                 tar_scheduler=None, checksum_algorithm=DEFAULT_ALGORITHM):
         self.path = path
         self.name = name
         self.fast5_path = os.path.join(self.path, "fast5")
         self.is_mux = is_mux
+        self.repack = repack
+        self.compression = compression if compression is not None else CompressionSettings()
+        self.tar_scheduler = tar_scheduler if tar_scheduler is not None else TarScheduler()
         self.complete = False
         self.start_time = start_time
         self.start_date = start_date
         self.completion_time = None
         self.subfolders = []
+        self.subfolder_numbers = set()
+        self.snapshot = DirectorySnapshot(self.fast5_path)
         self.metadata_dir = os.path.join(self.path, "metadata")
         self.plots_dir = os.path.join(self.path, "plots")
-        self.checksum = os.path.join(self.path, "checksum.md5")
+        self.checksum_algorithm = checksum_algorithm
+        self.checksum = os.path.join(self.path, get_checksum_file_name("checksum", checksum_algorithm))
         self.df = None
         if not os.path.isdir(self.metadata_dir):
             os.mkdir(self.metadata_dir)
         if not os.path.isdir(self.plots_dir):
             os.mkdir(self.plots_dir)
+        # Pick up where we left off if we've been restarted
+        self.checkpoint = RunCheckpoint(os.path.join(self.metadata_dir, "checkpoint.jsonl"))
+        self.restore_checkpoint()
+
+    def restore_checkpoint(self):
+        records = self.checkpoint.load()
+        # Run level values
+        run_values = records.pop("run", None)
+        if run_values is not None:
+            self.start_time = pd.Timestamp(run_values["start_time"]).to_pydatetime()
+            self.completion_time = pd.Timestamp(run_values["completion_time"]).to_pydatetime()
+        # Subfolders that were full or tarred in the previous instance
+        for number in sorted(records.keys(), key=lambda x: int(x)):
+            subfolder = Subfolder(self.fast5_path, number, self.metadata_dir, self, is_mux=self.is_mux)
+            subfolder.restore(records[number])
+            self.subfolders.append(subfolder)
+            self.subfolder_numbers.add(number)
+        if len(records) > 0:
+            print("Restored %d subfolders for %s from checkpoint" % (len(records), self.path))
 
     def get_subfolders(self):
-        # Get all folders currently in the directory
-        folders = sorted([folder
-                          for folder in os.listdir(path=self.fast5_path)
-                          if folder.isdigit()],
-                          key=lambda x: int(x))
+        # Get all folders currently in the directory, one sweep per cycle
+        folders = self.snapshot.refresh()
         for folder in folders:
             # Don't read in current folders
-            if folder in [subfolder.number
-                          for subfolder in self.subfolders]:
+            if folder in self.subfolder_numbers:
                 continue
             # Append new folders
             self.subfolders.append(Subfolder(self.fast5_path, folder, self.metadata_dir, self, is_mux=self.is_mux))
+            self.subfolder_numbers.add(folder)
 
     def tar_subfolders(self):
+        submitted = []
         for folder in self.subfolders:
             if folder.is_tarred:
                 continue # Only the first folder will get to here.
             if not folder.is_full:
                 folder.check_if_full()
+                if folder.is_full:
+                    self.checkpoint.record(folder.number, **folder.to_checkpoint())
             if folder.is_full and not folder.is_tarred:
-                folder.tar_folder()
-                folder.get_tar_md5()
+                source_dir = folder.path if os.path.isdir(folder.path) else folder.new_folder_path
+                self.tar_scheduler.submit(folder.new_folder_name, source_dir, folder.tar_folder)
+                submitted.append(folder)
+        # Record each folder as it finishes, in the order they were submitted.
+        for folder, (name, result) in zip(submitted, self.tar_scheduler.results_in_order()):
+            self.checkpoint.record(folder.number, **folder.to_checkpoint())
 
     def slim_tarred_subfolders(self):
         # For each subfolder, unlink the list of fast5 files.
@@ -389,6 +435,8 @@ class Run:
         # Get expected finish time from fast5 file
         if self.completion_time is None:
             self.completion_time = self.get_run_finish_time()
+            if isinstance(self.start_time, datetime):
+                self.checkpoint.record("run", start_time=self.start_time, completion_time=self.completion_time)
         # Determine if run is complete.
         current_time = datetime.utcnow()
         # If difference is less than zero, run is finished
@@ -401,13 +449,14 @@ class Run:
 
     def write_md5(self):
         """
-        Append to the checksum file. 0000_SAMPLE_XYZ.tar.gz  md5sumhashcode
+        Append to the checksum file. hashcode  fast5/0000_SAMPLE_XYZ.tar.gz
+        Only newly tarred subfolders are appended, the file is never rewritten.
         Rsync needs to not include this file in transfer.
         """
-        with open(self.checksum, 'w') as check_h:
-            for subfolder in self.subfolders:
-                if subfolder.md5sum is not None:
-                    check_h.write("%s  fast5/%s\n" % (subfolder.md5sum, subfolder.tar_file))
+        manifest = open_manifest(self.checksum)
+        for subfolder in self.subfolders:
+            if subfolder.digest is not None:
+                manifest.append(subfolder.digest, "fast5/%s" % subfolder.tar_file)
 
     def get_bulk_metadata(self):
         """
@@ -572,7 +621,8 @@ class Run:
 
 
 class Sample:
-    def __init__(self, sample_name, samplesheet, reads_path):
+    def __init__(self, sample_name, samplesheet, reads_path, repack=False, compression=None,
+                 tar_scheduler=None, checksum_algorithm=DEFAULT_ALGORITHM):
         self.pd = samplesheet.query("SampleName=='%s'" % sample_name)
         # Get the active runs for this sample
         self.runs = []
@@ -585,8 +635,12 @@ class Sample:
             else:
                 mux_path = os.path.join(reads_path, '_'.join([run.UTCMuxStartDate, run.UTCMuxStartTime, run.SampleName]))
                 seq_path = os.path.join(reads_path, '_'.join([run.UTCSeqStartDate, run.UTCSeqStartTime, run.SampleName]))
-            self.runs.append(Run(mux_path, run.SampleName, run.UTCMuxStartDate, run.UTCMuxStartTime, is_mux=True))
-            self.runs.append(Run(seq_path, run.SampleName, run.UTCSeqStartDate, run.UTCSeqStartTime, is_mux=False))
+            self.runs.append(Run(mux_path, run.SampleName, run.UTCMuxStartDate, run.UTCMuxStartTime,
+                                 is_mux=True, repack=repack, compression=compression,
+                                 tar_scheduler=tar_scheduler, checksum_algorithm=checksum_algorithm))
+            self.runs.append(Run(seq_path, run.SampleName, run.UTCSeqStartDate, run.UTCSeqStartTime,
+                                 is_mux=False, repack=repack, compression=compression,
+                                 tar_scheduler=tar_scheduler, checksum_algorithm=checksum_algorithm))
     
     def is_run_complete(self):
         # All samples must be complete to return true.
@@ -697,6 +751,12 @@ def get_args():
                              "Ubuntu: /var/lib/MinKNOW/data/reads"
                              "Mac: /Library/MinKNOW/data"
                              "Windows: C:\\data\\reads")
+    parser.add_argument("--repack", default=False, action='store_true',
+                        help="Merge the single read fast5 files of each subfolder into "
+                             "multi-read fast5 files before tarring")
+    add_compression_arguments(parser)
+    add_tar_scheduler_arguments(parser)
+    add_checksum_arguments(parser)
     args = parser.parse_args()
     return args                                
                
@@ -714,16 +774,22 @@ def samplesheet_to_pd(samplesheet):
 
 def main(args):
     samplesheet = samplesheet_to_pd(args.samplesheet) 
-    samples = [Sample(sample, samplesheet, args.reads_path)
+    compression = CompressionSettings.from_args(args)
+    tar_scheduler = TarScheduler.from_args(args)
+    samples = [Sample(sample, samplesheet, args.reads_path, repack=args.repack, compression=compression,
+                      tar_scheduler=tar_scheduler, checksum_algorithm=args.checksum)
                for sample in samplesheet.SampleName.unique().tolist()]
+    # Wake up as soon as MinKNOW writes to any of the runs, rather than a fixed sleep for each run.
+    watcher = open_watcher([run.fast5_path for sample in samples for run in sample.runs])
     running = True
     first_pass = True
     while running:
         if not first_pass:
+            # Each pass replots every run, so no more than one every 15 seconds however busy MinKNOW is.
+            watcher.wait(timeout=60, settle=10, min_interval=15)
             running = is_still_running(samples)
             for sample in samples:
                 for run in sample.runs:
-                    time.sleep(15)
                     # This is going to break if no subfolders
                     if len([subfolder.pd for subfolder in run.subfolders
                             if subfolder.pd is not None]) == 0:
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Is MinKNOW still running?
+
+The transfer scripts used to answer this every cycle with 'ps -ef | grep MinKNOW | grep experiment | ...',
+a shell and five processes to dump the whole process table.
+Instead the command lines in /proc/<pid>/cmdline are read directly,
+and once the MinKNOW process has been found we only check that /proc/<pid> is still the same process.
+Where there is no /proc (mac, cygwin on windows) we fall back to ps.
+
+MinKNOW can also be left open long after the run has finished,
+so, optionally, a run whose reads directories haven't had a new fast5 file in idle_minutes is treated as finished,
+process or no process.
+"""
+
+import os
+import re
+import subprocess
+import time
+
+# Each pattern is a list of regular expressions, all of which must match the command line of the process.
+SEQUENCING_PATTERN = ["MinKNOW", "experiment", "sequencing"]
+PYTHON_SCRIPT_PATTERN = ["MinKNOW", "python", r"\.py$"]
+PROC_DIR = "/proc"
+
+
+def read_cmdline(pid):
+    # Command line of the process, arguments separated by spaces as in ps. None if it has gone.
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "cmdline"), 'rb') as cmdline_h:
+            return cmdline_h.read().rstrip(b"\0").replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return None
+
+
+def read_stat_fields(pid):
+    # Fields of /proc/<pid>/stat from the state onwards, None if it has gone.
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "stat")) as stat_h:
+            stat = stat_h.read()
+    except OSError:
+        return None
+    # The process name may contain spaces, the fields we want come after its closing bracket.
+    return stat[stat.rindex(")") + 2:].split()
+
+
+def read_start_time(pid):
+    # Start time of the process in clock ticks since boot, so a recycled pid isn't mistaken for MinKNOW.
+    # None if the process has gone, or has exited and is just waiting to be reaped.
+    fields = read_stat_fields(pid)
+    if fields is None or fields[0] == "Z":
+        return None
+    return int(fields[19])
+
+
+def get_ancestors():
+    # Our own pid and those of our parents, the shell that started us may well have MinKNOW in its command line.
+    pids = set()
+    pid = os.getpid()
+    while pid > 0 and pid not in pids:
+        pids.add(pid)
+        fields = read_stat_fields(pid)
+        if fields is None:
+            break
+        pid = int(fields[1])
+    return pids
+
+
+def matches(cmdline, patterns):
+    return any(all(re.search(regex, cmdline) for regex in pattern) for pattern in patterns)
+
+
+def find_processes(patterns):
+    # pids whose command lines match any of the patterns, ignoring our own.
+    ancestors = get_ancestors()
+    pids = []
+    for entry in os.listdir(PROC_DIR):
+        if not entry.isdigit() or int(entry) in ancestors:
+            continue
+        cmdline = read_cmdline(entry)
+        if cmdline and matches(cmdline, patterns):
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def is_running_ps(patterns):
+    # No /proc, so ask ps instead
+    ps_command = ["ps", "-efW"] if os.name == 'nt' else ["ps", "-ef"]
+    stdout = subprocess.run(ps_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True).stdout
+    return any(matches(line, patterns) for line in stdout.split("\n") if "grep" not in line)
+
+
+def get_last_write_time(reads_dirs):
+    """
+    Most recent time a file was added to any folder under reads_dirs.
+    Only the directories are looked at, adding a file to a directory updates its modification time.
+    """
+    last_write_time = 0
+    for reads_dir in reads_dirs:
+        for dirpath, dirnames, filenames in os.walk(reads_dir):
+            try:
+                last_write_time = max(last_write_time, os.stat(dirpath).st_mtime)
+            except OSError:
+                continue
+    return last_write_time
+
+
+class MinKNOWMonitor:
+    def __init__(self, patterns=None, reads_dirs=None, idle_minutes=None):
+        """
+        :param patterns: list of patterns, see SEQUENCING_PATTERN, defaults to [SEQUENCING_PATTERN]
+        :param reads_dirs: directories MinKNOW writes fast5 files to, for idle_minutes
+        :param idle_minutes: treat MinKNOW as finished if nothing new has been written in this long, None to ignore.
+        """
+        self.patterns = patterns if patterns is not None else [SEQUENCING_PATTERN]
+        self.reads_dirs = reads_dirs if reads_dirs is not None else []
+        self.idle_minutes = idle_minutes
+        self.pid = None
+        self.start_time = None
+
+    def is_process_running(self):
+        if not os.path.isdir(PROC_DIR):
+            return is_running_ps(self.patterns)
+        # Still the same process as last time?
+        if self.pid is not None and read_start_time(self.pid) == self.start_time:
+            return True
+        self.pid = None
+        self.start_time = None
+        for pid in find_processes(self.patterns):
+            # Skip any that have exited since we listed them
+            start_time = read_start_time(pid)
+            if start_time is None:
+                continue
+            self.pid = pid
+            self.start_time = start_time
+            print("MinKNOW running as process %d" % self.pid)
+            return True
+        return False
+
+    def is_idle(self):
+        if self.idle_minutes is None or len(self.reads_dirs) == 0:
+            return False
+        idle_seconds = time.time() - get_last_write_time(self.reads_dirs)
+        if idle_seconds > self.idle_minutes * 60:
+            print("No new files in %s for %d minutes" % (', '.join(self.reads_dirs), idle_seconds // 60))
+            return True
+        return False
+
+    def is_running(self):
+        return self.is_process_running() and not self.is_idle()
@@ -20,6 +20,7 @@ from itertools import chain
 import seaborn as sns
 import time
 import gzip
+from poreduck.watcher import open_watcher
 
 """
 This script will create a yield plot of the data that has been created by the
@@ -38,6 +39,7 @@ except AssertionError:
 # Set global variables
 CSV_DIR = ""
 FASTQ_DIR = ""
+WATCHER = None  # Wakes us up when a new fastq or csv file is written
 PLOTS_DIR = ""
 CWD = os.path.abspath(os.getcwd())
 CSV_FILES = []
@@ -159,7 +161,7 @@ class Read_Set:
 
 
 def set_arguments(args):
-    global CSV_DIR, FASTQ_DIR, PLOTS_DIR
+    global CSV_DIR, FASTQ_DIR, PLOTS_DIR, WATCHER
     global CSV_FILES, SAMPLE_NAME, CLIP, GZIPPED, FASTQ_SUFFIX
     if not args.no_csv:
         CSV_DIR = args.csv_dir
@@ -180,6 +182,7 @@ def set_arguments(args):
     if not os.path.isdir(FASTQ_DIR):
         sys.exit(f"Error: {FASTQ_DIR} could not be found")
     FASTQ_DIR = os.path.abspath(FASTQ_DIR)
+    WATCHER = open_watcher([FASTQ_DIR] + ([CSV_DIR] if not CSV_DIR == "" else []))
     if args.sample_name:
         SAMPLE_NAME = args.sample_name
     if args.clip:
@@ -593,7 +596,8 @@ def is_basecalling():
 
 
 def have_a_break():
-    time.sleep(15)
+    # Up to a minute, or until new fastq files appear, replotting no more than every 15 seconds
+    WATCHER.wait(timeout=60, settle=10, min_interval=15)
 
 
 def run_plot_commands():
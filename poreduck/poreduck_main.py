@@ -4,6 +4,10 @@ import os
 import sys
 import argparse
 import poreduck.version
+from poreduck.compressors import add_compression_arguments
+from poreduck.tar_scheduler import add_tar_scheduler_arguments
+from poreduck.archive_index import add_extract_arguments
+from poreduck.checksums import add_checksum_arguments, add_verify_arguments
 
 
 # Return version number
@@ -18,6 +22,10 @@ def run_function(args):
         import poreduck.minion_starter as command_to_run
     if args.command == "albacoreHPC":
         import poreduck.albacore_server_scaled as command_to_run
+    if args.command == "extract":
+        import poreduck.archive_index as command_to_run
+    if args.command == "verify":
+        import poreduck.checksums as command_to_run
     # Now run it!
     command_to_run.main(args)
 
@@ -57,6 +65,12 @@ def main():
                              "Ubuntu: /var/lib/MinKNOW/data/reads"
                              "Mac: /Library/MinKNOW/data"
                              "Windows: C:\\data\\reads")
+    tar_parser.add_argument("--repack", default=False, action='store_true',
+                            help="Merge the single read fast5 files of each subfolder into "
+                                 "multi-read fast5 files before tarring")
+    add_compression_arguments(tar_parser)
+    add_tar_scheduler_arguments(tar_parser)
+    add_checksum_arguments(tar_parser)
     tar_parser.set_defaults(func=run_function)
 
     # Albacore server arguments:
@@ -97,6 +111,19 @@ def main():
                                       "Check the poreduck examples for more information.")
     albacore_parser.set_defaults(func=run_function)
 
+    # Extract arguments
+    extract_parser = subparsers.add_parser('extract',
+                                           help="Pull single fast5 files out of an indexed archive " +
+                                                "without decompressing the whole archive")
+    add_extract_arguments(extract_parser)
+    extract_parser.set_defaults(func=run_function)
+
+    # Verify arguments
+    verify_parser = subparsers.add_parser('verify',
+                                          help="Re-hash archives and compare them to their checksum files")
+    add_verify_arguments(verify_parser)
+    verify_parser.set_defaults(func=run_function)
+
     # Compare arguments
     compare_parser = subparsers.add_parser('compare_runs',
                                            help="This command takes in a samplesheet and plots each of the samples")
@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 
 import argparse
-import tarfile
 import logging
 import os
+import struct
 import sys
+import threading
 from datetime import datetime
-import subprocess
 import shutil
-import time
-import gzip
+from poreduck.archive import write_archive, write_compressed_file
+from poreduck.compressors import CompressionSettings, add_compression_arguments, BLOCK_SIZE
+from poreduck.checksums import add_checksum_arguments, get_checksum_path, hash_file, DEFAULT_ALGORITHM
+from poreduck.manifest import open_manifest
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -23,7 +25,7 @@ Sequencing_summary: sequencing_summary_0.txt to sequencing_summary/00000_<Flowce
 """
 
 
-def get_args():
+def get_args(argv=None):
     parser = argparse.ArgumentParser(description="Tar up a folder of nanopore data")
     parser.add_argument('--sequencing_summary_path',
                         help="Path to sequencing_summary_path", required=True)
@@ -36,15 +38,21 @@ def get_args():
     parser.add_argument("--rnumber",
                         help="Add random number to folder", required=True)
     parser.add_argument("--md5_fast5",
-                        help="File to append to md5sum for fast5 files", required=True)
+                        help="File to append to md5sum for fast5 files, "
+                             "the suffix is changed to match --checksum (.b2 for blake2b ...)", required=True)
     parser.add_argument("--md5_fastq",
-                        help="File to append to md5sym for fastq files", required=True)
+                        help="File to append to md5sym for fastq files, "
+                             "the suffix is changed to match --checksum", required=True)
     parser.add_argument("--inplace", action='store_true', default=False, help="Remove folders as well")
     parser.add_argument("--overwrite", action='store_true', default=False,
                         help="Overwrite output file rather than append to it")
     parser.add_argument("--dry-run", dest='dry_run', action='store_true', default=False,
                         help="Don't actually tar anything, just output the logs")
-    args = parser.parse_args()
+    add_compression_arguments(parser)
+    add_checksum_arguments(parser)
+    parser.add_argument("--fastq_threads", type=int, default=None,
+                        help="Number of threads to gzip the fastq file with, defaults to the number of cpus")
+    args = parser.parse_args(argv)
     # Log arguments
     for arg, value in sorted(vars(args).items()):
         logger.info("Argument %s: %r", arg, value)
@@ -64,10 +72,10 @@ def get_output_name(args):
     return output_name
 
 
-def get_fast5_output_path(fast5_path, output_name):
-    # Get the .tar.gz. output to the folder
+def get_fast5_output_path(fast5_path, output_name, suffix=".gz"):
+    # Get the .tar.gz. output to the folder, suffix depends on the compression used.
     folder_dirpath = os.path.dirname(os.path.normpath(fast5_path))
-    output_path = os.path.join(folder_dirpath, output_name + ".fast5.tar.gz")
+    output_path = os.path.join(folder_dirpath, output_name + ".fast5.tar" + suffix)
     logging.info("Tar will be written to %s" % output_path)
     return output_path
 
@@ -102,23 +110,75 @@ def move_sequencing_summary_file(summary_path, output_path, overwrite=False, inp
         logging.info("Would have moved summary from %s into %s" % (summary_path, output_path))
 
 
-def zip_and_move_fastq_file(fastq_path, output_path, overwrite=False, inplace=False, dry_run=False):
-    if not dry_run:
-        if os.path.isfile(output_path) and not overwrite:
+def get_recorded_checksum(output_path, md5_file):
+    # The checksum line for the output file if it's already in the checksum file, otherwise None
+    if md5_file is None or not os.path.isfile(md5_file):
+        return None
+    output_file = os.path.basename(os.path.normpath(output_path))
+    digest = open_manifest(md5_file).get(output_file)
+    if digest is None:
+        return None
+    return "%s  %s" % (digest, output_file)
+
+
+def gzip_size_matches(gzip_path, input_size):
+    """
+    Cheap check that a gzip file is the whole of the input, using the size in the trailer of the last member.
+    That is the input size (mod 2^32) for a single member,
+    or the size of the last block for the multi-member output of the parallel writer.
+    """
+    if os.path.getsize(gzip_path) < 18:
+        return False
+    with open(gzip_path, 'rb') as gzip_h:
+        gzip_h.seek(-4, os.SEEK_END)
+        last_member_size = struct.unpack("<I", gzip_h.read(4))[0]
+    last_block_size = input_size % BLOCK_SIZE or min(input_size, BLOCK_SIZE)
+    return last_member_size in (input_size & 0xffffffff, last_block_size)
+
+
+def zip_and_move_fastq_file(fastq_path, output_path, overwrite=False, inplace=False, dry_run=False,
+                            compression=None, threads=None, checksum=DEFAULT_ALGORITHM, md5_file=None):
+    """
+    Gzip the fastq file into output_path, checksumming as we go.
+    Returns the checksum line for the output, or None on a dry run.
+    """
+    if dry_run:
+        logging.info("Would have gzipped and moved fastq %s into %s" % (fastq_path, output_path))
+        return None
+
+    if os.path.isfile(output_path) and not overwrite:
+        # Output is only ever renamed into place once complete, so if it's in the checksum file
+        # and it's the size of the input, it's done.
+        md5_output = get_recorded_checksum(output_path, md5_file)
+        if md5_output is not None and (not os.path.isfile(fastq_path) or
+                                       gzip_size_matches(output_path, os.path.getsize(fastq_path))):
             logging.info("Fastq file %s already exists in destination and overwrite not set. "
                          "Skipping" % output_path)
-        # Zip and move the summary file
-        with open(fastq_path, 'rb') as f_in, gzip.open(output_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        if inplace:
-            # Wait for file system to catch up then remove
-            time.sleep(1)
-            os.remove(fastq_path)
-    else:
-        logging.info("Would have gzipped and moved fastq %s into %s" % (fastq_path, output_path))
-
-
-def tar_up_folder(fast5_path, output_path, overwrite=False, inplace=False, dry_run=False):
+            if inplace and os.path.isfile(fastq_path):
+                os.remove(fastq_path)
+            return md5_output
+        logging.info("Fastq file %s exists but is not complete, rewriting" % output_path)
+
+    # Zip and move the fastq file, always gzip but use the level we've been given,
+    # split into blocks and deflated on each of the cpus.
+    if threads is None:
+        threads = os.cpu_count() or 1
+    level = None
+    if compression is not None and compression.codec == "gzip":
+        level = compression.level
+    fastq_compression = CompressionSettings("gzip", level=level, threads=threads)
+    start_time = datetime.now()
+    digest = write_compressed_file(fastq_path, output_path, compression=fastq_compression, checksum=checksum)
+    logging.info("Gzipped %s into %s in %s seconds" % (fastq_path, output_path,
+                                                       round((datetime.now() - start_time).total_seconds(), 2)))
+    if inplace:
+        # The output has been fsync'd and renamed into place by write_compressed_file
+        os.remove(fastq_path)
+    return "%s  %s" % (digest, os.path.basename(output_path))
+
+
+def tar_up_folder(fast5_path, output_path, overwrite=False, inplace=False, dry_run=False, compression=None,
+                  checksum=DEFAULT_ALGORITHM):
     # Tar up the folder provided
     # Get the output path
     logging.info("Output path is %s" % output_path)
@@ -127,15 +187,10 @@ def tar_up_folder(fast5_path, output_path, overwrite=False, inplace=False, dry_r
     fast5_path = os.path.normpath(fast5_path)
 
     # To overwrite or not to overwrite
-    if overwrite:
-        file_handler_setting = "w|gz"
-    else:
-        # Can't actually append a compressed tar yet we're going to log and return if the file exists
-        if os.path.isfile(output_path):
-            logging.info("Tar file %s exists, not overwriting" % output_path)
-            return
-        else:
-            file_handler_setting = "w|gz"  # Default is append
+    # Can't actually append a compressed tar yet we're going to log and return if the file exists
+    if not overwrite and os.path.isfile(output_path):
+        logging.info("Tar file %s exists, not overwriting" % output_path)
+        return None
 
     # Get number of files in the path
     fast5_files = [fast5_file
@@ -152,92 +207,106 @@ def tar_up_folder(fast5_path, output_path, overwrite=False, inplace=False, dry_r
         logging.info("Starting tarring %s into %s" % (fast5_path, output_path))
         logging.info("%d files to tar" % len(fast5_files))
 
-        # Open up the output_path file
-        archive = tarfile.open(output_path, file_handler_setting)
-        # Add each of the fast5 files to the archive
-        for fast5_file in fast5_files:
-            input_file = os.path.join(fast5_path, fast5_file)
-            output_file = os.path.join(os.path.basename(fast5_path), fast5_file)
-            # Add file to archive
-            archive.add(input_file, arcname=output_file)
-        # If inplace also remove the input file from the system
-        if inplace:
-            time.sleep(3)
-            # Remove folder from filesystem
-            shutil.rmtree(fast5_path)
-        # Close the archive
-        archive.close()
-        
+        # Add each of the fast5 files to the archive, checksum as we go.
+        # If inplace also remove the folder from the system once the archive is in place
+        digest = write_archive(fast5_path, output_path, files=fast5_files,
+                               compression=compression, remove_source=inplace, checksum=checksum)
+
         # Log the time taken to write the archive file
         end_time = datetime.now()
         diff_time = end_time - start_time
         logging.info("Finished tarring %s in %s" % (fast5_path, output_path))
         logging.info("Added %d files to the tar archive" % len(fast5_files))
         logging.info("Process completed in %s" % round(diff_time.total_seconds(), 2))
+        # Return the checksum in the same format as the md5sum command
+        return "%s  %s" % (digest, os.path.basename(output_path))
     else:
         logging.info("Would have tarred %s into %s" % (fast5_path, output_path))
+        return None
 
 
-def get_md5sum(output_path):
-    logging.info("Obtaining the md5sum for %s" % output_path)
+def get_md5sum(output_path, checksum=DEFAULT_ALGORITHM):
+    logging.info("Obtaining the %s checksum for %s" % (checksum, output_path))
 
-    # Grab the md5sum of the file. Use the relative path
+    # Grab the checksum of the file. Use the relative path
     output_file = os.path.basename(os.path.normpath(output_path))
-    work_dir = os.path.dirname(os.path.normpath(output_path))
-    md5_command = ['md5sum', output_file]
-    md5_proc = subprocess.run(md5_command, capture_output=True, cwd=work_dir)
-    md5_output = md5_proc.stdout.decode().splitlines()[0]
-    logging.info("Obtained %s as md5 for %s" % (md5_output, output_path))
-    
-    # Return the md5 of the file for writing to a checksum file
+    md5_output = "%s  %s" % (hash_file(output_path, checksum), output_file)
+    logging.info("Obtained %s as checksum for %s" % (md5_output, output_path))
+
+    # Return the checksum of the file for writing to a checksum file
     return md5_output
 
 
 def write_md5sum(md5_sum, output_md5_file):
-    logging.info("Writing md5sum '%s' to %s" % (md5_sum, output_md5_file))
-    with open(output_md5_file, 'a') as md5_h:
-        md5_h.write(md5_sum + "\n")
+    # Appends are locked so the wrapper's rows, or separate processes, can share the one file.
+    # The same line isn't written twice when a file was skipped.
+    if open_manifest(output_md5_file).append_line(md5_sum):
+        logging.info("Wrote md5sum '%s' to %s" % (md5_sum, output_md5_file))
+    else:
+        logging.info("Checksum '%s' already in %s" % (md5_sum, output_md5_file))
 
 
-def main():
+def main(args=None, io_slot=None, cpu_slot=None):
+    """
+    Tar, gzip and checksum one folder.
+    The wrapper calls this for many folders at once, io_slot and cpu_slot are semaphores
+    limiting how many folders are in the disk bound and cpu bound stages at the same time.
+    """
     # Get args
-    args = get_args()
+    if args is None:
+        args = get_args()
+    if io_slot is None:
+        io_slot = threading.Semaphore()
+    if cpu_slot is None:
+        cpu_slot = threading.Semaphore()
     # Set output variables
     output_name = get_output_name(args)
-    output_fast5_path = get_fast5_output_path(args.fast5_path, output_name)
+    compression = CompressionSettings.from_args(args)
+    output_fast5_path = get_fast5_output_path(args.fast5_path, output_name, suffix=compression.suffix)
     output_fastq_path = get_fastq_output_path(args.fastq_path, output_name)
     output_sequencing_summary_path = get_sequencing_summary_output_path(args.fastq_path, output_name)
+    # Named for the checksum algorithm, so poreduck verify knows which to use
+    md5_fast5 = get_checksum_path(args.md5_fast5, args.checksum)
+    md5_fastq = get_checksum_path(args.md5_fastq, args.checksum)
 
     # Create folders for fastq and sequencing summary files if necessary
     fastq_dir = os.path.join(os.path.dirname(os.path.normpath(output_fastq_path)))
     sequencing_summary_dir = os.path.join(os.path.dirname(os.path.normpath(output_sequencing_summary_path))) 
 
-    # Create fastq directory
-    if not os.path.isdir(fastq_dir):
-        os.mkdir(fastq_dir)
-
-    # Create sequencing summary directory
-    if not os.path.isdir(sequencing_summary_dir):
-        os.mkdir(sequencing_summary_dir)
-
-    # Tar up folder
-    tar_up_folder(args.fast5_path, output_fast5_path,
-                  overwrite=args.overwrite, inplace=args.inplace, dry_run=args.dry_run)
+    # Create fastq and sequencing summary directories, other rows of the wrapper may be creating them too
+    os.makedirs(fastq_dir, exist_ok=True)
+    os.makedirs(sequencing_summary_dir, exist_ok=True)
+
+    # Tar up folder, reading from the disk and, unless it's a plain tar, compressing on the cpus too.
+    # Always take io_slot before cpu_slot, so two rows never wait on each other.
+    tar_cpu_slot = cpu_slot if compression.codec != "none" else threading.Semaphore()
+    with io_slot, tar_cpu_slot:
+        md5sum_fast5 = tar_up_folder(args.fast5_path, output_fast5_path,
+                                     overwrite=args.overwrite, inplace=args.inplace, dry_run=args.dry_run,
+                                     compression=compression, checksum=args.checksum)
     # Move fastq folder
-    zip_and_move_fastq_file(args.fastq_path, output_fastq_path,
-                            overwrite=args.overwrite, inplace=args.inplace, dry_run=args.dry_run)
+    with cpu_slot:
+        md5sum_fastq = zip_and_move_fastq_file(args.fastq_path, output_fastq_path,
+                                               overwrite=args.overwrite, inplace=args.inplace,
+                                               dry_run=args.dry_run, compression=compression,
+                                               threads=args.fastq_threads,
+                                               checksum=args.checksum, md5_file=md5_fastq)
     # Move sequencing summary file
-    move_sequencing_summary_file(args.sequencing_summary_path, output_sequencing_summary_path,
-                                 overwrite=args.overwrite, inplace=args.inplace, dry_run=args.dry_run)
+    with io_slot:
+        move_sequencing_summary_file(args.sequencing_summary_path, output_sequencing_summary_path,
+                                     overwrite=args.overwrite, inplace=args.inplace, dry_run=args.dry_run)
 
     # Get md5 for fastq and fast5
     if not args.dry_run:
-        md5sum_fast5 = get_md5sum(output_fast5_path)
-        md5sum_fastq = get_md5sum(output_fastq_path)
+        # The fast5 md5 was computed while tarring, unless the tar file already existed
+        if md5sum_fast5 is None:
+            md5sum_fast5 = get_recorded_checksum(output_fast5_path, md5_fast5)
+        if md5sum_fast5 is None:
+            md5sum_fast5 = get_md5sum(output_fast5_path, checksum=args.checksum)
 
         # Write md5
-        write_md5sum(md5sum_fast5, args.md5_fast5)
-        write_md5sum(md5sum_fastq, args.md5_fastq)
+        write_md5sum(md5sum_fast5, md5_fast5)
+        write_md5sum(md5sum_fastq, md5_fastq)
 
 
 if __name__ == "__main__":
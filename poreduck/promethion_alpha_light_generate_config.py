@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import argparse
+import heapq
+import math
 import os
 import yaml
 import re
@@ -9,6 +11,11 @@ import json
 
 #"""
 #Generate a yaml file used to run each of the alpha_light python commands
+#
+#Each row is costed from the size of its inputs, and rows are written out longest first
+#so a pool of workers (the wrapper, or an HPC array) doesn't finish waiting on one giant folder.
+#Rows are also packed into --workers batches of roughly equal cost, or batches of about
+#--target_seconds each, longest row first onto the least loaded batch.
 #"""
 
 
@@ -30,6 +37,15 @@ def get_args():
                         help="Where do you want the md5 for the fastq files")
     parser.add_argument("--output_yaml_file",
                         help="Yaml file to create", required=True)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of workers to balance the rows across")
+    parser.add_argument("--target_seconds", type=float, default=None,
+                        help="Aim for batches that take about this long, "
+                             "small folders are grouped and there are at least --workers batches")
+    parser.add_argument("--fast5_mb_per_s", type=float, default=150,
+                        help="Expected throughput of tarring fast5 files, used for the cost of each row")
+    parser.add_argument("--fastq_mb_per_s", type=float, default=50,
+                        help="Expected throughput of gzipping fastq files, used for the cost of each row")
 
     return parser.parse_args()
 
@@ -46,7 +62,7 @@ def get_all_files(sequencing_summary_dir, fastq_dir, fast5_dir):
                                 if re.match('sequencing_summary_\d+.txt', sequencing_summary_file)]
 
     fastq_files = [os.path.join(fastq_dir, fastq_file)
-                   for fastq_file in os.listdir(sequencing_summary_dir)
+                   for fastq_file in os.listdir(fastq_dir)
                    if re.match('fastq_\d+.fastq', fastq_file)]
 
     fast5_dirs = [os.path.join(fast5_dir, fast5_folder)
@@ -80,6 +96,61 @@ def get_all_files(sequencing_summary_dir, fastq_dir, fast5_dir):
     return pd.concat([sequencing_summary_df, fastq_df, fast5_df], axis='columns', join='inner', sort=True)
 
 
+def get_folder_stats(folder):
+    # Number of fast5 files and their total size
+    num_files = 0
+    total_bytes = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".fast5") and entry.is_file():
+                num_files += 1
+                total_bytes += entry.stat().st_size
+    return num_files, total_bytes
+
+
+def add_costs(dataset, fast5_mb_per_s=150, fastq_mb_per_s=50):
+    """
+    Stat each of the inputs and estimate the seconds each row will take.
+    """
+    fast5_stats = dataset['fast5_dir'].apply(get_folder_stats)
+    dataset['fast5_files'] = fast5_stats.apply(lambda stats: stats[0])
+    dataset['fast5_bytes'] = fast5_stats.apply(lambda stats: stats[1])
+    dataset['fastq_bytes'] = dataset['fastq_file'].apply(os.path.getsize)
+    dataset['sequencing_summary_bytes'] = dataset['sequencing_summary_file'].apply(os.path.getsize)
+    dataset['est_seconds'] = (dataset['fast5_bytes'] / 1e6 / fast5_mb_per_s +
+                              (dataset['fastq_bytes'] + dataset['sequencing_summary_bytes']) / 1e6 / fastq_mb_per_s
+                              ).round(1)
+    return dataset
+
+
+def assign_batches(dataset, workers=1, target_seconds=None):
+    """
+    Longest processing time first: sort the rows by cost, then give each row to the batch with the least work so far.
+    """
+    num_batches = max(1, workers)
+    if target_seconds is not None and target_seconds > 0:
+        num_batches = max(num_batches, int(math.ceil(dataset['est_seconds'].sum() / target_seconds)))
+    num_batches = max(1, min(num_batches, len(dataset)))
+
+    dataset = dataset.sort_values(by=['est_seconds'], ascending=False)
+    batches = [(0, batch) for batch in range(num_batches)]
+    heapq.heapify(batches)
+    assigned = []
+    for est_seconds in dataset['est_seconds']:
+        load, batch = heapq.heappop(batches)
+        assigned.append(batch)
+        heapq.heappush(batches, (load + est_seconds, batch))
+    dataset['batch'] = assigned
+
+    for load, batch in sorted(batches, key=lambda batch: batch[1]):
+        print("Batch %d: %d rows, estimated %.0f seconds" % (batch, assigned.count(batch), load))
+    for row in dataset.itertuples():
+        if target_seconds is not None and row.est_seconds > target_seconds:
+            print("%s is estimated at %.0f seconds, longer than the target on its own" %
+                  (row.fast5_dir, row.est_seconds))
+    return dataset
+
+
 def output_yaml(yaml_file, dataset):
     with open(yaml_file, 'w') as file:
         yaml.dump(json.loads(dataset.to_json(orient='records')), file, default_flow_style=True)
@@ -100,6 +171,10 @@ def main():
     dataset['md5_fast5'] = args.output_md5sum_fast5
     dataset['md5_fastq'] = args.output_md5sum_fastq
 
+    # Cost each row and balance them across the workers, longest first
+    dataset = add_costs(dataset, fast5_mb_per_s=args.fast5_mb_per_s, fastq_mb_per_s=args.fastq_mb_per_s)
+    dataset = assign_batches(dataset, workers=args.workers, target_seconds=args.target_seconds)
+
     # Output the yaml file
     output_yaml(args.output_yaml_file, dataset)
 
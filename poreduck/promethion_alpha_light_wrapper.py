@@ -4,47 +4,118 @@ import argparse
 import yaml
 import json
 import pandas as pd
-import subprocess
 import logging
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import poreduck.promethion_alpha_light as promethion_alpha_light
+from poreduck.checkpoint import RunCheckpoint
+from poreduck.checksums import add_checksum_arguments
+from poreduck.compressors import add_compression_arguments
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
+"""
+Run promethion_alpha_light on each row of the config file.
+Rows are run in this process, several at once.
+At most --io_jobs rows are tarring or moving files at any one time, and at most --cpu_jobs are gzipping fastq files,
+so a few rows can be reading from the disk while others keep the cpus busy.
+Lines in the checksum files are appended under a lock (see manifest).
+Progress is recorded in <config>.checkpoint.jsonl, --resume skips rows that completed last time.
+"""
+
+
 def get_args():
     parser = argparse.ArgumentParser(description="Get the a yaml file created in the config script")
     parser.add_argument("--config", required=True,
                         help="Path to config file")
+    parser.add_argument("--io_jobs", type=int, default=2,
+                        help="Number of rows tarring or moving files at once")
+    parser.add_argument("--cpu_jobs", type=int, default=1,
+                        help="Number of rows gzipping fastq files at once")
+    parser.add_argument("--resume", action='store_true', default=False,
+                        help="Skip the rows that completed in a previous run of this config")
+    parser.add_argument("--report", default=None,
+                        help="Path to the summary report, defaults to <config>.report.tsv, "
+                             "or <config>.batch<N>.report.tsv with --batch")
+    parser.add_argument("--batch", type=int, default=None,
+                        help="Only run the rows of this batch of the config, "
+                             "for example the task id of an HPC array job")
+    add_compression_arguments(parser)
+    add_checksum_arguments(parser)
     return parser.parse_args()
 
 
 def read_config(config):
     with open(config) as f:
-        config_data = yaml.load(f)
+        config_data = yaml.safe_load(f)
     return config_data
 
 
-def run_process(config_data):
-    here = os.path.dirname(os.path.realpath(__file__))
-    tar_proc = subprocess.run([os.path.join(here, "promethion_alpha_light.py"),  # Then come the options.
-                               "--sequencing_summary_path=%s" % config_data.sequencing_summary_file,
-                               "--fastq_path=%s" % config_data.fastq_file,
-                               "--fast5_path=%s" % config_data.fast5_dir,
-                               "--flowcellID=%s" % config_data.FlowcellID,
-                               "--rnumber=%s" % config_data.rnumber,
-                               "--md5_fast5=%s" % config_data.md5_fast5,
-                               "--md5_fastq=%s" % config_data.md5_fastq,
-                               "--inplace"],
-                              capture_output=True)
-
-    if tar_proc.returncode == 0:
-        logging.info("Process completed successfully")
-        logging.info("Stdout = %s" % tar_proc.stdout.decode())
-        logging.info("Stderr = %s" % tar_proc.stderr.decode())
-    else:
-        logging.warning("Process returned non-zero exit code.")
-        logging.warning("Stdout = %s" % tar_proc.stdout.decode())
-        logging.warning("Stderr = %s" % tar_proc.stderr.decode())
+def select_batch(dataframe, batch):
+    # Rows of the config in this batch. Configs written before there were batches are all the one batch, batch 0.
+    if "batch" not in dataframe.columns:
+        dataframe = dataframe.assign(batch=0)
+    selected = dataframe[dataframe["batch"] == batch]
+    if len(selected) == 0:
+        logging.warning("No rows of the config are in batch %d" % batch)
+    return selected
+
+
+def get_report_path(config, batch=None):
+    # <config>.report.tsv, or <config>.batch<N>.report.tsv so that array tasks don't overwrite each other's reports
+    if batch is None:
+        return config + ".report.tsv"
+    return "%s.batch%d.report.tsv" % (config, batch)
+
+
+def get_row_argv(config_data, args, row_threads):
+    # The same options we used to give to promethion_alpha_light.py on the command line,
+    # compressing on no more than row_threads threads
+    argv = ["--sequencing_summary_path=%s" % config_data.sequencing_summary_file,
+            "--fastq_path=%s" % config_data.fastq_file,
+            "--fast5_path=%s" % config_data.fast5_dir,
+            "--flowcellID=%s" % config_data.FlowcellID,
+            "--rnumber=%s" % config_data.rnumber,
+            "--md5_fast5=%s" % config_data.md5_fast5,
+            "--md5_fastq=%s" % config_data.md5_fastq,
+            "--inplace",
+            "--compression=%s" % args.compression,
+            "--compression_threads=%d" % min(args.compression_threads, row_threads),
+            "--archive_mode=%s" % args.archive_mode,
+            "--adaptive_sample_mb=%d" % args.adaptive_sample_mb,
+            "--network_mb_per_s=%s" % args.network_mb_per_s,
+            "--checksum=%s" % args.checksum,
+            "--fastq_threads=%d" % row_threads]
+    if args.compression_level is not None:
+        argv.append("--compression_level=%d" % args.compression_level)
+    if args.archive_index:
+        argv.append("--archive_index")
+    return argv
+
+
+def run_process(config_data, args, io_slot, cpu_slot, row_threads):
+    # Process the one row, returns the status and the error if there was one.
+    start_time = time.time()
+    try:
+        row_args = promethion_alpha_light.get_args(get_row_argv(config_data, args, row_threads))
+        promethion_alpha_light.main(row_args, io_slot=io_slot, cpu_slot=cpu_slot)
+    except (Exception, SystemExit) as e:
+        logging.warning("Processing %s failed: %r" % (config_data.fast5_dir, e))
+        return "failed", repr(e), time.time() - start_time
+    logging.info("Processing %s completed successfully" % config_data.fast5_dir)
+    return "completed", "", time.time() - start_time
+
+
+def write_report(report_rows, report_path):
+    report_df = pd.DataFrame(report_rows, columns=["fast5_dir", "status", "seconds", "error"])
+    report_df.to_csv(report_path, sep="\t", header=True, index=False)
+    logging.info("%d rows completed, %d failed, %d skipped. Report written to %s" %
+                 ((report_df.status == "completed").sum(), (report_df.status == "failed").sum(),
+                  (report_df.status == "skipped").sum(), report_path))
 
 
 def main():
@@ -54,11 +125,40 @@ def main():
 
     # Read in pandas dataframe
     dataframe = pd.DataFrame(read_config(args.config))
+    if args.batch is not None:
+        dataframe = select_batch(dataframe, args.batch)
+
+    # Shared by every batch of the config, appends are locked
+    checkpoint = RunCheckpoint(args.config + ".checkpoint.jsonl")
+    completed = {key for key, values in checkpoint.load().items() if values.get("status") == "completed"}
+    report_path = args.report if args.report is not None else get_report_path(args.config, args.batch)
+
+    # Separate limits on the disk bound and cpu bound stages.
+    # Only cpu_jobs rows compress at once (fast5 archives and fastq files alike), so they share the cpus out.
+    io_slot = threading.Semaphore(max(1, args.io_jobs))
+    cpu_slot = threading.Semaphore(max(1, args.cpu_jobs))
+    row_threads = max(1, (os.cpu_count() or 1) // max(1, args.cpu_jobs))
+
+    report_rows = []
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.io_jobs + args.cpu_jobs)) as executor:
+        # Iterate through each row of the configuration file.
+        for row in dataframe.itertuples():
+            if args.resume and row.fast5_dir in completed:
+                logging.info("Skipping %s, completed in a previous run" % row.fast5_dir)
+                report_rows.append([row.fast5_dir, "skipped", 0, ""])
+                continue
+            futures[executor.submit(run_process, row, args, io_slot, cpu_slot, row_threads)] = row
+        for future in as_completed(futures):
+            row = futures[future]
+            status, error, seconds = future.result()
+            checkpoint.record(row.fast5_dir, status=status, seconds=round(seconds, 2), error=error)
+            report_rows.append([row.fast5_dir, status, round(seconds, 2), error])
 
-    # Iterate through each row of the configuration file.
-    for row in dataframe.itertuples():
-        run_process(row)
+    write_report(report_rows, report_path)
+    if any(report_row[1] == "failed" for report_row in report_rows):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()    
+    main()
@@ -4,7 +4,7 @@ from promethion_starter import samplesheet_to_pd, config_to_pd
 import pandas as pd
 import os
 import argparse
-import paramiko
+from poreduck.ssh_pool import get_session
 import matplotlib
 matplotlib.use('agg')
 import matplotlib.pyplot as plt
@@ -30,13 +30,20 @@ class Slave:
     def __init__(self, slurm_id, ip):
         self.slurm_id = slurm_id
         self.ssh_ip = ip
-        self.ssh_client = None
+        self.session = None
         self.reads_path = "/tmp/output/reads"
 
+    @property
+    def ssh_client(self):
+        # Reconnects if the connection has dropped since we last used it
+        return self.session.client()
+
     def connect(self):
-        self.ssh_client = paramiko.SSHClient()
-        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.ssh_client.connect(self.ssh_ip, key_filename='/home/prom/.ssh/id_rsa.pub')
+        # The one connection to this slave, shared by each of its runs.
+        self.session = get_session(self.ssh_ip, key_filename='/home/prom/.ssh/id_rsa.pub', auto_add_host_keys=True)
+        self.session.client()
+        # For get_metadata
+        return self.session.sftp()
 
 
 class Run:
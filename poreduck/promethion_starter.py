@@ -11,7 +11,7 @@ import pandas as pd
 import os
 import shutil
 import subprocess
-import paramiko
+from poreduck.ssh_pool import get_session
 from tempfile import NamedTemporaryFile
 import time
 import sys
@@ -441,13 +441,18 @@ class Slave:
         print(slurm_id)
         self.ssh_ip = config_pd.query("SlurmID=='%s'" % self.slurm_id)['IP'].item()
         print(self.ssh_ip)
-        self.ssh_client = None
+        self.session = None
         self.reads_path = "/tmp/output/reads"
 
+    @property
+    def ssh_client(self):
+        # Reconnects if the connection has dropped since we last used it
+        return self.session.client()
+
     def connect(self):
-        self.ssh_client = paramiko.SSHClient()
-        self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.ssh_client.connect(self.ssh_ip, key_filename='/home/prom/.ssh/id_rsa.pub')
+        # The one connection to this slave, shared by each of its runs.
+        self.session = get_session(self.ssh_ip, key_filename='/home/prom/.ssh/id_rsa.pub', auto_add_host_keys=True)
+        self.session.client()
 
 """
 General process:
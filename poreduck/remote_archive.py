@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Stream the archive of a folder straight to the server, without writing it to the local disk first.
+
+Writing the tar.gz locally then rsyncing it across means the laptop's disk writes and reads every byte twice,
+while MinKNOW is busy writing to the same disk.
+Here tar -> compressor -> hash -> sftp write to <archive>.tmp on the server, on its own channel of the shared session.
+The server then checks the size and digest of what it received (md5sum, sha256sum, b2sum or xxh128sum),
+and only once they match is the archive renamed into place on the server and the local folder removed.
+If anything goes wrong the local folder is untouched, and the caller can fall back to writing the archive locally.
+"""
+
+import os
+import shlex
+import shutil
+import tempfile
+import paramiko
+from poreduck.archive import stream_archive
+from poreduck.archive_index import write_index, get_index_path
+from poreduck.checksums import DEFAULT_ALGORITHM
+
+# Command line tool to checksum the archive on the server, for each algorithm
+REMOTE_CHECKSUM_COMMANDS = {"md5": "md5sum", "sha256": "sha256sum", "blake2b": "b2sum", "xxh128": "xxh128sum"}
+COMMAND_NOT_FOUND = 127
+SFTP_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Anything that means the link, or the server, let us down
+STREAM_ERRORS = (OSError, EOFError, paramiko.SSHException)
+
+
+class RemoteVerifyError(IOError):
+    pass
+
+
+def verify_remote_file(session, remote_path, size, digest, checksum=DEFAULT_ALGORITHM):
+    # Have the server check the size and checksum of what it has written.
+    remote_size = session.sftp().stat(remote_path).st_size
+    if not remote_size == size:
+        raise RemoteVerifyError("%s is %d bytes on the server, we sent %d" % (remote_path, remote_size, size))
+    exit_status, stdout, stderr = session.exec_command("%s %s" % (REMOTE_CHECKSUM_COMMANDS[checksum],
+                                                                  shlex.quote(remote_path)))
+    if exit_status == COMMAND_NOT_FOUND:
+        # Nothing to check the digest with on the server, the size will have to do.
+        print("%s is not available on %s, checked the size of %s only" %
+              (REMOTE_CHECKSUM_COMMANDS[checksum], session.host, remote_path))
+        return
+    if not exit_status == 0 or not stdout.split()[0] == digest:
+        raise RemoteVerifyError("Checksum of %s on the server does not match: %s %s" %
+                                (remote_path, stdout.strip(), stderr.strip()))
+
+
+def remove_remote_file(session, remote_path):
+    # Best effort, the link may well be why we're here.
+    try:
+        session.sftp().remove(remote_path)
+    except STREAM_ERRORS as e:
+        print("Could not remove %s from %s: %s" % (remote_path, session.host, e))
+
+
+def stream_archive_to_server(session, source_dir, remote_path, arcname=None, files=None, compression=None,
+                             remove_source=False, checksum=DEFAULT_ALGORITHM):
+    """
+    Tar and compress source_dir straight into remote_path on the server.
+    Parameters as for archive.write_archive, with session being an ssh_pool.SSHSession.
+    The index, if there is one, is put alongside the archive on the server.
+    Returns the hex digest of the archive, raises one of STREAM_ERRORS if it didn't make it.
+    """
+    source_dir = os.path.normpath(source_dir)
+    if arcname is None:
+        arcname = os.path.basename(source_dir)
+    if compression is not None:
+        compression = compression.resolve(source_dir, files)
+    tmp_path = remote_path + ".tmp"
+
+    # Own sftp channel, so several folders can be streamed at once over the one connection.
+    sftp = session.client().open_sftp()
+    try:
+        with sftp.open(tmp_path, 'wb', bufsize=SFTP_BUFFER_SIZE) as remote_h:
+            # Don't wait for the server to acknowledge each write
+            remote_h.set_pipelined(True)
+            hashing_h, checkpoints, member_offsets = stream_archive(source_dir, remote_h, arcname, files,
+                                                                    compression, checksum)
+    finally:
+        sftp.close()
+    digest = hashing_h.hash_h.hexdigest()
+
+    try:
+        verify_remote_file(session, tmp_path, hashing_h.bytes_written, digest, checksum)
+        session.sftp().posix_rename(tmp_path, remote_path)
+    except Exception:
+        # Don't leave what we sent taking up space on the server until the retry
+        remove_remote_file(session, tmp_path)
+        raise
+
+    if compression is not None and compression.index:
+        # Small enough to write locally first
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_path = get_index_path(os.path.join(tmp_dir, os.path.basename(remote_path)))
+            write_index(index_path, compression.codec, checkpoints, member_offsets)
+            session.put(index_path, get_index_path(remote_path))
+
+    if remove_source:
+        shutil.rmtree(source_dir)
+
+    return digest
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""
+One SSH connection per server, shared by everything that talks to it.
+
+Until now each lock file, directory check and checksum copy opened its own connection to the server,
+and each rsync and scp made its own ssh handshake on top of that.
+A session here is authenticated once and kept open:
+1. exec_command and sftp open new channels on the one paramiko transport.
+2. rsync and scp are pointed at an OpenSSH ControlMaster socket (see ssh_command),
+   so after the first one they run over a connection that is already open, without another handshake.
+If the connection drops it is re-established, waiting a little longer between each attempt.
+
+Sessions are shared per (host, username, port) in this process, see get_session.
+The port and host key policy can be set so a session can be pointed at a local test server.
+"""
+
+import os
+import shlex
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import paramiko
+
+CONNECT_RETRIES = 5
+CONNECT_BACKOFF = 2  # seconds, doubled after each failed attempt
+CONNECT_TIMEOUT = 30  # seconds
+CONTROL_PERSIST = 600  # seconds the master connection stays open once the last rsync or scp has finished
+
+# One session per server in this process
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(host, username=None, port=22, **kwargs):
+    """
+    The shared SSHSession for this server, created on first use.
+    Any other keyword arguments are passed to SSHSession the first time.
+    """
+    key = (host, username, port)
+    with _SESSIONS_LOCK:
+        if key not in _SESSIONS:
+            _SESSIONS[key] = SSHSession(host, username=username, port=port, **kwargs)
+        return _SESSIONS[key]
+
+
+def close_sessions():
+    # Close each of the sessions, and their ControlMaster connections
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for session in sessions:
+        session.close()
+
+
+class SSHSession:
+    def __init__(self, host, username=None, password=None, port=22, key_filename=None,
+                 auto_add_host_keys=False, retries=CONNECT_RETRIES, backoff=CONNECT_BACKOFF,
+                 control_dir=None):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.key_filename = key_filename
+        self.auto_add_host_keys = auto_add_host_keys
+        self.retries = retries
+        self.backoff = backoff
+        self.ssh_client = None
+        self.sftp_client = None
+        self.lock = threading.RLock()
+        # Socket for the OpenSSH master connection, kept short as the path length is limited.
+        if control_dir is None:
+            control_dir = tempfile.mkdtemp(prefix="poreduck_ssh_")
+        self.control_path = os.path.join(control_dir, "%r@%h:%p")
+
+    @property
+    def destination(self):
+        # user@host, as rsync and scp expect it
+        if self.username is None:
+            return self.host
+        return f"{self.username}@{self.host}"
+
+    def is_active(self):
+        if self.ssh_client is None:
+            return False
+        transport = self.ssh_client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def connect(self):
+        # Open the connection, trying again with a longer wait each time.
+        ssh_client = paramiko.SSHClient()
+        ssh_client.load_system_host_keys()
+        if self.auto_add_host_keys:
+            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        wait = self.backoff
+        for attempt in range(1, self.retries + 1):
+            try:
+                ssh_client.connect(self.host, port=self.port, username=self.username, password=self.password,
+                                   key_filename=self.key_filename, timeout=CONNECT_TIMEOUT)
+                break
+            except paramiko.AuthenticationException:
+                # Trying again won't help
+                raise
+            except (paramiko.SSHException, socket.error) as e:
+                if attempt == self.retries:
+                    raise
+                print("Could not connect to %s (%s), trying again in %d seconds" % (self.host, e, wait))
+                time.sleep(wait)
+                wait *= 2
+        # Keep the connection from being dropped while we wait for the next folder
+        ssh_client.get_transport().set_keepalive(60)
+        self.ssh_client = ssh_client
+        self.sftp_client = None
+
+    def client(self):
+        # The connected paramiko client, reconnecting if the connection has gone.
+        with self.lock:
+            if not self.is_active():
+                if self.ssh_client is not None:
+                    print("Connection to %s lost, reconnecting" % self.host)
+                    self.ssh_client.close()
+                self.connect()
+            return self.ssh_client
+
+    def exec_command(self, command, timeout=None):
+        """
+        Run a command on a new channel of the connection.
+        Returns the exit status, stdout and stderr.
+        """
+        for attempt in range(2):
+            try:
+                stdin, stdout, stderr = self.client().exec_command(command, timeout=timeout)
+                stdout_static = stdout.read().decode()
+                stderr_static = stderr.read().decode()
+                return stdout.channel.recv_exit_status(), stdout_static, stderr_static
+            except (paramiko.SSHException, EOFError, socket.error):
+                # Connection dropped underneath us, try the once more on a new connection
+                if attempt == 1:
+                    raise
+                self.ssh_client.close()
+
+    def sftp(self):
+        # The sftp channel of the connection, opened on first use.
+        with self.lock:
+            client = self.client()
+            if self.sftp_client is None or self.sftp_client.get_channel().closed:
+                self.sftp_client = client.open_sftp()
+            return self.sftp_client
+
+    def put(self, local_path, remote_path):
+        # Upload to a temporary name then rename, so the server never sees half a file.
+        with self.lock:
+            sftp = self.sftp()
+            sftp.put(local_path, remote_path + ".tmp")
+            sftp.posix_rename(remote_path + ".tmp", remote_path)
+
+    def ssh_options(self):
+        # Options for the ssh that rsync and scp run, so that they share the master connection.
+        options = ["-o", "ControlMaster=auto",
+                   "-o", f"ControlPath={self.control_path}",
+                   "-o", f"ControlPersist={CONTROL_PERSIST}"]
+        if self.port != 22:
+            options.extend(["-o", f"Port={self.port}"])
+        return options
+
+    def ssh_command(self):
+        # For rsync -e, quoted for the shell
+        return shlex.quote(' '.join(["ssh"] + self.ssh_options()))
+
+    def scp_options(self):
+        # The same options for scp, quoted for the shell
+        return ' '.join(shlex.quote(option) for option in self.ssh_options())
+
+    def close(self):
+        with self.lock:
+            if self.sftp_client is not None:
+                self.sftp_client.close()
+                self.sftp_client = None
+            if self.ssh_client is not None:
+                self.ssh_client.close()
+                self.ssh_client = None
+        # Stop the master connection, if rsync or scp started one.
+        try:
+            subprocess.run(["ssh"] + self.ssh_options() + ["-O", "exit", self.destination],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            # No OpenSSH client, so no master connection either
+            pass
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+Run several archive jobs at once on a bounded pool of workers.
+
+After a restart, or at the end of a run, dozens of finished subfolders may be waiting to be tarred.
+Rather than tarring them one at a time, the TarScheduler runs up to max_jobs at once.
+Spinning disks don't like being read from in several places at once,
+so the number of jobs reading from any one rotational disk is capped separately.
+
+Results are handed back in the order the jobs were submitted,
+so anything appended to a checksum file stays in the same order as before.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def is_rotational(path):
+    """
+    Is the disk holding this path a spinning disk?
+    Returns None if we can't tell (not linux, network filesystem etc.)
+    """
+    try:
+        device = os.stat(path).st_dev
+    except OSError:
+        return None
+    sys_path = "/sys/dev/block/%d:%d" % (os.major(device), os.minor(device))
+    # Partitions don't have a queue directory, their parent disk does.
+    for queue_path in [os.path.join(sys_path, "queue", "rotational"),
+                       os.path.join(sys_path, "..", "queue", "rotational")]:
+        try:
+            with open(queue_path) as rotational_h:
+                return rotational_h.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+def get_folder_size(folder):
+    # Total bytes and number of files in a folder
+    total_bytes = 0
+    num_files = 0
+    for dirpath, dirnames, filenames in os.walk(folder):
+        for filename in filenames:
+            try:
+                total_bytes += os.path.getsize(os.path.join(dirpath, filename))
+                num_files += 1
+            except OSError:
+                continue
+    return total_bytes, num_files
+
+
+def iter_results(submitted):
+    # (name, result) of each (name, future), in order
+    for index, (name, future) in enumerate(submitted):
+        try:
+            result = future.result()
+        except BaseException:
+            # Don't leave any still running once the caller has moved on
+            wait([future for name, future in submitted[index + 1:]])
+            raise
+        yield name, result
+
+
+def add_tar_scheduler_arguments(parser):
+    # Same concurrency options for each of the commands that tar subfolders
+    parser.add_argument("--tar_jobs", type=int, default=1,
+                        help="Number of subfolders to archive at once")
+    parser.add_argument("--tar_jobs_per_disk", type=int, default=None,
+                        help="Number of archive jobs reading from the one disk at once, "
+                             "defaults to 1 for spinning disks and --tar_jobs otherwise")
+
+
+class TarScheduler:
+    def __init__(self, max_jobs=1, max_jobs_per_disk=None):
+        """
+        :param max_jobs: maximum number of archive jobs running at once
+        :param max_jobs_per_disk: maximum jobs reading from the one disk,
+                                  defaults to 1 for spinning disks and max_jobs otherwise.
+        """
+        self.max_jobs = max(1, max_jobs)
+        self.max_jobs_per_disk = max_jobs_per_disk
+        self.executor = ThreadPoolExecutor(max_workers=self.max_jobs)
+        self.disk_slots = {}
+        self.lock = threading.Lock()
+        self.submitted = []
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(max_jobs=args.tar_jobs, max_jobs_per_disk=args.tar_jobs_per_disk)
+
+    def get_disk_slot(self, path):
+        # One semaphore per device
+        try:
+            device = os.stat(path).st_dev
+        except OSError:
+            device = None
+        with self.lock:
+            if device not in self.disk_slots:
+                limit = self.max_jobs_per_disk
+                if limit is None:
+                    limit = 1 if is_rotational(path) else self.max_jobs
+                self.disk_slots[device] = threading.Semaphore(max(1, limit))
+            return self.disk_slots[device]
+
+    def run_job(self, name, source_dir, job, args, kwargs):
+        with self.get_disk_slot(source_dir):
+            # Walking the folder reads from the disk too
+            total_bytes, num_files = get_folder_size(source_dir)
+            start_time = time.time()
+            result = job(*args, **kwargs)
+            elapsed = time.time() - start_time
+        # Report the throughput of this job
+        print("Archived %s: %d files, %.1f MB in %.1f s (%.1f MB/s)" %
+              (name, num_files, total_bytes / 1e6, elapsed, total_bytes / 1e6 / max(elapsed, 1e-6)))
+        return result
+
+    def submit(self, name, source_dir, job, *args, **kwargs):
+        """
+        Queue job(*args, **kwargs), which archives source_dir.
+        """
+        future = self.executor.submit(self.run_job, name, source_dir, job, args, kwargs)
+        with self.lock:
+            self.submitted.append((name, future))
+        return future
+
+    def results_in_order(self):
+        """
+        Wait for each of the jobs submitted so far, yields (name, result) in the order the jobs were submitted.
+        Exceptions in a job are raised here, once the rest of the jobs have finished.
+        Jobs submitted from here on are left for the next call, even if one of these fails.
+        """
+        with self.lock:
+            submitted, self.submitted = self.submitted, []
+        return iter_results(submitted)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
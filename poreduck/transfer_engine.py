@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+
+"""
+The one transfer engine behind each of the transfer scripts.
+
+Each script used to carry its own copy of the folder detection, mux pairing, tar, checksum and rsync logic,
+and a fix or a speed up made to one rarely made it to the others.
+The engine now does all of that, for every run ending in the sample name:
+1. Detect any 'completed' folders, those that have 4000 reads in them,
+   and move their files (a rename each, see bulk_move) into a folder named for this run.
+2. Tar, compress and checksum each folder in one pass, several at once (see tar_scheduler).
+3. Send the archives to the sink, several at once across all runs (see transfer_scheduler),
+   and delete our copy once the sink has verified it.
+   With --stream, steps 2 and 3 are one: the archive is written straight to the sink.
+Each stage of each folder is journaled (see transfer_journal), so a restart carries on where it left off.
+Once MinKNOW has stopped, the last folders are archived whatever their size and everything is sent one last time.
+
+Where the archives go is up to the sink: a server, a local directory, or nowhere (see transfer_sinks).
+
+Usage:
+engine = TransferEngine.from_args(args, LocalSink(args.dest_directory))
+engine.run()
+"""
+
+import glob
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from functools import partial
+from poreduck.archive import write_archive
+from poreduck.archive_index import get_index_path
+from poreduck.bulk_move import move_files_to_dir
+from poreduck.checksums import add_checksum_arguments, get_checksum_file_name, hash_file, CHECKSUM_SUFFIXES, \
+    DEFAULT_ALGORITHM
+from poreduck.compressors import CompressionSettings, add_compression_arguments, SUFFIXES
+from poreduck.fast5_cache import get_folder_cache, drop_folder_cache
+from poreduck.fast5_names import parse_fast5_names, is_consistent
+from poreduck.fast5_repack import repack_folder
+from poreduck.manifest import open_manifest
+from poreduck.minknow_liveness import MinKNOWMonitor
+from poreduck.tar_scheduler import TarScheduler, add_tar_scheduler_arguments
+from poreduck.transfer_journal import TransferJournal
+from poreduck.transfer_scheduler import TransferScheduler, add_transfer_scheduler_arguments
+from poreduck.watcher import open_watcher
+
+TRANSFER_LOCK_FILE = "TRANSFERRING"
+MUX_PROCESSING_TIME = 600  # seconds
+MAX_FILES_PER_FOLDER = 4000  # MinKNOW starts a new folder after this many reads
+MAX_EMPTY_POLLS = 10  # Give up if there are still no runs after this many breaks
+FINAL_TRANSFER_ATTEMPTS = 2  # Twice over at the end, to pick up any that failed the first time round.
+
+
+def add_transfer_engine_arguments(parser):
+    # Options shared by each of the transfer scripts, whatever the sink
+    parser.add_argument("--suffix", type=str, required=False, default=None,
+                        help="Would you like a suffix at the end of each of your csv and tar files?")
+    parser.add_argument("--local", default=False, dest='local', action='store_true',
+                        help="Has local basecalling been used, changes directory from fast5 to fast5/pass")
+    parser.add_argument("--repack", default=False, dest='repack', action='store_true',
+                        help="Merge the single read fast5 files of each folder into "
+                             "multi-read fast5 files before tarring")
+    add_compression_arguments(parser)
+    add_tar_scheduler_arguments(parser)
+    add_transfer_scheduler_arguments(parser)
+    add_checksum_arguments(parser)
+    parser.add_argument("--idle_minutes", type=int, default=None,
+                        help="Treat MinKNOW as finished if no new fast5 files have been written in this many minutes, "
+                             "even if it is still open")
+
+
+class Run:
+    def __init__(self, reads_dir, name, flowcell, random, mux, sample_id, suffix="", local=False):
+        self.name = name
+        self.flowcell = flowcell
+        self.random = random
+        self.mux = mux
+        self.sample_id = sample_id
+        date, clock = name.split("_")[0:2]
+        self.start_time = datetime.strptime(date + clock, "%Y%m%d%H%M")
+        self.dir = os.path.join(reads_dir, name)
+        self.fast5_dir = os.path.join(reads_dir, name, 'fast5')
+        if local:
+            self.fast5_dir = os.path.join(self.fast5_dir, "pass")
+        self.csv_dir = os.path.join(reads_dir, name, 'csv')
+        self.suffix = suffix
+        # Where each folder of the run got to, see transfer_journal
+        self.journal = TransferJournal(os.path.join(self.dir, "transfer_journal.jsonl"))
+
+    def get_name(self, *parts):
+        # subfolder_random[_mux_scan]_suffix, leaving out anything that's empty
+        name_as_list = list(parts) + ["mux_scan" if self.mux else "", self.suffix]
+        return "_".join(x.strip() for x in name_as_list if x.strip())
+
+
+class TransferEngine:
+    def __init__(self, reads_dir, sample_name, sink, suffix=None, local=False, repack=False, compression=None,
+                 tar_scheduler=None, transfer_scheduler=None, checksum=DEFAULT_ALGORITHM, minknow_monitor=None):
+        """
+        :param reads_dir: /path/to/reads, with a folder for each run labelled <YYYYMMDD_HHMM_SAMPLE_NAME>
+        :param sample_name: sample name typed into MinKNOW, only runs ending in this are picked up
+        :param sink: where to send the archives, see transfer_sinks
+        :param suffix: added to the end of each csv, checksum and archive name
+        :param local: local basecalling has been used, the reads are in fast5/pass
+        :param repack: merge single read fast5 files into multi read files before tarring
+        :param compression: CompressionSettings
+        :param tar_scheduler: TarScheduler, number of folders archived at once
+        :param transfer_scheduler: TransferScheduler, number of archives sent at once
+        :param checksum: algorithm for the checksum file, see checksums.ALGORITHMS
+        :param minknow_monitor: MinKNOWMonitor, tells us when to finish up
+        """
+        if sink.stream and not hasattr(sink, "stream_archive"):
+            raise ValueError("Archives can't be streamed to %s" % sink.name)
+        self.reads_dir = os.path.abspath(reads_dir)
+        self.sample_name = sample_name
+        self.sink = sink
+        self.suffix = suffix if suffix is not None else ""
+        self.local = local
+        self.repack = repack
+        self.compression = compression if compression is not None else CompressionSettings()
+        self.tar_scheduler = tar_scheduler if tar_scheduler is not None else TarScheduler()
+        self.transfer_scheduler = transfer_scheduler if transfer_scheduler is not None else TransferScheduler()
+        self.checksum = checksum
+        self.minknow_monitor = minknow_monitor if minknow_monitor is not None \
+            else MinKNOWMonitor(reads_dirs=[self.reads_dir])
+        self.runs = []
+        self.watcher = None
+        self.empty_polls = 0
+
+    @classmethod
+    def from_args(cls, args, sink, minknow_patterns=None):
+        # minknow_patterns: the MinKNOW process to look for, see minknow_liveness
+        return cls(args.reads_dir, args.sample_name, sink, suffix=args.suffix, local=args.local,
+                   repack=args.repack, compression=CompressionSettings.from_args(args),
+                   tar_scheduler=TarScheduler.from_args(args),
+                   transfer_scheduler=TransferScheduler.from_args(args), checksum=args.checksum,
+                   minknow_monitor=MinKNOWMonitor(minknow_patterns, reads_dirs=[args.reads_dir],
+                                                  idle_minutes=args.idle_minutes))
+
+    def run(self):
+        self.check_directories()
+        self.watcher = open_watcher([self.reads_dir])
+
+        # Indicator for down-the-line base callers that more data is coming!
+        self.sink.create_lock_file(TRANSFER_LOCK_FILE)
+
+        # Continue tarring up folders until MinKNOW stops
+        while True:
+            self.set_runs()
+            for run in self.runs:
+                self.transfer_fast5_files(run)
+            if not self.minknow_monitor.is_running():
+                break
+
+        print("MinKNOW has stopped running")
+        self.finish()
+
+    def finish(self):
+        # Tar up the last folder of each run, send everything one last time and remove the lock file.
+        for run in self.runs:
+            self.tar_up_last_folder(run)
+            self.send_checksum_files(run)
+            self.sink.send_folder(run.csv_dir, "csv")
+        self.sink.remove_lock_file(TRANSFER_LOCK_FILE)
+        self.tar_scheduler.shutdown()
+        self.sink.close()
+
+    def check_directories(self):
+        if not os.path.isdir(self.reads_dir):
+            sys.exit(f"Error, reads directory, {self.reads_dir}, does not exist")
+        self.sink.check()
+
+    def have_a_break(self):
+        # Up to a minute, or until MinKNOW has written a few more files.
+        # Events within 10 seconds of each other are handled in the one pass.
+        if self.watcher is None:
+            time.sleep(60)
+            return
+        self.watcher.wait(timeout=60, settle=10)
+
+    """
+    Runs
+    1. set_runs
+    2. get_run_details
+    3. resume_run
+    4. get_complementary_run
+    """
+
+    def set_runs(self):
+        runs = [run for run in os.listdir(self.reads_dir)
+                if os.path.isdir(os.path.join(self.reads_dir, run))
+                and run.endswith(self.sample_name)]
+
+        initialised_runs = [initialised_run.name for initialised_run in self.runs]
+        for run in runs:
+            if run in initialised_runs:
+                continue
+
+            flowcell, random, mux = self.get_run_details(run)
+            if flowcell is None:
+                # Run is empty
+                continue
+
+            # Otherwise we have detected a new run to append.
+            self.runs.append(Run(self.reads_dir, run, flowcell, random, mux, self.sample_name, self.suffix,
+                                 self.local))
+            # Pick up from where we were, if we've seen this run before.
+            self.resume_run(self.runs[-1])
+        if len(self.runs) == 0:
+            self.have_a_break()
+            if self.empty_polls > MAX_EMPTY_POLLS:
+                sys.exit("No runs found ending in %s" % self.sample_name)
+            self.empty_polls += 1
+
+    def get_run_details(self, run):
+        fast5_dir = os.path.join(self.reads_dir, run, "fast5")
+        if self.local:
+            fast5_dir = os.path.join(fast5_dir, "pass")
+        if not os.path.isdir(fast5_dir):
+            return None, None, None
+        # Get list of files in the first directory we come across.
+        subfolders = sorted([folder for folder in os.listdir(fast5_dir)
+                             if os.path.isdir(os.path.join(fast5_dir, folder))
+                             and is_int(folder)])
+        if len(subfolders) == 0:
+            return None, None, None
+        subfolder_path = os.path.join(fast5_dir, subfolders[0])
+        fast5_files = [filename for filename in os.listdir(subfolder_path)
+                       if filename.endswith(".fast5")]
+        # alexis_MacBookPro_20170518_FNFAF18353_MN19582_sequencing_run_...
+        # PRAWN_P28_R9p4_11874_read_134_ch_162_strand.fast5
+        # Or it's mux scan
+        names_df, unparsed = parse_fast5_names(fast5_files)
+        if len(names_df) == 0:
+            return None, None, None
+
+        # Check that all of these are the same
+        if not is_consistent(names_df):
+            sys.exit("Houston, it appears that one of these files is not like the others.")
+
+        first_file = names_df.iloc[0]
+        return first_file.flowcell, first_file.rnumber, bool(first_file.is_mux)
+
+    def resume_run(self, run):
+        """
+        Carry on from wherever each folder of the run got to last time, see transfer_journal.
+        Folders that were moved get archived, archived folders get hashed and removed,
+        archives that were verified get deleted.
+        Archives that were written but not yet verified are still there to be picked up by queue_transfers.
+        """
+        # Anything half written was never finished
+        for tmp_file in glob.glob(os.path.join(run.fast5_dir, "*.tmp")):
+            os.remove(tmp_file)
+        for subdir in run.journal.at_stage("archived") + run.journal.at_stage("hashed"):
+            folder = os.path.join(run.fast5_dir, subdir)
+            tar_file = run.journal.get(subdir, "tar_file")
+            if not os.path.isfile(os.path.join(run.fast5_dir, tar_file)):
+                # No archive here (streamed, but not verified), the reads are all we have so archive them again.
+                if os.path.isdir(folder):
+                    run.journal.record(subdir, "moved")
+                continue
+            if run.journal.stage(subdir) == "archived":
+                # Crashed between writing the archive and noting its digest
+                digest = hash_file(os.path.join(run.fast5_dir, tar_file), self.checksum)
+                run.journal.record(subdir, "hashed", digest=digest)
+                if not self.sink.sends:
+                    self.write_checksum(tar_file, digest, run)
+            if os.path.isdir(folder):
+                # Crashed between noting the digest and removing the folder
+                shutil.rmtree(folder)
+        for subdir in run.journal.at_stage("verified"):
+            tar_path = os.path.join(run.fast5_dir, run.journal.get(subdir, "tar_file"))
+            self.delete_transferred_files(subdir, [tar_path, get_index_path(tar_path)], run)
+        moved_subdirs = [subdir for subdir in run.journal.at_stage("moved")
+                         if os.path.isdir(os.path.join(run.fast5_dir, subdir))]
+        if len(moved_subdirs) > 0:
+            print("Resuming %d folders of %s" % (len(moved_subdirs), run.name))
+            self.tar_subdirs(moved_subdirs, run)
+
+    def get_complementary_run(self, run):
+        # The sequencing run that follows this mux scan on the same flowcell
+        for other_run in self.runs:
+            if other_run.random == run.random:
+                continue  # Same mux id..
+            if other_run.flowcell == run.flowcell \
+                    and (other_run.start_time - run.start_time).total_seconds() < MUX_PROCESSING_TIME:
+                # These are the same run!
+                return other_run
+
+        # Didn't find any?
+        return None
+
+    """
+    Folders
+    1. transfer_fast5_files
+    2. get_subdirs
+    3. check_folder_status
+    4. move_fast5_files
+    5. tar_up_last_folder
+    """
+
+    def transfer_fast5_files(self, run):
+        subdirs = self.get_subdirs(run)
+        print(subdirs)
+
+        finished_subdirs = []
+        for subdir in subdirs:
+            # Is folder finished?
+            if self.check_folder_status(subdir, run) == "still writing":
+                continue
+            finished_subdirs.append(standardise_int_length(os.path.basename(os.path.normpath(subdir))))
+        # Tar up folder(s)
+        self.tar_folders(finished_subdirs, run)
+
+        # Let's have a rest if no new folders have been created recently.
+        if len(finished_subdirs) == 0:
+            # Keep the transfer streams busy in the meantime
+            self.transfer_scheduler.poll()
+            self.have_a_break()
+        else:
+            self.queue_transfers(run)
+            self.send_checksum_files(run)
+            self.sink.send_folder(run.csv_dir, "csv")
+
+    def get_subdirs(self, run):
+        subdirs = [os.path.join(run.fast5_dir, folder)
+                   for folder in os.listdir(run.fast5_dir)
+                   # Make sure that the subdirectory is a directory
+                   if os.path.isdir(os.path.join(run.fast5_dir, folder))
+                   # And not the tmp directory
+                   and not folder == "tmp"
+                   # And subdirectory is an integer
+                   and is_int(folder)]
+
+        # Sort subdirectories by writing time.
+        return sorted(subdirs, key=os.path.getmtime)
+
+    def check_folder_status(self, subdir, run, full=True):
+        """
+        Returns the folder status, also generates a little csv file
+        for each of the corresponding folders for you take home.
+        Each fast5 file is a row, with columns:
+              fast5 file name   - name of fast5 file
+              Modification time - time of modification of file,
+                                  useful for deciding if run has finished.
+              channel           - Channel ID of the run.
+              read number       - What number read is this.
+              quarantine        - Reason the file failed validation, empty if the file is fine.
+              mux               - Mux of the read
+              duration          - Length of the read.
+        :param full: only move the folder once it is full, set to False for the final folder.
+        """
+        # Is this a folder with mux scans, if so, we'll move the files over to the
+        # actual sequencing run folder, once it's there, be patient will be there soon!
+        if full and run.mux and self.get_complementary_run(run) is None:
+            return "still writing"
+
+        # Only the files that have appeared since the last poll are validated and opened.
+        folder_cache = get_folder_cache(subdir)
+        folder_cache.update()
+        fast5_pd = folder_cache.to_dataframe()
+
+        if full and not run.mux and not is_folder_maxxed_out(len(fast5_pd)):
+            # Used for if we bother trying to tar up in the next step.
+            return "still writing"
+
+        self.move_fast5_files(subdir, fast5_pd['filename'].tolist(), run)
+        # Ensure that csv directory exists
+        os.makedirs(run.csv_dir, exist_ok=True)
+        subdir_as_standard_int = standardise_int_length(os.path.basename(os.path.normpath(subdir)))
+        fast5_pd.to_csv(os.path.join(run.csv_dir, run.get_name(subdir_as_standard_int, run.random) + ".csv"),
+                        index=False)
+        drop_folder_cache(subdir)
+        delete_folder_if_empty(subdir)
+        return "moving files"
+
+    def move_fast5_files(self, subdir, fast5_files, run):
+        if len(fast5_files) == 0:
+            return
+        # Create a folder in the reads directory.
+        subdir_as_standard_int = standardise_int_length(os.path.basename(os.path.normpath(subdir)))
+        new_dir = os.path.join(run.fast5_dir, run.get_name(subdir_as_standard_int, run.random))
+        # May already be there if we stopped part way through the move last time
+        os.makedirs(new_dir, exist_ok=True)
+
+        # Rename each of the files in this process rather than forking an mv for each
+        move_files_to_dir(subdir, fast5_files, new_dir)
+        run.journal.record(os.path.basename(new_dir), "moved", num_files=len(fast5_files))
+
+    def tar_up_last_folder(self, run):
+        finished_subdirs = []
+        for subdir in self.get_subdirs(run):
+            # Don't worry about counting the number of files, we're finished.
+            self.check_folder_status(subdir, run, full=False)
+            finished_subdirs.append(standardise_int_length(os.path.basename(os.path.normpath(subdir))))
+        self.tar_folders(finished_subdirs, run)
+
+        for attempt in range(FINAL_TRANSFER_ATTEMPTS):
+            self.queue_transfers(run)
+            self.transfer_scheduler.wait()
+
+    """
+    Archives
+    1. tar_folders
+    2. tar_subdirs
+    3. tar_folder
+    4. write_checksum
+    """
+
+    def tar_folders(self, subdir_prefixes, run):
+        # Get the subdirectories that start with each of the initial subdirectories.
+        # So 0 may now be 0_12345 where 12345 is the rnumber.
+        subdirs = [subdir for subdir_prefix in subdir_prefixes
+                   for subdir in sorted(os.listdir(run.fast5_dir))
+                   if subdir.startswith(subdir_prefix + "_")
+                   and os.path.isdir(os.path.join(run.fast5_dir, subdir))]
+
+        self.tar_subdirs(subdirs, run)
+
+    def tar_subdirs(self, subdirs, run):
+        # Tar up several folders at once
+        for subdir in subdirs:
+            self.tar_scheduler.submit(subdir, os.path.join(run.fast5_dir, subdir), self.tar_folder, subdir, run)
+
+        # Wait for each of them, each records its own progress in the journal.
+        for subdir, (tar_file, digest) in self.tar_scheduler.results_in_order():
+            print("%s %s" % (tar_file, run.journal.stage(subdir)))
+
+    def tar_folder(self, subdir, run):
+        tar_file = f"{subdir}.tar{self.compression.suffix}"
+        if run.journal.has_completed(subdir, "archived"):
+            # We stopped after the archive was in place but before the folder was removed.
+            shutil.rmtree(os.path.join(run.fast5_dir, subdir))
+            return run.journal.get(subdir, "tar_file"), run.journal.get(subdir, "digest")
+        if self.repack:
+            repack_folder(os.path.join(run.fast5_dir, subdir))
+        if self.sink.stream:
+            try:
+                digest = self.sink.stream_archive(os.path.join(run.fast5_dir, subdir), f"fast5/{tar_file}",
+                                                  compression=self.compression, checksum=self.checksum)
+                # Archived, hashed, sent and verified all at once
+                run.journal.record(subdir, "archived", tar_file=tar_file)
+                run.journal.record(subdir, "hashed", digest=digest)
+                run.journal.record(subdir, "transferred")
+                self.write_checksum(tar_file, digest, run)
+                run.journal.record(subdir, "verified")
+                self.delete_transferred_files(subdir, [], run)
+                return tar_file, digest
+            except self.sink.errors as e:
+                # Sink is down, write the archive locally to be sent later.
+                print("Could not stream %s to %s (%s), archiving locally instead" % (subdir, self.sink.name, e))
+        # Tar, compress and checksum in one pass, removing the folder once the archive is in place.
+        digest = write_archive(os.path.join(run.fast5_dir, subdir), os.path.join(run.fast5_dir, tar_file),
+                               compression=self.compression, remove_source=False, checksum=self.checksum)
+        run.journal.record(subdir, "archived", tar_file=tar_file)
+        run.journal.record(subdir, "hashed", digest=digest)
+        if not self.sink.sends:
+            # Kept where it is, so its checksum goes in the checksum file now
+            self.write_checksum(tar_file, digest, run)
+        shutil.rmtree(os.path.join(run.fast5_dir, subdir))
+        return tar_file, digest
+
+    def write_checksum(self, tar_file, digest, run):
+        # Paths in the checksums file are relative to the run directory,
+        # this is so we have fast5/0_12345.tar.gz in the checksums file.
+        # Same format as the md5sum command.
+        open_manifest(self.get_checksum_path(run)).append(digest, f"fast5/{tar_file}")
+
+    def get_checksum_path(self, run):
+        # checksum_<random>[_mux_scan]_<suffix>.md5 in the run directory
+        return os.path.join(run.dir, get_checksum_file_name(run.get_name("checksum", run.random), self.checksum))
+
+    """
+    Transfers
+    1. queue_transfers
+    2. complete_transfer
+    3. delete_transferred_files
+    4. send_checksum_files
+    """
+
+    def queue_transfers(self, run):
+        # Queue each of the finished archives of this run to be sent to the sink,
+        # the transfer scheduler sends them, several at once, across all of the runs.
+        if not self.sink.sends:
+            return
+        # Only the finished archives, whichever compression was used
+        tar_files = sorted(tar_file for tar_file in os.listdir(run.fast5_dir)
+                           if any(tar_file.endswith(f".tar{suffix}") for suffix in SUFFIXES.values()))
+
+        for tar_file in tar_files:
+            tar_path = os.path.join(run.fast5_dir, tar_file)
+            # The index goes along with its archive
+            source_paths = [tar_path] + [index_path for index_path in [get_index_path(tar_path)]
+                                         if os.path.isfile(index_path)]
+            # The archives are deleted once the sink has verified them, see complete_transfer.
+            command = self.sink.transfer_command(source_paths, "fast5", bwlimit=self.transfer_scheduler.bwlimit)
+            self.transfer_scheduler.enqueue(tar_path, source_paths, command,
+                                            on_complete=partial(self.complete_transfer, tar_file, source_paths, run))
+
+        self.transfer_scheduler.poll()
+
+    def complete_transfer(self, tar_file, source_paths, run):
+        # Once the archive has been sent, check the sink has the right thing before we delete our copy.
+        subdir = get_subdir_of_tar_file(tar_file)
+        digest = run.journal.get(subdir, "digest")
+        if digest is None:
+            # Archived before the journal was kept
+            digest = hash_file(source_paths[0], self.checksum)
+        run.journal.record(subdir, "transferred", tar_file=tar_file)
+        try:
+            self.sink.verify(f"fast5/{tar_file}", os.path.getsize(source_paths[0]), digest, self.checksum)
+        except self.sink.errors as e:
+            # Kept, to be sent again next cycle.
+            print("Could not verify %s on %s: %s" % (tar_file, self.sink.name, e))
+            return
+        self.write_checksum(tar_file, digest, run)
+        run.journal.record(subdir, "verified", digest=digest)
+        self.delete_transferred_files(subdir, source_paths, run)
+
+    def delete_transferred_files(self, subdir, source_paths, run):
+        # The archive and its index, and the folder itself if it was streamed.
+        for source_path in source_paths:
+            if os.path.isfile(source_path):
+                os.remove(source_path)
+        if os.path.isdir(os.path.join(run.fast5_dir, subdir)):
+            shutil.rmtree(os.path.join(run.fast5_dir, subdir))
+        run.journal.record(subdir, "deleted")
+
+    def send_checksum_files(self, run):
+        # Copy across the checksum files into the destination directory
+        for checksum_file in glob.glob(os.path.join(run.dir, "*" + CHECKSUM_SUFFIXES[self.checksum])):
+            try:
+                self.sink.put(checksum_file, os.path.basename(checksum_file))
+            except self.sink.errors as e:
+                print("Could not copy across %s: %s" % (checksum_file, e))
+
+
+"""
+Miscellaneous functions
+1. is_int
+2. is_folder_maxxed_out
+3. delete_folder_if_empty
+4. get_subdir_of_tar_file
+5. standardise_int_length
+"""
+
+
+def is_int(folder):
+    try:
+        int(folder)
+    except ValueError:
+        return False
+    return True
+
+
+def is_folder_maxxed_out(num_files):
+    return num_files >= MAX_FILES_PER_FOLDER
+
+
+def delete_folder_if_empty(subdir):
+    fast5_files = [fast5_file for fast5_file in os.listdir(subdir)
+                   if fast5_file.endswith(".fast5")]
+    if len(fast5_files) == 0:
+        shutil.rmtree(subdir)
+
+
+def get_subdir_of_tar_file(tar_file):
+    # 0001_12345.tar.gz -> 0001_12345, the key of the folder in the journal
+    return tar_file[:tar_file.index(".tar")]
+
+
+def standardise_int_length(my_integer):
+    # Input of 15 returns 0015
+    return f"{int(my_integer):04}"
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""
+Journal of where each folder of a run is on its way to the server.
+
+Each folder goes through the stages:
+moved -> archived -> hashed -> transferred -> verified -> deleted
+1. moved:       the fast5 files are in their own folder, named for this run.
+2. archived:    the archive is in place (written to a temporary name and renamed, so never half written).
+3. hashed:      the digest of the archive is known.
+4. transferred: rsync has sent the archive to the server.
+5. verified:    the server has checked the size and digest of its copy, and the checksum line has been written.
+6. deleted:     the local archive has been removed.
+
+Each stage is appended to the journal (see checkpoint.RunCheckpoint) and fsync'd before we move on to the next,
+so after a crash or a reboot every folder picks up from the last stage it completed,
+rather than being tarred or sent again.
+"""
+
+import threading
+import time
+from poreduck.checkpoint import RunCheckpoint
+
+STAGES = ["moved", "archived", "hashed", "transferred", "verified", "deleted"]
+
+
+class TransferJournal:
+    def __init__(self, path):
+        self.checkpoint = RunCheckpoint(path)
+        # Folders are archived in several threads at once
+        self.lock = threading.Lock()
+        self.items = self.checkpoint.load()
+
+    def record(self, key, stage, **values):
+        # Note that key has completed stage, along with anything we need to carry on from there.
+        if stage not in STAGES:
+            raise ValueError("Unknown transfer stage %s, choose from %s" % (stage, ', '.join(STAGES)))
+        with self.lock:
+            self.checkpoint.record(key, stage=stage, time=time.time(), **values)
+            self.items.setdefault(key, {}).update(values, stage=stage)
+
+    def get(self, key, value=None):
+        # A value recorded at any stage, for example the digest.
+        with self.lock:
+            return self.items.get(key, {}).get(value)
+
+    def stage(self, key):
+        # Last stage completed, None for a folder we know nothing about
+        return self.get(key, "stage")
+
+    def has_completed(self, key, stage):
+        completed = self.stage(key)
+        return completed is not None and STAGES.index(completed) >= STAGES.index(stage)
+
+    def at_stage(self, stage):
+        # Each of the folders whose last completed stage is this one
+        with self.lock:
+            return sorted(key for key, values in self.items.items() if values.get("stage") == stage)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+"""
+Send archives to the server over several streams at once, across every run on the machine.
+
+With one rsync per run, a run whose rsync was still going just skipped its turn,
+so on a GridION or PromethION with several flowcells most of the link sat idle while the backlog built up.
+The TransferScheduler keeps up to max_streams transfers going at once, whichever runs they come from.
+Queued archives are sent oldest first, or with priority 'disk', those on the fullest disk first.
+An optional cap on the total bandwidth is shared out between the streams (rsync --bwlimit),
+so MinKNOW is never starved of its own network or disk.
+
+Each transfer is a shell command (rsync), or a python function run in a thread of the scheduler
+(a copy to a local disk, see local_copy).
+The scheduler never blocks, poll() is called once a cycle to start and reap transfers,
+wait() blocks until everything queued has been sent.
+"""
+
+import heapq
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_for_futures
+
+PRIORITIES = ["oldest", "disk"]
+WAIT_INTERVAL = 5  # seconds between checks in wait()
+
+
+def add_transfer_scheduler_arguments(parser):
+    # Same options for each of the commands that send archives to the server
+    parser.add_argument("--transfer_streams", type=int, default=1,
+                        help="Number of archives sent to the server at once, across all runs")
+    parser.add_argument("--bandwidth_limit", type=float, default=None,
+                        help="Cap on the total bandwidth of all transfers, in MB/s. "
+                             "Shared equally between the streams")
+    parser.add_argument("--transfer_priority", type=str, choices=PRIORITIES, default="oldest",
+                        help="Send the oldest archives first, or those on the disk closest to filling up")
+
+
+class Transfer:
+    def __init__(self, name, source_paths, command, on_complete=None):
+        self.name = name
+        self.source_paths = source_paths
+        self.command = command
+        self.on_complete = on_complete
+        # The sources may be removed once sent, so get their size now
+        self.total_bytes = sum(os.path.getsize(source_path) for source_path in source_paths)
+        self.proc = None
+        self.future = None
+        self.start_time = None
+
+    def start(self, executor):
+        if callable(self.command):
+            self.future = executor.submit(self.command)
+        else:
+            self.proc = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         shell=True, universal_newlines=True)
+        self.start_time = time.time()
+
+    def is_running(self):
+        if self.future is not None:
+            return not self.future.done()
+        return self.proc.poll() is None
+
+    def get_error(self):
+        # None if the transfer succeeded, otherwise what went wrong.
+        if self.future is not None:
+            error = self.future.exception()
+            return None if error is None else str(error)
+        stdout, stderr = self.proc.communicate()
+        if self.proc.returncode == 0:
+            return None
+        return "exit status %d: %s" % (self.proc.returncode, stderr.strip())
+
+
+class TransferScheduler:
+    def __init__(self, max_streams=1, bandwidth_limit=None, priority="oldest"):
+        """
+        :param max_streams: maximum number of transfers running at once
+        :param bandwidth_limit: total MB/s across all of the transfers, None for no limit
+        :param priority: order of the queue, see PRIORITIES
+        """
+        if priority not in PRIORITIES:
+            raise ValueError("Unknown transfer priority %s, choose from %s" % (priority, ', '.join(PRIORITIES)))
+        self.max_streams = max(1, max_streams)
+        self.bandwidth_limit = bandwidth_limit
+        self.priority = priority
+        self.queue = []  # heap of (priority, order, transfer)
+        self.queued = set()  # names queued or in flight
+        self.active = []
+        self.count = 0
+        # For transfers that are python functions rather than commands
+        self.executor = ThreadPoolExecutor(max_workers=self.max_streams)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(max_streams=args.transfer_streams, bandwidth_limit=args.bandwidth_limit,
+                   priority=args.transfer_priority)
+
+    @property
+    def bwlimit(self):
+        # Each stream's share of the cap, in the KB/s rsync --bwlimit expects. None for no limit.
+        if self.bandwidth_limit is None:
+            return None
+        return max(1, int(self.bandwidth_limit * 1000 / self.max_streams))
+
+    def get_priority(self, source_path):
+        # Smaller goes first
+        mtime = os.path.getmtime(source_path)
+        if self.priority == "disk":
+            return shutil.disk_usage(os.path.dirname(source_path)).free, mtime
+        return mtime, 0
+
+    def enqueue(self, name, source_paths, command, on_complete=None):
+        """
+        Queue the shell command, or function, that sends source_paths to the server.
+        on_complete() is called once the command has succeeded, to verify and remove the sources for example.
+        Names already queued or in flight are ignored, so the same folder can be offered each cycle.
+        """
+        if name in self.queued:
+            return False
+        transfer = Transfer(name, source_paths, command, on_complete)
+        heapq.heappush(self.queue, (self.get_priority(source_paths[0]), self.count, transfer))
+        self.count += 1
+        self.queued.add(name)
+        return True
+
+    def reap(self):
+        # Collect the transfers that have finished
+        still_active = []
+        for transfer in self.active:
+            if transfer.is_running():
+                still_active.append(transfer)
+                continue
+            error = transfer.get_error()
+            elapsed = time.time() - transfer.start_time
+            self.queued.discard(transfer.name)
+            if error is not None:
+                # Left where it was, it will be picked up again next cycle.
+                print("Transfer of %s failed (%s)" % (transfer.name, error))
+                continue
+            print("Transferred %s: %.1f MB in %.1f s (%.1f MB/s)" %
+                  (transfer.name, transfer.total_bytes / 1e6, elapsed,
+                   transfer.total_bytes / 1e6 / max(elapsed, 1e-6)))
+            if transfer.on_complete is not None:
+                transfer.on_complete()
+        self.active = still_active
+
+    def poll(self):
+        """
+        Reap any finished transfers and start queued ones while there are streams free.
+        Returns the number of transfers queued or in flight.
+        """
+        self.reap()
+        while self.queue and len(self.active) < self.max_streams:
+            priority, order, transfer = heapq.heappop(self.queue)
+            if not all(os.path.exists(source_path) for source_path in transfer.source_paths):
+                # Gone since it was queued
+                self.queued.discard(transfer.name)
+                continue
+            transfer.start(self.executor)
+            self.active.append(transfer)
+        if len(self.active) > 0:
+            print("%d transfers running, %d queued" % (len(self.active), len(self.queue)))
+        return len(self.active) + len(self.queue)
+
+    def wait(self):
+        # Until everything queued has been sent, or has failed
+        while self.poll() > 0:
+            futures = [transfer.future for transfer in self.active if transfer.future is not None]
+            if len(futures) > 0:
+                # Back as soon as one of the copies finishes
+                wait_for_futures(futures, timeout=WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(WAIT_INTERVAL)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+"""
+Where the transfer engine sends each finished archive, see transfer_engine.
+
+transfer_fast5_to_server, transfer_fast5_to_server_no_transfer and transfer_fast5_to_external_hd
+used to be three copies of the same script that differed only in where the archives went.
+Each destination is now a sink, and the engine does everything else the same way for all of them.
+
+SSHSink:   a directory on a server, over the one shared ssh connection (see ssh_pool).
+LocalSink: a directory on this machine, an external hard drive for example, copied by the kernel (see local_copy).
+NullSink:  nowhere, the archives and checksum files are left next to the reads.
+
+Paths given to a sink are relative to its destination directory, fast5/0001_12345.tar.gz for example.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from poreduck.archive import write_archive
+from poreduck.checksums import hash_file, DEFAULT_ALGORITHM
+from poreduck.local_copy import copy_files, COPY_CHUNK_SIZE
+
+try:
+    from poreduck.remote_archive import stream_archive_to_server, verify_remote_file, STREAM_ERRORS
+    from poreduck.ssh_pool import close_sessions
+except ImportError:
+    # paramiko not installed, only the local sinks are available
+    stream_archive_to_server = None
+
+
+class VerifyError(IOError):
+    pass
+
+
+class NullSink:
+    """
+    Keeps everything where it is.
+    Archives are never sent, so they stay next to the reads along with their checksum file.
+    """
+    name = "nowhere"
+    sends = False
+    # Sinks that can have archives written straight to them also have
+    # stream_archive(source_dir, dest_path, compression, checksum), returning the digest.
+    stream = False
+    # Errors that mean the destination let us down, rather than a bug
+    errors = (OSError,)
+
+    def check(self):
+        pass
+
+    def create_lock_file(self, lock_file):
+        pass
+
+    def remove_lock_file(self, lock_file):
+        pass
+
+    def transfer_command(self, source_paths, dest_subdir, bwlimit=None):
+        # Shell command, or function, that sends source_paths into dest_subdir, None if there is nothing to run.
+        return None
+
+    def verify(self, dest_path, size, digest, checksum=DEFAULT_ALGORITHM):
+        pass
+
+    def put(self, local_path, dest_path):
+        pass
+
+    def send_folder(self, local_dir, dest_subdir, pattern="*.csv"):
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalSink(NullSink):
+    def __init__(self, dest_directory, stream=False, checksum=DEFAULT_ALGORITHM, chunk_size=COPY_CHUNK_SIZE):
+        """
+        :param dest_directory: directory on a mounted disk to place the run in
+        :param stream: write each archive straight into dest_directory rather than next to the reads first
+        :param checksum: algorithm each archive is read back from the destination with, see verify
+        :param chunk_size: bytes copied at a time, see local_copy
+        """
+        self.dest_directory = os.path.abspath(dest_directory)
+        self.stream = stream
+        self.checksum = checksum
+        self.chunk_size = chunk_size
+        self.name = self.dest_directory
+        self.sends = True
+        # Archives are read back from the destination in here while the next one is synced
+        self.readback_executor = ThreadPoolExecutor(max_workers=1)
+        self.readback_digests = {}
+        self.lock = threading.Lock()
+
+    def get_path(self, dest_path):
+        return os.path.join(self.dest_directory, dest_path)
+
+    def check(self):
+        dest_parent = os.path.dirname(os.path.normpath(self.dest_directory))
+        if not os.path.isdir(dest_parent):
+            sys.exit(f"Error: {dest_parent} does not exist")
+        os.makedirs(self.get_path("fast5"), exist_ok=True)
+
+    def create_lock_file(self, lock_file):
+        with open(self.get_path(lock_file), 'a'):
+            pass
+
+    def remove_lock_file(self, lock_file):
+        if os.path.isfile(self.get_path(lock_file)):
+            os.remove(self.get_path(lock_file))
+
+    def transfer_command(self, source_paths, dest_subdir, bwlimit=None):
+        # Copied in a thread of the transfer scheduler rather than by rsync, see local_copy.
+        return partial(self.copy_archive, source_paths, dest_subdir, bwlimit)
+
+    def copy_archive(self, source_paths, dest_subdir, bwlimit=None):
+        # The archive and its index, as the one batch. Each is read back from the disk as it's synced.
+        dest_paths = [os.path.join(dest_subdir, os.path.basename(source_path)) for source_path in source_paths]
+        digests = copy_files([(source_path, self.get_path(dest_path))
+                              for source_path, dest_path in zip(source_paths, dest_paths)],
+                             checksum=self.checksum, chunk_size=self.chunk_size, bwlimit=bwlimit,
+                             readback_executor=self.readback_executor)
+        with self.lock:
+            for dest_path in dest_paths:
+                self.readback_digests[dest_path] = digests[self.get_path(dest_path)]
+
+    def verify(self, dest_path, size, digest, checksum=DEFAULT_ALGORITHM):
+        dest_size = os.path.getsize(self.get_path(dest_path))
+        if not dest_size == size:
+            raise VerifyError("%s is %d bytes, we sent %d" % (self.get_path(dest_path), dest_size, size))
+        # Already read back when it was copied, unless it was copied some other way or with another algorithm.
+        with self.lock:
+            dest_digest = self.readback_digests.pop(dest_path, None)
+        if dest_digest is None or not checksum == self.checksum:
+            dest_digest = hash_file(self.get_path(dest_path), checksum)
+        if not dest_digest == digest:
+            raise VerifyError("Checksum of %s does not match" % self.get_path(dest_path))
+
+    def put(self, local_path, dest_path):
+        # Copy to a temporary name then rename, so a half copied file is never left in place.
+        copy_files([(local_path, self.get_path(dest_path))], chunk_size=self.chunk_size)
+
+    def send_folder(self, local_dir, dest_subdir, pattern="*.csv"):
+        # Anything matching pattern that is new or has changed since last time, synced as the one batch.
+        suffix = pattern.lstrip("*")
+        os.makedirs(self.get_path(dest_subdir), exist_ok=True)
+        pairs = []
+        for file_name in sorted(os.listdir(local_dir)):
+            if not file_name.endswith(suffix):
+                continue
+            local_path = os.path.join(local_dir, file_name)
+            dest_path = self.get_path(os.path.join(dest_subdir, file_name))
+            if os.path.isfile(dest_path) and os.path.getsize(dest_path) == os.path.getsize(local_path) and \
+                    os.path.getmtime(dest_path) >= os.path.getmtime(local_path):
+                continue
+            pairs.append((local_path, dest_path))
+        if len(pairs) > 0:
+            copy_files(pairs, chunk_size=self.chunk_size)
+
+    def stream_archive(self, source_dir, dest_path, compression=None, checksum=DEFAULT_ALGORITHM):
+        # Straight onto the destination disk, which write_archive does atomically anyway.
+        return write_archive(source_dir, self.get_path(dest_path), compression=compression,
+                             remove_source=False, checksum=checksum)
+
+    def close(self):
+        self.readback_executor.shutdown(wait=True)
+
+
+class SSHSink(NullSink):
+    def __init__(self, session, dest_directory, stream=False, sshpass_prefix=""):
+        """
+        :param session: ssh_pool.SSHSession, connected on first use
+        :param dest_directory: directory on the server to place the run in
+        :param stream: stream each archive straight to the server, see remote_archive
+        :param sshpass_prefix: 'sshpass -p <password> ' for rsync, if there is no key set up
+        """
+        if stream_archive_to_server is None:
+            sys.exit("Error: paramiko is required to transfer to a server")
+        self.session = session
+        self.dest_directory = dest_directory
+        self.stream = stream
+        self.sshpass_prefix = sshpass_prefix
+        self.name = f"{session.destination}:{dest_directory}"
+        self.sends = True
+        self.errors = STREAM_ERRORS
+
+    def get_path(self, dest_path):
+        return f"{self.dest_directory}/{dest_path}"
+
+    def check(self):
+        # Check if server is active using the ping command.
+        ping_command = subprocess.Popen(f"ping -c 1 {self.session.host}", shell=True,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        stdout, stderr = ping_command.communicate()
+        if not stderr == "":
+            [print(line) for line in stdout.split("\n")][0]
+        else:
+            print("Ping command:", stdout, stderr)
+
+        # Check if folder on server is present.
+        dest_parent = os.path.dirname(os.path.normpath(self.dest_directory))
+        check_dest_parent_exists_command = f"bash -c \"if [ -d {dest_parent} ]; then echo 'PRESENT'; fi\""
+        exit_status, stdout_static, stderr_static = self.session.exec_command(check_dest_parent_exists_command)
+        if not stdout_static.rstrip() == "PRESENT":
+            sys.exit(f"Error, parent directory of {self.dest_directory} does not exist")
+
+        # Create the destination directory, and the reads sub folder for streamed archives.
+        exit_status, static_stdout, static_stderr = \
+            self.session.exec_command(f"mkdir -p {self.dest_directory}/fast5")
+        if not static_stderr == "":
+            print(static_stdout, static_stderr)
+
+    def create_lock_file(self, lock_file):
+        cd_and_touch_command = f"bash -c \"cd {self.dest_directory} && touch {lock_file}\""
+        exit_status, static_stdout, static_stderr = self.session.exec_command(cd_and_touch_command)
+        if not static_stderr == "":
+            print(static_stdout, static_stderr)
+
+    def remove_lock_file(self, lock_file):
+        cd_and_remove_command = f"bash -c \"cd {self.dest_directory} && rm {lock_file}\""
+        exit_status, static_stdout, static_stderr = self.session.exec_command(cd_and_remove_command)
+        if not static_stderr == "":
+            print(static_stdout, static_stderr)
+
+    def transfer_command(self, source_paths, dest_subdir, bwlimit=None):
+        # Using the 'rsync [OPTION]... SRC [SRC]... [USER@]HOST:DEST' permutation of the command
+        rsync_command_options = ["rsync"]
+        rsync_command_options.append("--times")
+        if bwlimit is not None:
+            rsync_command_options.append(f"--bwlimit={bwlimit}")
+        # Over the connection we already have open
+        rsync_command_options.append(f"-e {self.session.ssh_command()}")
+        return self.sshpass_prefix + ' '.join(rsync_command_options) + " " + ' '.join(source_paths) + \
+            f" {self.session.destination}:{self.get_path(dest_subdir)}/"
+
+    def verify(self, dest_path, size, digest, checksum=DEFAULT_ALGORITHM):
+        verify_remote_file(self.session, self.get_path(dest_path), size, digest, checksum)
+
+    def put(self, local_path, dest_path):
+        # Over the sftp channel of the open connection rather than a new scp each time.
+        self.session.put(local_path, self.get_path(dest_path))
+
+    def send_folder(self, local_dir, dest_subdir, pattern="*.csv"):
+        rsync_command_options = ["rsync"]
+        rsync_command_options.append(f"--include='{pattern}'")
+        rsync_command_options.append("--exclude='*'")  # Exclude everything else!
+        rsync_command_options.append("--recursive")
+        rsync_command_options.append("--times")
+        rsync_command_options.append(f"-e {self.session.ssh_command()}")
+        rsync_command = self.sshpass_prefix + ' '.join(rsync_command_options) + \
+            f" {local_dir}/ {self.session.destination}:{self.get_path(dest_subdir)}/"
+
+        rsync_proc = subprocess.Popen(rsync_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      shell=True, universal_newlines=True)
+        stdout, stderr = rsync_proc.communicate()
+        print("Output of rsync csv command", stdout, stderr)
+
+    def stream_archive(self, source_dir, dest_path, compression=None, checksum=DEFAULT_ALGORITHM):
+        return stream_archive_to_server(self.session, source_dir, self.get_path(dest_path),
+                                        compression=compression, remove_source=False, checksum=checksum)
+
+    def close(self):
+        close_sessions()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+"""
+Wait for something to change in a set of directories, rather than sleeping for a fixed time.
+
+The polling loops used to sleep for 15 or 60 seconds between passes,
+so most of the time between a subfolder filling up and it being archived or basecalled was spent asleep,
+and a pass over an idle directory was wasted.
+A watcher wakes up as soon as a file is created, finished with (closed after writing) or renamed
+in one of the directories it watches, or in any folder below them.
+The timeout given to wait() is now just the longest we'll go without a pass.
+A busy directory (MinKNOW writing all the time) would otherwise wake us every second or two,
+so settle and min_interval limit how often an expensive pass can run.
+
+On linux the watcher uses inotify, through ctypes so no extra module is needed.
+Elsewhere, or if inotify isn't available (out of watches for example),
+the modification times of the directories are checked every couple of seconds instead.
+
+Usage:
+watcher = open_watcher([fast5_dir, fastq_dir])
+while running:
+    ...
+    watcher.wait(timeout=60, settle=10, min_interval=15)
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify event masks, from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+SETTLE_TIME = 1  # seconds, events this close together are handled in one pass
+POLL_STEP = 2  # seconds between checks without inotify
+
+
+def load_inotify():
+    # The libc inotify functions, or None if we're not on linux or they're not there.
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def open_watcher(paths, recursive=True):
+    """
+    Watch each of paths, and with recursive each folder below them.
+    Paths that don't exist yet are picked up once they do.
+    """
+    libc = load_inotify()
+    if libc is not None:
+        try:
+            return InotifyWatcher(libc, paths, recursive)
+        except OSError as e:
+            print("Could not use inotify (%s), checking directories every %d seconds instead" % (e, POLL_STEP))
+    return PollingWatcher(paths, recursive)
+
+
+def list_directories(path, recursive=True):
+    # path and, with recursive, each directory below it
+    if not os.path.isdir(path):
+        return []
+    if not recursive:
+        return [path]
+    return [dirpath for dirpath, dirnames, filenames in os.walk(path)]
+
+
+class InotifyWatcher:
+    def __init__(self, libc, paths, recursive=True):
+        self.libc = libc
+        self.recursive = recursive
+        self.paths = []
+        self.watches = {}  # watch descriptor: directory
+        self.last_wake = 0
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        for path in paths:
+            self.add_path(path)
+
+    def add_watch(self, directory):
+        if directory in self.watches.values():
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                # Gone again already
+                return
+            raise OSError(error, "%s: %s" % (os.strerror(error), directory))
+        self.watches[wd] = directory
+
+    def add_path(self, path):
+        # Watch another directory, for example the fast5 directory of a new run.
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            self.paths.append(path)
+        for directory in list_directories(path, self.recursive):
+            self.add_watch(directory)
+
+    def read_events(self):
+        # Returns the directories with events, watching any new folders as they appear.
+        changed = set()
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Missed some, have a look at everything
+                changed.update(self.paths)
+                continue
+            if mask & IN_IGNORED:
+                # Directory removed
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            changed.add(directory)
+            if self.recursive and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_path_below(os.path.join(directory, os.fsdecode(name)))
+        return changed
+
+    def add_path_below(self, directory):
+        # A new folder below one of the paths, anything already written inside it is seen on the next pass.
+        for new_directory in list_directories(directory, self.recursive):
+            self.add_watch(new_directory)
+
+    def wait(self, timeout=60, settle=SETTLE_TIME, min_interval=0):
+        """
+        Block until something changes, or timeout seconds have passed.
+        :param settle: seconds to keep collecting events after the first one
+        :param min_interval: never return for a change sooner than this many seconds after the last wait returned
+        Returns the set of directories that changed, empty if we timed out.
+        """
+        # Paths that didn't exist last time may well do now
+        for path in self.paths:
+            if os.path.isdir(path) and path not in self.watches.values():
+                self.add_path(path)
+        changed = set()
+        deadline = time.time() + timeout
+        earliest = self.last_wake + min_interval
+        while time.time() < deadline:
+            readable, _, _ = select.select([self.fd], [], [], max(0, deadline - time.time()))
+            if not readable:
+                break
+            changed.update(self.read_events())
+            if changed:
+                # Collect the rest of the burst (MinKNOW writes many files at once) before we return.
+                deadline = min(deadline, max(time.time() + settle, earliest))
+        self.last_wake = time.time()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, paths, recursive=True):
+        self.recursive = recursive
+        self.paths = []
+        self.mtimes = {}
+        self.last_wake = 0
+        for path in paths:
+            self.add_path(path)
+
+    def add_path(self, path):
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            self.paths.append(path)
+        self.mtimes.update(self.get_mtimes([path]))
+
+    def get_mtimes(self, paths):
+        # A directory's mtime changes when a file is created, removed or renamed inside it.
+        mtimes = {}
+        for path in paths:
+            for directory in list_directories(path, self.recursive):
+                try:
+                    mtimes[directory] = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+        return mtimes
+
+    def wait(self, timeout=60, settle=SETTLE_TIME, min_interval=0):
+        changed = set()
+        deadline = time.time() + timeout
+        earliest = self.last_wake + min_interval
+        while time.time() < deadline:
+            time.sleep(max(0, min(POLL_STEP, deadline - time.time())))
+            mtimes = self.get_mtimes(self.paths)
+            changed = set(directory for directory, mtime in mtimes.items()
+                          if not self.mtimes.get(directory) == mtime)
+            self.mtimes = mtimes
+            if changed:
+                # Anything else changing in the meantime is picked up by the next pass
+                time.sleep(max(0, min(earliest, deadline) - time.time()))
+                break
+        self.last_wake = time.time()
+        return changed
+
+    def close(self):
+        pass
@@ -23,14 +23,27 @@
 TMP_EXT=`mktemp -d /tmp/fast5.XXXXXXX`
 TMP_SAVE=`mktemp -d /tmp/albacore.XXXXXXX`
 
+# The archive may be a plain tar, gzipped or zstd compressed depending on the archive mode
+if [ -f ${SUBFOLDER_NAME}.fast5.tar.gz ]; then
+      TAR_FILE=${SUBFOLDER_NAME}.fast5.tar.gz
+      tar_cmd="tar xzf ${TAR_FILE} -C ${TMP_EXT}"
+elif [ -f ${SUBFOLDER_NAME}.fast5.tar.zst ]; then
+      TAR_FILE=${SUBFOLDER_NAME}.fast5.tar.zst
+      tar_cmd="zstd -dc ${TAR_FILE} | tar xf - -C ${TMP_EXT}"
+else
+      TAR_FILE=${SUBFOLDER_NAME}.fast5.tar
+      tar_cmd="tar xf ${TAR_FILE} -C ${TMP_EXT}"
+fi
+
 # Return error if tar file is corrupted
-tar_cmd="tar xf ${SUBFOLDER_NAME}.fast5.tar.gz -C ${TMP_EXT}"
+set -o pipefail
 eval $tar_cmd
 ret_code=$?
+set +o pipefail
 if [ ${ret_code} != 0 ]; then
       printf "Error exit code [%d] when extracting tar file: ''${tar_cmd}'" ${ret_code}
       printf "Moving subfolder to .corrupted"
-      touch ${SUBFOLDER_NAME}.fast5.tar.gz.corrupted
+      touch ${TAR_FILE}.corrupted
       exit ${ret_code}
 fi
 
@@ -0,0 +1,49 @@
+import os
+import tarfile
+import pytest
+
+from poreduck.archive import write_archive, get_index_path
+from poreduck.checksums import hash_file
+from poreduck.compressors import CompressionSettings
+
+
+def make_folder(folder, num_files=3):
+    os.makedirs(folder)
+    for file_number in range(num_files):
+        with open(os.path.join(folder, "read_%d.fast5" % file_number), 'wb') as file_h:
+            file_h.write(os.urandom(1000) * (file_number + 1))
+
+
+def check_archive(output_path, digest, arcname="0", num_files=3):
+    assert digest == hash_file(output_path)
+    assert not os.path.exists(output_path + ".tmp")
+    with tarfile.open(output_path, 'r:*') as tar_h:
+        assert sorted(tar_h.getnames()) == [arcname] + \
+            ["%s/read_%d.fast5" % (arcname, file_number) for file_number in range(num_files)]
+
+
+def test_write_archive_default_gzip(tmp_path):
+    # No compression settings, the single threaded gzip writer
+    folder = str(tmp_path / "0")
+    make_folder(folder)
+    output_path = str(tmp_path / "0.tar.gz")
+    digest = write_archive(folder, output_path)
+    check_archive(output_path, digest)
+    assert os.path.isdir(folder)
+
+
+def test_write_archive_gzip_settings(tmp_path):
+    folder = str(tmp_path / "0")
+    make_folder(folder)
+    output_path = str(tmp_path / "0.tar.gz")
+    digest = write_archive(folder, output_path, compression=CompressionSettings("gzip"), remove_source=True)
+    check_archive(output_path, digest)
+    assert not os.path.exists(folder)
+    assert not os.path.exists(get_index_path(output_path))
+
+
+def test_write_archive_failure_leaves_no_tmp(tmp_path):
+    output_path = str(tmp_path / "0.tar.gz")
+    with pytest.raises(OSError):
+        write_archive(str(tmp_path / "missing"), output_path)
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from poreduck.checkpoint import RunCheckpoint
+
+
+def test_checkpoint_latest_record_wins(tmp_path):
+    checkpoint = RunCheckpoint(str(tmp_path / "checkpoint.jsonl"))
+    assert checkpoint.load() == {}
+    checkpoint.record("0001", is_full=True)
+    checkpoint.record("0001", is_tarred=True, md5sum="abc")
+    checkpoint.record("run", start_time="2017-05-18")
+    assert checkpoint.load() == {"0001": {"is_full": True, "is_tarred": True, "md5sum": "abc"},
+                                 "run": {"start_time": "2017-05-18"}}
+
+
+def test_checkpoint_recovers_from_partial_line(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = RunCheckpoint(path)
+    checkpoint.record("0001", is_full=True)
+    # We crashed part way through appending the next record
+    with open(path, 'a') as checkpoint_h:
+        checkpoint_h.write('{"is_tarred": tr')
+    checkpoint.record("0002", is_full=True)
+    assert RunCheckpoint(path).load() == {"0001": {"is_full": True}, "0002": {"is_full": True}}
+
+
+def record_rows(path, batch, num_rows):
+    checkpoint = RunCheckpoint(path)
+    for row in range(num_rows):
+        checkpoint.record("%d_%d" % (batch, row), status="completed", error="x" * 1000)
+
+
+def test_checkpoint_shared_between_processes(tmp_path):
+    # The array tasks of one wrapper config each record their rows in the one checkpoint
+    path = str(tmp_path / "config.yaml.checkpoint.jsonl")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(record_rows, [path] * 4, range(4), [50] * 4))
+    records = RunCheckpoint(path).load()
+    assert len(records) == 200
+    assert all(values["status"] == "completed" for values in records.values())
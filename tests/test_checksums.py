@@ -0,0 +1,29 @@
+import os
+
+from poreduck.checksums import get_algorithm, get_checksum_path, hash_file, verify_checksum_file
+
+
+def test_get_checksum_path():
+    assert get_checksum_path("run/checksum.md5") == "run/checksum.md5"
+    assert get_checksum_path("run/checksum.md5", "blake2b") == "run/checksum.b2"
+    assert get_checksum_path("run/checksum.b2", "sha256") == "run/checksum.sha256"
+    assert get_checksum_path("run/checksums.txt") == "run/checksums.txt"
+    assert get_checksum_path("run/checksums.txt", "xxh128") == "run/checksums.txt.xxh128"
+
+
+def test_get_algorithm():
+    assert get_algorithm("checksum.b2") == "blake2b"
+    assert get_algorithm("checksum.md5", "0" * 32) == "md5"
+    assert get_algorithm("checksum.txt", "0" * 64) == "sha256"
+    # Written with blake2b into a file named .md5 by an older version
+    assert get_algorithm("checksum.md5", "0" * 128) == "blake2b"
+
+
+def test_verify_blake2b_digests_in_md5_file(tmp_path):
+    archive_path = str(tmp_path / "0001.tar.gz")
+    with open(archive_path, 'wb') as archive_h:
+        archive_h.write(os.urandom(1000))
+    checksum_file = str(tmp_path / "checksum.md5")
+    with open(checksum_file, 'w') as checksum_h:
+        checksum_h.write("%s  0001.tar.gz\n" % hash_file(archive_path, "blake2b"))
+    assert verify_checksum_file(checksum_file) == [("0001.tar.gz", "OK")]
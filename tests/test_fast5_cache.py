@@ -0,0 +1,37 @@
+import os
+import h5py
+
+from poreduck.fast5_cache import Fast5FolderCache
+from poreduck.fast5_validator import UNREADABLE
+
+NAME = "host_20170518_FNFAF18353_MN19582_sequencing_run_sample_11874_read_%d_ch_162_strand.fast5"
+
+
+def write_read(path, read_number):
+    with h5py.File(path, 'w') as fast5_h:
+        read_attrs = fast5_h.create_group("Raw/Reads/Read_%d" % read_number).attrs
+        read_attrs["start_mux"] = 2
+        read_attrs["duration"] = 4000
+
+
+def test_update_reads_attributes(tmp_path):
+    write_read(str(tmp_path / (NAME % 1)), 1)
+    cache = Fast5FolderCache(str(tmp_path))
+    assert cache.update() == 1
+    row = cache.rows[NAME % 1]
+    assert (row['quarantine'], row['mux'], row['duration']) == ("", 2, 4000)
+    # Nothing has changed since
+    assert cache.update() == 0
+
+
+def test_update_quarantines_file_without_its_read(tmp_path):
+    # Valid hdf5 with Raw/Reads, but the read group doesn't match the number in the name
+    write_read(str(tmp_path / (NAME % 1)), 2)
+    write_read(str(tmp_path / (NAME % 3)), 3)
+    cache = Fast5FolderCache(str(tmp_path))
+    assert cache.update() == 2
+    assert cache.rows[NAME % 1]['quarantine'] == UNREADABLE
+    assert cache.rows[NAME % 1]['mux'] is None
+    assert cache.rows[NAME % 3]['quarantine'] == ""
+    # Looked at again on the next poll
+    assert cache.update() == 1
@@ -0,0 +1,82 @@
+import os
+import h5py
+import numpy as np
+import pytest
+
+from poreduck.fast5_repack import repack_folder, add_read, MULTI_READ_FILE_VERSION
+
+
+def write_single_read(path, read_number):
+    with h5py.File(path, 'w') as fast5_h:
+        read_group = fast5_h.create_group("Raw/Reads/Read_%d" % read_number)
+        read_group.attrs["read_id"] = "read-%d" % read_number
+        read_group.attrs["read_number"] = read_number
+        read_group.create_dataset("Signal", data=np.arange(100, dtype=np.int16) + read_number)
+        fast5_h.create_group("UniqueGlobalKey/tracking_id").attrs["run_id"] = "run-1"
+
+
+def make_folder(folder, num_reads):
+    os.makedirs(folder)
+    for read_number in range(num_reads):
+        write_single_read(os.path.join(folder, "read_%d.fast5" % read_number), read_number)
+
+
+def get_read_ids(folder):
+    read_ids = set()
+    for fast5_file in os.listdir(folder):
+        with h5py.File(os.path.join(folder, fast5_file), 'r') as fast5_h:
+            read_ids.update(key for key in fast5_h.keys() if key.startswith("read_"))
+    return read_ids
+
+
+def test_repack_folder(tmp_path):
+    folder = str(tmp_path / "0")
+    make_folder(folder, 5)
+    multi_read_files = repack_folder(folder, reads_per_file=2)
+    assert multi_read_files == ["0_batch_0.multi.fast5", "0_batch_1.multi.fast5", "0_batch_2.multi.fast5"]
+    assert sorted(os.listdir(folder)) == sorted(multi_read_files)
+    assert get_read_ids(folder) == set("read_read-%d" % read_number for read_number in range(5))
+    with h5py.File(os.path.join(folder, multi_read_files[0]), 'r') as multi_h:
+        assert multi_h.attrs["file_version"] == MULTI_READ_FILE_VERSION
+        assert list(multi_h["read_read-0/Raw/Signal"][:3]) == [0, 1, 2]
+        assert multi_h["read_read-0"].attrs["run_id"] == "run-1"
+
+
+def test_repack_folder_twice_keeps_reads(tmp_path):
+    # A restart repacks the same folder again, nothing already repacked may be lost.
+    folder = str(tmp_path / "0")
+    make_folder(folder, 3)
+    assert repack_folder(folder) == ["0_batch_0.multi.fast5"]
+    assert repack_folder(folder) == []
+    assert os.listdir(folder) == ["0_batch_0.multi.fast5"]
+    assert len(get_read_ids(folder)) == 3
+
+
+def test_repack_folder_numbers_new_batches_on(tmp_path):
+    folder = str(tmp_path / "0")
+    make_folder(folder, 2)
+    repack_folder(folder)
+    # More reads turn up after the first repack
+    write_single_read(os.path.join(folder, "read_2.fast5"), 2)
+    assert repack_folder(folder) == ["0_batch_1.multi.fast5"]
+    assert len(get_read_ids(folder)) == 3
+
+
+def test_repack_folder_leaves_unreadable_files(tmp_path):
+    folder = str(tmp_path / "0")
+    make_folder(folder, 2)
+    with open(os.path.join(folder, "broken.fast5"), 'w') as broken_h:
+        broken_h.write("not hdf5")
+    assert repack_folder(folder) == ["0_batch_0.multi.fast5"]
+    assert sorted(os.listdir(folder)) == ["0_batch_0.multi.fast5", "broken.fast5"]
+
+
+def test_add_read_failure_leaves_no_partial_read(tmp_path):
+    single_read_path = str(tmp_path / "read_0.fast5")
+    with h5py.File(single_read_path, 'w') as fast5_h:
+        # No signal dataset
+        fast5_h.create_group("Raw/Reads/Read_0").attrs["read_id"] = "read-0"
+    with h5py.File(str(tmp_path / "multi.fast5"), 'w') as multi_h:
+        with pytest.raises(KeyError):
+            add_read(single_read_path, multi_h)
+        assert list(multi_h.keys()) == []
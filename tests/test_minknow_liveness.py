@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import time
+import uuid
+import pytest
+
+from poreduck import minknow_liveness
+from poreduck.minknow_liveness import MinKNOWMonitor
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc"), reason="Needs /proc")
+
+
+def dummy_patterns():
+    # Only ever matches the dummy processes of this test
+    return [["MinKNOW", "experiment", "sequencing", uuid.uuid4().hex]]
+
+
+def spawn_dummy(patterns):
+    dummy = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"] + patterns[0])
+    # Until the exec the child still has our command line
+    deadline = time.time() + 10
+    while patterns[0][-1] not in (minknow_liveness.read_cmdline(dummy.pid) or ""):
+        if time.time() > deadline:
+            dummy.kill()
+            raise RuntimeError("Dummy process never started")
+        time.sleep(0.01)
+    return dummy
+
+
+def test_dummy_process_found_and_gone():
+    patterns = dummy_patterns()
+    monitor = MinKNOWMonitor(patterns)
+    assert not monitor.is_running()
+    dummy = spawn_dummy(patterns)
+    try:
+        assert monitor.is_running()
+        assert monitor.pid == dummy.pid
+        # Checked by pid from now on
+        assert monitor.is_running()
+    finally:
+        dummy.kill()
+    # Exited but not yet reaped, a zombie is not MinKNOW
+    os.waitid(os.P_PID, dummy.pid, os.WEXITED | os.WNOWAIT)
+    assert not monitor.is_running()
+    dummy.wait()
+    assert not monitor.is_running()
+    assert monitor.pid is None
+
+
+def write_process(proc_dir, pid, cmdline, start_time, state="S"):
+    pid_dir = os.path.join(proc_dir, str(pid))
+    os.makedirs(pid_dir, exist_ok=True)
+    with open(os.path.join(pid_dir, "cmdline"), 'wb') as cmdline_h:
+        cmdline_h.write(b"\0".join(arg.encode() for arg in cmdline) + b"\0")
+    with open(os.path.join(pid_dir, "stat"), 'w') as stat_h:
+        # state, ppid, 17 fields we don't look at, then the start time
+        stat_h.write("%d (%s) %s 1 %s %d 0 0\n" % (pid, os.path.basename(cmdline[0]), state,
+                                                  " ".join(["0"] * 17), start_time))
+
+
+def test_dummy_pid_reused(tmp_path, monkeypatch):
+    # Kill a dummy process, then have another process take its pid
+    patterns = dummy_patterns()
+    dummy = spawn_dummy(patterns)
+    pid = dummy.pid
+    dummy.kill()
+    dummy.wait()
+    proc_dir = str(tmp_path)
+    monkeypatch.setattr(minknow_liveness, "PROC_DIR", proc_dir)
+    write_process(proc_dir, pid, ["python"] + patterns[0], start_time=100)
+    monitor = MinKNOWMonitor(patterns)
+    assert monitor.is_running()
+    assert monitor.pid == pid
+    # Same pid, but started later and not MinKNOW
+    write_process(proc_dir, pid, ["bash"], start_time=200)
+    assert not monitor.is_running()
+    assert monitor.pid is None
+
+
+def test_zombie_never_cached(tmp_path, monkeypatch):
+    # Found by its command line, but had exited by the time we read its start time
+    patterns = dummy_patterns()
+    proc_dir = str(tmp_path)
+    monkeypatch.setattr(minknow_liveness, "PROC_DIR", proc_dir)
+    write_process(proc_dir, 4242, ["python"] + patterns[0], start_time=100, state="Z")
+    monitor = MinKNOWMonitor(patterns)
+    assert not monitor.is_running()
+    assert monitor.pid is None
+    assert not monitor.is_running()
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+import pandas as pd
+
+import poreduck.promethion_alpha_light as promethion_alpha_light
+from poreduck.promethion_alpha_light_wrapper import get_report_path, get_row_argv, select_batch
+
+
+def test_select_batch():
+    dataframe = pd.DataFrame({"fast5_dir": ["0", "1", "2"], "batch": [0, 1, 0]})
+    assert list(select_batch(dataframe, 0).fast5_dir) == ["0", "2"]
+    assert list(select_batch(dataframe, 1).fast5_dir) == ["1"]
+    assert len(select_batch(dataframe, 2)) == 0
+
+
+def test_select_batch_config_without_batches():
+    # Written before configs had a batch column
+    dataframe = pd.DataFrame({"fast5_dir": ["0", "1"]})
+    assert list(select_batch(dataframe, 0).fast5_dir) == ["0", "1"]
+    assert len(select_batch(dataframe, 1)) == 0
+
+
+def test_row_compression_threads_shared_out():
+    config_data = SimpleNamespace(sequencing_summary_file="summary_0.txt", fastq_file="fastq_0.fastq",
+                                  fast5_dir="reads/0", FlowcellID="PAD00001", rnumber="12345",
+                                  md5_fast5="checksum_fast5.md5", md5_fastq="checksum_fastq.md5")
+    args = SimpleNamespace(compression="gzip", compression_threads=32, archive_mode="standard",
+                           adaptive_sample_mb=8, network_mb_per_s=100, checksum="md5",
+                           compression_level=None, archive_index=False)
+    row_args = promethion_alpha_light.get_args(get_row_argv(config_data, args, 4))
+    assert row_args.compression_threads == 4
+    assert row_args.fastq_threads == 4
+    args.compression_threads = 2
+    assert promethion_alpha_light.get_args(get_row_argv(config_data, args, 4)).compression_threads == 2
+
+
+def test_report_path_per_batch():
+    assert get_report_path("config.yaml") == "config.yaml.report.tsv"
+    assert get_report_path("config.yaml", 0) == "config.yaml.batch0.report.tsv"
+    assert get_report_path("config.yaml", 3) == "config.yaml.batch3.report.tsv"
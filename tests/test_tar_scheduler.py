@@ -0,0 +1,56 @@
+import threading
+import time
+import pytest
+
+from poreduck.tar_scheduler import TarScheduler
+
+
+def archive(name, delay=0.0, fail=False):
+    time.sleep(delay)
+    if fail:
+        raise IOError("Could not archive %s" % name)
+    return "%s.tar.gz" % name
+
+
+def test_results_in_submitted_order(tmp_path):
+    tar_scheduler = TarScheduler(max_jobs=3)
+    for name, delay in [("0001", 0.2), ("0002", 0.0), ("0003", 0.1)]:
+        tar_scheduler.submit(name, str(tmp_path), archive, name, delay)
+    assert list(tar_scheduler.results_in_order()) == [("0001", "0001.tar.gz"), ("0002", "0002.tar.gz"),
+                                                      ("0003", "0003.tar.gz")]
+    tar_scheduler.shutdown()
+
+
+def test_failed_job_doesnt_leak_into_next_batch(tmp_path):
+    tar_scheduler = TarScheduler(max_jobs=2)
+    tar_scheduler.submit("0001", str(tmp_path), archive, "0001", fail=True)
+    tar_scheduler.submit("0002", str(tmp_path), archive, "0002", 0.1)
+    with pytest.raises(IOError):
+        for name, result in tar_scheduler.results_in_order():
+            pass
+    # The next batch only has its own jobs in it
+    tar_scheduler.submit("0003", str(tmp_path), archive, "0003")
+    assert list(tar_scheduler.results_in_order()) == [("0003", "0003.tar.gz")]
+    tar_scheduler.shutdown()
+
+
+def test_jobs_per_disk(tmp_path, monkeypatch):
+    # Only one job on the disk at a time, walking the folder included
+    running = []
+    lock = threading.Lock()
+
+    def get_folder_size(folder):
+        with lock:
+            running.append(folder)
+            assert len(running) == 1
+        time.sleep(0.05)
+        with lock:
+            running.remove(folder)
+        return 0, 0
+
+    monkeypatch.setattr("poreduck.tar_scheduler.get_folder_size", get_folder_size)
+    tar_scheduler = TarScheduler(max_jobs=4, max_jobs_per_disk=1)
+    for name in ["0001", "0002", "0003"]:
+        tar_scheduler.submit(name, str(tmp_path), archive, name)
+    assert len(list(tar_scheduler.results_in_order())) == 3
+    tar_scheduler.shutdown()
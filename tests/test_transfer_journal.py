@@ -0,0 +1,87 @@
+import os
+
+from poreduck.archive import write_archive
+from poreduck.checksums import hash_file
+from poreduck.transfer_engine import TransferEngine, Run
+from poreduck.transfer_journal import TransferJournal
+from poreduck.transfer_sinks import NullSink
+
+RUN_NAME = "20170518_1200_sample"
+
+
+def test_journal_recovers_from_partial_line(tmp_path):
+    path = str(tmp_path / "transfer_journal.jsonl")
+    journal = TransferJournal(path)
+    journal.record("0001", "moved")
+    journal.record("0001", "archived", tar_file="0001.tar.gz")
+    # We crashed part way through noting the digest
+    with open(path, 'a') as journal_h:
+        journal_h.write('{"digest": "ab')
+    journal = TransferJournal(path)
+    assert journal.stage("0001") == "archived"
+    journal.record("0001", "hashed", digest="abc")
+    journal = TransferJournal(path)
+    assert journal.stage("0001") == "hashed"
+    assert journal.get("0001", "digest") == "abc"
+    assert journal.get("0001", "tar_file") == "0001.tar.gz"
+
+
+def make_run(reads_dir):
+    run = Run(reads_dir, RUN_NAME, "FAF18353", "11874", False, "sample")
+    os.makedirs(run.fast5_dir)
+    return run
+
+
+def make_folder(run, subdir):
+    folder = os.path.join(run.fast5_dir, subdir)
+    os.makedirs(folder)
+    with open(os.path.join(folder, "read_0.fast5"), 'wb') as fast5_h:
+        fast5_h.write(os.urandom(1000))
+    return folder
+
+
+def test_resume_removes_folder_of_hashed_archive(tmp_path):
+    # Crashed after noting the digest, before removing the folder
+    reads_dir = str(tmp_path)
+    run = make_run(reads_dir)
+    folder = make_folder(run, "0001")
+    tar_path = os.path.join(run.fast5_dir, "0001.tar.gz")
+    digest = write_archive(folder, tar_path)
+    run.journal.record("0001", "moved")
+    run.journal.record("0001", "archived", tar_file="0001.tar.gz")
+    run.journal.record("0001", "hashed", digest=digest)
+
+    TransferEngine(reads_dir, "sample", NullSink()).resume_run(run)
+    assert not os.path.exists(folder)
+    assert hash_file(tar_path) == digest
+    assert run.journal.stage("0001") == "hashed"
+
+
+def test_resume_hashes_archived_folder(tmp_path):
+    # Crashed after the archive was in place, before noting the digest
+    reads_dir = str(tmp_path)
+    run = make_run(reads_dir)
+    folder = make_folder(run, "0001")
+    tar_path = os.path.join(run.fast5_dir, "0001.tar.gz")
+    write_archive(folder, tar_path)
+    run.journal.record("0001", "moved")
+    run.journal.record("0001", "archived", tar_file="0001.tar.gz")
+
+    TransferEngine(reads_dir, "sample", NullSink()).resume_run(run)
+    assert not os.path.exists(folder)
+    assert run.journal.stage("0001") == "hashed"
+    assert run.journal.get("0001", "digest") == hash_file(tar_path)
+
+
+def test_resume_rearchives_folder_without_archive(tmp_path):
+    # Archived straight to the sink, but never verified there
+    reads_dir = str(tmp_path)
+    run = make_run(reads_dir)
+    folder = make_folder(run, "0001")
+    run.journal.record("0001", "moved")
+    run.journal.record("0001", "archived", tar_file="0001.tar.gz")
+
+    TransferEngine(reads_dir, "sample", NullSink()).resume_run(run)
+    assert not os.path.exists(folder)
+    assert run.journal.stage("0001") == "hashed"
+    assert hash_file(os.path.join(run.fast5_dir, "0001.tar.gz")) == run.journal.get("0001", "digest")
@@ -0,0 +1,60 @@
+import os
+import pytest
+
+from poreduck.archive import write_archive
+from poreduck.checksums import hash_file, read_checksum_file
+from poreduck.transfer_engine import TransferEngine, Run
+from poreduck.transfer_sinks import LocalSink, NullSink
+
+
+def make_folder(run, subdir):
+    folder = os.path.join(run.fast5_dir, subdir)
+    os.makedirs(folder)
+    with open(os.path.join(folder, "read_0.fast5"), 'wb') as fast5_h:
+        fast5_h.write(os.urandom(1000))
+    return folder
+
+
+def test_engine_refuses_to_stream_to_sink_without_stream_archive(tmp_path):
+    sink = NullSink()
+    sink.stream = True
+    with pytest.raises(ValueError):
+        TransferEngine(str(tmp_path), "sample", sink)
+
+
+def test_engine_streams_to_local_sink(tmp_path):
+    reads_dir = str(tmp_path / "reads")
+    run = Run(reads_dir, "20170518_1200_sample", "FAF18353", "11874", False, "sample")
+    os.makedirs(run.fast5_dir)
+    streamed_folder = make_folder(run, "0001")
+    # Archived locally while the sink was down, sent the usual way
+    local_folder = make_folder(run, "0002")
+    local_tar_path = os.path.join(run.fast5_dir, "0002.tar.gz")
+    local_digest = write_archive(local_folder, local_tar_path)
+    run.journal.record("0002", "archived", tar_file="0002.tar.gz")
+    run.journal.record("0002", "hashed", digest=local_digest)
+
+    sink = LocalSink(str(tmp_path / "dest"), stream=True)
+    try:
+        sink.check()
+        engine = TransferEngine(reads_dir, "sample", sink)
+        tar_file, digest = engine.tar_folder("0001", run)
+        engine.queue_transfers(run)
+        engine.transfer_scheduler.wait()
+        engine.send_checksum_files(run)
+    finally:
+        sink.close()
+
+    assert tar_file == "0001.tar.gz"
+    # Written straight to the destination, nothing left behind next to the reads
+    assert hash_file(str(tmp_path / "dest" / "fast5" / tar_file)) == digest
+    assert hash_file(str(tmp_path / "dest" / "fast5" / "0002.tar.gz")) == local_digest
+    assert not os.path.exists(streamed_folder)
+    assert not os.path.exists(local_folder)
+    assert os.listdir(run.fast5_dir) == []
+    assert run.journal.stage("0001") == "deleted"
+    assert run.journal.stage("0002") == "deleted"
+    # Checksum file alongside the archives, with both of them in it
+    dest_checksum_path = str(tmp_path / "dest" / os.path.basename(engine.get_checksum_path(run)))
+    assert sorted(read_checksum_file(dest_checksum_path)) == sorted([(digest, "fast5/0001.tar.gz"),
+                                                                     (local_digest, "fast5/0002.tar.gz")])
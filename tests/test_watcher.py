@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+import pytest
+
+from poreduck import watcher
+from poreduck.watcher import open_watcher, PollingWatcher
+
+
+def keep_writing(directory, stop, step=0.05):
+    # MinKNOW writing a file every step seconds
+    count = 0
+    while not stop.is_set():
+        with open(os.path.join(directory, "read_%d.fast5" % count), 'w') as fast5_h:
+            fast5_h.write("read")
+        count += 1
+        time.sleep(step)
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def make_watcher(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(watcher, "POLL_STEP", 0.1)
+        return PollingWatcher
+    if watcher.load_inotify() is None:
+        pytest.skip("No inotify")
+    return open_watcher
+
+
+def test_wait_wakes_on_change(tmp_path, make_watcher):
+    directory = str(tmp_path)
+    dir_watcher = make_watcher([directory])
+    threading.Timer(0.2, lambda: open(os.path.join(directory, "read_0.fast5"), 'w').close()).start()
+    start_time = time.time()
+    assert dir_watcher.wait(timeout=10, settle=0.1, min_interval=0)
+    assert time.time() - start_time < 5
+
+
+def test_wait_min_interval_under_constant_writes(tmp_path, make_watcher):
+    directory = str(tmp_path)
+    dir_watcher = make_watcher([directory])
+    stop = threading.Event()
+    writer = threading.Thread(target=keep_writing, args=(directory, stop))
+    writer.start()
+    try:
+        wakes = []
+        for _ in range(3):
+            assert dir_watcher.wait(timeout=10, settle=0.1, min_interval=1)
+            wakes.append(time.time())
+    finally:
+        stop.set()
+        writer.join()
+    # However busy the directory, no more than one pass a second
+    assert all(later - earlier >= 0.9 for earlier, later in zip(wakes, wakes[1:]))